@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_restful import Api
 import json
 from pathlib import Path
@@ -7,8 +7,17 @@ import os
 import pymysql
 import logging
 import json as _json
-# from watchdog.observers import Observer
-# from watchdog.events import FileSystemEventHandler
+import tempfile
+from db_pool import ConnectionPool
+from exports import XLSX_MIMETYPE, ExportUnavailable, safe_filename, write_xlsx
+from request_timing import RequestTimer, TimedCursor, TimedSSCursor, count_rows
+from sampling_profiler import ProfilerBusy, SamplingProfiler, collapsed, top_functions
+from schema_registry import SchemaRegistry
+from schema_migrations import apply_migration, migration_history, migration_lock, plan_migration, schema_hash
+from schema_tables import build_create_table_sql, extract_properties
+from streaming import STREAM_MIMETYPES, open_stream
+from table_metadata import TableMetadataCache
+from table_query import QueryError, TableQuery, estimate_row_count, wants_paging
 
 
 app = Flask(__name__, static_folder='../build',
@@ -19,8 +28,9 @@ app.config['EMPIRF_SECRET_KEY'] = 'EPMIRF_SECURITY'
 
 # jwt = JWTManager(app)
 
-# Database configuration
-with open(os.path.join(os.path.dirname(__file__), 'conf', 'db_config.json'), 'r') as f:
+# Database configuration (DB_CONFIG_FILE points elsewhere, e.g. for api_benchmark.py)
+DB_CONFIG_FILE = os.environ.get('DB_CONFIG_FILE') or os.path.join(os.path.dirname(__file__), 'conf', 'db_config.json')
+with open(DB_CONFIG_FILE, 'r') as f:
     db_config = _json.load(f)
 DB_HOST = db_config['DB_HOST']
 DB_PORT = db_config['DB_PORT']
@@ -28,123 +38,40 @@ DB_USER = db_config['DB_USER']
 DB_PASSWORD = db_config['DB_PASSWORD']
 DB_NAME = db_config['DB_NAME']
 
+# One pool per gunicorn worker; connections are opened lazily on first use
+db_pool = ConnectionPool(
+    dict(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=DB_NAME,
+         cursorclass=TimedCursor),
+    max_size=int(db_config.get('DB_POOL_MAX_SIZE', 10)),
+    idle_timeout=float(db_config.get('DB_POOL_IDLE_TIMEOUT', 300)),
+    max_lifetime=float(db_config.get('DB_POOL_MAX_LIFETIME', 3600)),
+    acquire_timeout=float(db_config.get('DB_POOL_ACQUIRE_TIMEOUT', 10)),
+    health_check_interval=float(db_config.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+    leak_timeout=float(db_config.get('DB_POOL_LEAK_TIMEOUT', 60)),
+)
+MAX_PAGE_SIZE = int(db_config.get('API_MAX_PAGE_SIZE', 1000))
+
+# Server-Timing headers, per-route stats at /api/timing and the slow-query log (0 disables it)
+request_timer = RequestTimer(slow_query_ms=float(db_config.get('API_SLOW_QUERY_MS', 1000)))
+request_timer.init_app(app)
+# Opt-in: /api/debug/profile samples the stacks of the answering worker
+PROFILER_ENABLED = bool(db_config.get('API_PROFILER', False))
+profiler = SamplingProfiler()
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
 SCHEMA_DIR = Path(__file__).resolve().parent / "schemas"
-
-# class DataHandler(FileSystemEventHandler):
-#     def __init__(self):
-#         pass
-
-#     def table_exists(self, connection, table_name):
-#         with connection.cursor() as cursor:
-#             cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-#             result = cursor.fetchone()
-#             return result is not None
-
-#     def entry_exists(self, connection, table_name, identifier):
-#         with connection.cursor() as cursor:
-#             cursor.execute(f"SELECT 1 FROM `{table_name}` WHERE identifier = %s", (identifier,))
-#             result = cursor.fetchone()
-#             return result is not None
-
-#     def process_json_file(self, file_path, action):
-#         with open(file_path, 'r') as file:
-#             data = json.load(file)
-#             schema_id = data.get('schema_id')
-#             identifier = data.get('identifier')
-
-#             if not schema_id or not identifier:
-#                 print("Missing schema_id or identifier in the JSON file.")
-#                 return
-
-#             conn = pymysql.connect(
-#                 host=DB_HOST,
-#                 port=DB_PORT,
-#                 user=DB_USER,
-#                 password=DB_PASSWORD,
-#                 database=DB_NAME
-#             )
-
-#             try:
-#                 if not self.table_exists(conn, schema_id):
-#                     print(f"Table `{schema_id}` does not exist.")
-#                     return
-
-#                 if action == 'create':
-#                     if self.entry_exists(conn, schema_id, identifier):
-#                         print(f"Entry with identifier `{identifier}` already exists in table `{schema_id}`.")
-#                         return
-
-#                     placeholders = ', '.join(['%s'] * len(data))
-#                     columns = ', '.join(data.keys())
-#                     sql = f"INSERT INTO `{schema_id}` ({columns}) VALUES ({placeholders})"
-#                     with conn.cursor() as cursor:
-#                         cursor.execute(sql, tuple(data.values()))
-
-#                 elif action == 'delete':
-#                     if not self.entry_exists(conn, schema_id, identifier):
-#                         print(f"Entry with identifier `{identifier}` does not exist in table `{schema_id}`.")
-#                         return
-
-#                     sql = f"DELETE FROM `{schema_id}` WHERE identifier = %s"
-#                     with conn.cursor() as cursor:
-#                         cursor.execute(sql, (identifier,))
-
-#                 conn.commit()
-#             finally:
-#                 conn.close()
-
-#     def on_created(self, event):
-#         if not event.is_directory and event.src_path.endswith('.json'):
-#             self.process_json_file(event.src_path, 'create')
-
-#     def on_deleted(self, event):
-#         if not event.is_directory and event.src_path.endswith('.json'):
-#             self.process_json_file(event.src_path, 'delete')
-
-# def start_watcher(path):
-#     event_handler = DataHandler()
-#     observer = Observer()
-#     observer.schedule(event_handler, path, recursive=True)
-#     observer.start()
-#     return observer
-
-def map_json_type_to_sql(json_type):
-    type_mapping = {
-        "string": "VARCHAR(255)",
-        "number": "FLOAT",
-        "integer": "INT",
-        "boolean": "BOOLEAN",
-        "file upload(string)": "VARCHAR(255)",
-        "object": "JSON",
-        "array": "JSON"
-    }
-    return type_mapping.get(json_type, "VARCHAR(255)")
-
-def normalize_json_type(json_type):
-    if isinstance(json_type, list):
-        for item in json_type:
-            if item != "null":
-                return item
-        return json_type[0] if json_type else "string"
-    if not json_type:
-        return "string"
-    return json_type
-
-def extract_properties(properties, parent_key=''):
-    items = {}
-    for key, value in properties.items():
-        # Adding parent property before the parameters under while separating with a _ 
-        # full_key = f"{parent_key}_{key}" if parent_key else key 
-        full_key = f"{key}" if parent_key else key
-        if value['type'] == 'object' and 'properties' in value:
-            items.update(extract_properties(value['properties'], full_key))
-        else:
-            items[full_key] = value
-    return items
+TEMP_DIR = Path(__file__).resolve().parent / "temp-files"
+schema_registry = SchemaRegistry(SCHEMA_DIR)
+GZIP_RESPONSES = bool(db_config.get('API_GZIP', True))
+# SHOW TABLES / DESCRIBE results; a schema save in any worker changes the registry
+# version, which every worker checks once per API_METADATA_TTL
+table_metadata = TableMetadataCache(
+    ttl=float(db_config.get('API_METADATA_TTL', 60)),
+    version=schema_registry.refresh,
+)
 
 def create_table_from_schema(schema_name, schema_content):
     # Parse the schema content to extract properties and types
@@ -158,45 +85,40 @@ def create_table_from_schema(schema_name, schema_content):
     flattened_properties = extract_properties(properties)
     # print('@@@@@@@@@@@@@@@ Flattened Properties @@@@@@@@@@@@@@@@@', flattened_properties)
 
-    columns = []
-    for prop, details in flattened_properties.items():
-        column_type = map_json_type_to_sql(normalize_json_type(details.get("type", "string")))
-        columns.append(f"`{prop}` {column_type}")
-        
-    # Append documentLocation per default
-    columns.append("`documentlocation` VARCHAR(255)")
-
-    columns_str = ", ".join(columns)
     drop_table_query = f"DROP TABLE IF EXISTS `{schema_name}`;"
     logger.debug(f'DB QUERY: {drop_table_query}')
-    create_table_query = f"CREATE TABLE IF NOT EXISTS `{schema_name}` ({columns_str});"
+    # Includes a unique index on Identifier and indexes for x-index properties
+    create_table_query = build_create_table_sql(schema_name, flattened_properties)
     logger.debug(f'DB QUERY: {create_table_query}')
     
 
-    # Connect to the database and execute the query
-    connection = None
+    # Borrow a pooled connection and execute the query
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        logger.info('CONNECTION TO DB IS SUCCESSFUL')
-        with connection.cursor() as cursor:
-            cursor.execute(drop_table_query)
-            logger.info('DROP TABLE EXECUTED')
-            cursor.execute(create_table_query)
-        connection.commit()
-        logger.info('COMMIT SUCCESSFUL')
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(drop_table_query)
+                logger.info('DROP TABLE EXECUTED')
+                cursor.execute(create_table_query)
+            connection.commit()
+            logger.info('COMMIT SUCCESSFUL')
     except pymysql.Error as e:
         logger.error(f'Error connecting to MariaDB: {e}')
         raise
-    finally:
-        if connection:
-            connection.close()
-            logger.info('CONNECTION IS CLOSED')
+
+
+def migrate_table_from_schema(schema_name, schema_content, dry_run=False, drop_removed=False):
+    # Non-destructive counterpart of create_table_from_schema: ADD/MODIFY columns
+    # and indexes so that ingested rows survive schema edits
+    schema = json.loads(schema_content)
+    flattened_properties = extract_properties(schema.get("properties", {}))
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            with migration_lock(cursor, schema_name):
+                plan = plan_migration(cursor, schema_name, flattened_properties, drop_removed=drop_removed)
+                logger.info(f'MIGRATION PLAN for {schema_name}: {plan["action"]}, {len(plan["statements"])} statements')
+                if not dry_run:
+                    apply_migration(connection, plan, schema.get("$id"), schema_hash(schema_content))
+    return plan
 
 
 # @app.route('/')
@@ -223,24 +145,54 @@ def check_mode():
         return {"message": "connection is a success", "jobRequestSchemaList": listSchemas, "submitButtonText": listSubmitText}
 
 
+def cached_json_response(etag, body, encoding):
+    # Browsers revalidate with If-None-Match and get an empty 304 while unchanged
+    response = Response(body, mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        etag = f"{etag}-{encoding}"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+def accepts_gzip():
+    return GZIP_RESPONSES and "gzip" in request.accept_encodings
+
 # get schemas from backend
 @app.route('/api/get_schemas', methods=["GET"])
 def get_schemas():
-    list_of_schemas = {"schemaName": [""], "schema": [None]}
-    SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
-    filelist = list(SCHEMA_DIR.glob('**/*.json'))
-    for i in range(0, len(filelist)):
-        file = filelist[i]
-        content = Path(file).read_text(encoding='utf-8')
-        filename = Path(file).relative_to(SCHEMA_DIR).as_posix()
-        list_of_schemas["schema"].append(content)
-        list_of_schemas["schemaName"].append(filename)
-    return list_of_schemas
+    def build(entries):
+        return {
+            "schemaName": [""] + list(entries),
+            "schema": [None] + [entry["content"] for entry in entries.values()],
+        }
+    version, body, encoding = schema_registry.payload("all", build, gzip_ok=accepts_gzip())
+    return cached_json_response(version, body, encoding)
+
+# Lightweight index (name, $id, content hash) to fetch single schemas on demand
+@app.route('/api/schemas', methods=["GET"])
+def get_schema_index():
+    def build(entries):
+        return [{"name": name, "id": entry["id"], "hash": entry["hash"]} for name, entry in entries.items()]
+    version, body, encoding = schema_registry.payload("index", build, gzip_ok=accepts_gzip())
+    return cached_json_response(version, body, encoding)
+
+@app.route('/api/schemas/<path:name>', methods=["GET"])
+def get_schema(name):
+    entry = schema_registry.get(name)
+    if entry is None:
+        return {"error": f"Schema '{name}' not found"}, 404
+
+    def build(entries):
+        return {"name": name, "id": entry["id"], "hash": entry["hash"], "schema": entry["content"]}
+    _, body, encoding = schema_registry.payload(("schema", name, entry["hash"]), build, gzip_ok=accepts_gzip())
+    return cached_json_response(entry["hash"], body, encoding)
 
 @app.route('/api/save_schema', methods=["POST"])
 def save_schema():
     data = request.json
-    logger.info(f"Received data: {data}")
+    logger.debug(f"Received data: {data}")
     schema_name = data.get("schemaName")
     schema_content = data.get("schema")
 
@@ -264,14 +216,30 @@ def save_schema():
             
             # Convert the updated schema dictionary back to JSON
             updated_schema_content = json.dumps(schema_dict, indent=2)
+
+            if data.get("recreate"):
+                # Explicit opt-in to the old DROP/CREATE behaviour, discards all rows
+                logger.info('CREATE IS CALLED')
+                create_table_from_schema(schema_name, updated_schema_content)
+                plan = None
+            else:
+                # Migrate the table in place before the schema file changes
+                plan = migrate_table_from_schema(
+                    schema_name,
+                    updated_schema_content,
+                    dry_run=bool(data.get("dryRun")),
+                    drop_removed=bool(data.get("dropRemovedColumns")),
+                )
+                if data.get("dryRun"):
+                    return {"message": f"Migration plan for '{schema_name}'", "migration": plan}, 200
+            table_metadata.invalidate()
+
             SCHEMA_DIR.mkdir(parents=True, exist_ok=True)
             schema_path = SCHEMA_DIR / f"{schema_name}.json"
             with open(schema_path, "w", encoding="utf-8") as file:
                 file.write(updated_schema_content)
-                # Create the corresponding table in the database
-                logger.info('CREATE IS CALLED')
-                create_table_from_schema(schema_name, updated_schema_content)
-            return {"message": f"Schema '{schema_name}' saved successfully"}, 200
+            schema_registry.invalidate(schema_path.relative_to(SCHEMA_DIR).as_posix())
+            return {"message": f"Schema '{schema_name}' saved successfully", "migration": plan}, 200
         except Exception as e:
             return {"error": str(e)}, 500
     else:
@@ -280,94 +248,156 @@ def save_schema():
 # API Endpoint: Get list of tables
 @app.route("/api/tables", methods=["GET"])
 def get_tables():
-    connection = None
-    try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        logger.info('CONNECTION TO DB IS SUCCESSFUL')
-    except pymysql.Error as e:
-        logger.error(f'Error connecting to MariaDB: {e}')
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SHOW TABLES")
-            tables = [table[0] for table in cursor.fetchall()]
-            return jsonify(tables)
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                tables = table_metadata.tables(cursor)
+        return jsonify(tables)
     except Exception as e:
         return jsonify({"error": f"Error retrieving tables: {str(e)}"}), 500
 
 # API Endpoint: Get data from a specific table
+# Without paging arguments the whole table is returned as a JSON array. With any of
+# limit/cursor/columns/sort/filters/count a single page is returned together with
+# the cursor of the next page and a row count hint. stream=ndjson|json sends every
+# matching row through an unbuffered cursor instead.
 @app.route("/api/data/<string:table>", methods=["GET"])
 def get_table_data(table):
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        logger.info('CONNECTION TO DB IS SUCCESSFUL')
-    except pymysql.Error as e:
-        logger.error(f'Error connecting to MariaDB: {e}')
-    try:
-        with connection.cursor() as cursor:
-            query = f"SELECT * FROM `{table}`"
-            cursor.execute(query)
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            data = [dict(zip(columns, row)) for row in results]
-            return jsonify(data)
+        if request.args.get("stream"):
+            return stream_table_data(table, request.args)
+        if wants_paging(request.args):
+            return jsonify(fetch_table_page(table, request.args))
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = f"SELECT * FROM `{table}`"
+                cursor.execute(query)
+                results = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        data = [dict(zip(columns, row)) for row in results]
+        return jsonify(data)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Error retrieving data from table {table}: {str(e)}"}), 500
 
+def build_table_query(table):
+    return lambda cursor: TableQuery.for_table(cursor, table, describe=table_metadata.describe)
+
+def fetch_table_page(table, args):
+    return fetch_page(build_table_query(table), args, estimate_table=table)
+
+def fetch_page(build_query, args, estimate_table=None):
+    count_mode = args.get("count", "estimate")
+    if count_mode not in ("estimate", "exact", "none"):
+        raise QueryError("count must be one of estimate, exact, none")
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            query = build_query(cursor)
+            query.apply_args(args, MAX_PAGE_SIZE)
+            sql, params = query.select_sql()
+            logger.debug(f'DB QUERY: {sql}')
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            names = [desc[0] for desc in cursor.description]
+            total, estimated = None, False
+            if count_mode == "exact":
+                cursor.execute(*query.count_sql())
+                total = cursor.fetchone()[0]
+            elif count_mode == "estimate" and estimate_table and not query.where:
+                total, estimated = estimate_row_count(cursor, estimate_table), True
+    data, next_cursor = query.page(names, rows)
+    return {
+        "columns": query.projection,
+        "data": data,
+        "limit": query.limit,
+        "next_cursor": next_cursor,
+        "total": total,
+        "total_is_estimate": estimated,
+    }
+
+def get_stream_format(args):
+    fmt = args.get("stream")
+    if fmt not in STREAM_MIMETYPES:
+        raise QueryError(f"stream must be one of {', '.join(STREAM_MIMETYPES)}")
+    return fmt
+
+def streaming_response(stream):
+    response = Response(stream, mimetype=stream.mimetype)
+    # Let Nginx pass chunks through instead of buffering the whole body
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def open_query_stream(build_query, args, fmt):
+    def execute(connection, cursor):
+        with connection.cursor() as meta_cursor:
+            query = build_query(meta_cursor)
+        query.apply_args(args, MAX_PAGE_SIZE, paged=False)
+        sql, params = query.select_sql()
+        logger.debug(f'DB QUERY: {sql}')
+        cursor.execute(sql, params)
+        return query.projection
+
+    return open_stream(db_pool, execute, fmt, app.json.dumps, cursor_class=TimedSSCursor)
+
+def stream_query(build_query, args):
+    return streaming_response(open_query_stream(build_query, args, get_stream_format(args)))
+
+def export_query(build_query, args, name):
+    # Same query path as the streamed reads: columns/sort/filters apply server-side
+    fmt = args.get("format", "csv")
+    filename = safe_filename(name)
+    if fmt == "csv":
+        response = streaming_response(open_query_stream(build_query, args, "csv"))
+    elif fmt == "xlsx":
+        stream = open_query_stream(build_query, args, "json")
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        workbook_file = tempfile.TemporaryFile(dir=TEMP_DIR)
+        try:
+            write_xlsx(stream, workbook_file, name)
+        except BaseException:
+            workbook_file.close()
+            raise
+        finally:
+            stream.close()
+        count_rows(stream.rows_sent)
+        workbook_file.seek(0)
+        response = send_file(workbook_file, mimetype=XLSX_MIMETYPE)
+    else:
+        raise QueryError("format must be one of csv, xlsx")
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+def stream_table_data(table, args):
+    return stream_query(build_table_query(table), args)
+
+# API Endpoint: Export a table as CSV (streamed) or XLSX
+@app.route("/api/export/<string:table>", methods=["GET"])
+def export_table(table):
+    try:
+        return export_query(build_table_query(table), request.args, table)
+    except (QueryError, ExportUnavailable) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Error exporting table {table}: {str(e)}"}), 500
+
 # API Endpoint: Get column information of a table
 @app.route("/api/columns/<string:table>", methods=["GET"])
 def get_columns(table):
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        logger.info('CONNECTION TO DB IS SUCCESSFUL')
-    except pymysql.Error as e:
-        logger.error(f'Error connecting to MariaDB: {e}')
-    try:
-        with connection.cursor() as cursor:
-            query = f"DESCRIBE `{table}`"
-            cursor.execute(query)
-            results = cursor.fetchall()
-            columns = [
-                {"name": col[0], "type": col[1], "nullable": col[2] == "YES",
-                 "key": col[3], "default": col[4], "extra": col[5]}
-                for col in results
-            ]
-            return jsonify(columns)
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                columns = table_metadata.describe(cursor, table)
+        return jsonify(columns)
     except Exception as e:
         return jsonify({"error": f"Error retrieving column info for table {table}: {str(e)}"}), 500
 
 # API Endpoint: Perform LEFT JOIN on two tables
+# The join runs in MariaDB; columns of table2 are suffixed with _condition. Accepts
+# the same paging (limit/cursor/columns/sort/filters/count) and stream arguments as
+# /api/data/<table>, the unpaged response keeps its {"columns", "data"} shape.
 @app.route("/api/left-join", methods=["GET"])
 def left_join():
-    try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        logger.info('CONNECTION TO DB IS SUCCESSFUL')
-    except pymysql.Error as e:
-        logger.error(f'Error connecting to MariaDB: {e}')
     table1 = request.args.get("table1")
     table2 = request.args.get("table2")
     column1 = request.args.get("column1")
@@ -377,42 +407,101 @@ def left_join():
     if not all([table1, table2, column1, column2]):
         return jsonify({"error": "Missing parameters: table1, table2, column1, column2"}), 400
 
+    def build_query(cursor):
+        return TableQuery.for_left_join(cursor, table1, table2, column1, column2, describe=table_metadata.describe)
+
     try:
-        with connection.cursor() as cursor:
-            # 1. SELECT all from table A (experiments)
-            cursor.execute(f"SELECT * FROM `{table1}`")
-            table_a_data = cursor.fetchall()
-
-            # 2. SELECT all from table B (conditions)
-            cursor.execute(f"SELECT * FROM `{table2}`")
-            table_b_data = cursor.fetchall()
-
-            # Build lookup for Table B
-            b_lookup = {row[column2]: row for row in table_b_data}
-
-            # 4. Merge Table A with Table B based on sample_id
-            merged_data = []
-            for a_row in table_a_data:
-                sample_id = a_row[column1]
-                b_row = b_lookup.get(sample_id, {})
-
-                # Prefix B fields to avoid conflict
-                b_row_prefixed = {f"{k}_condition": v for k, v in b_row.items() if k != column2}
-                # Merge rows: Table A + Table B (prefixed)
-                merged_row = {**a_row, **b_row_prefixed}
-                merged_data.append(merged_row)
-
-            if merged_data:
-                columns = list(merged_data[0].keys())
-            else:
-                columns = []
-            return jsonify({
-                "columns": columns,
-                "data": merged_data
-            })
-            # return jsonify(results)
+        if request.args.get("stream"):
+            return stream_query(build_query, request.args)
+        if wants_paging(request.args):
+            return jsonify(fetch_page(build_query, request.args))
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = build_query(cursor)
+                sql, params = query.select_sql()
+                logger.debug(f'DB QUERY: {sql}')
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        return jsonify({
+            "columns": columns,
+            "data": [dict(zip(columns, row)) for row in rows]
+        })
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Error performing LEFT JOIN: {str(e)}"}), 500
 
+# API Endpoint: Export a LEFT JOIN as CSV (streamed) or XLSX
+@app.route("/api/left-join/export", methods=["GET"])
+def export_left_join():
+    table1 = request.args.get("table1")
+    table2 = request.args.get("table2")
+    column1 = request.args.get("column1")
+    column2 = request.args.get("column2")
+
+    if not all([table1, table2, column1, column2]):
+        return jsonify({"error": "Missing parameters: table1, table2, column1, column2"}), 400
+
+    def build_query(cursor):
+        return TableQuery.for_left_join(cursor, table1, table2, column1, column2, describe=table_metadata.describe)
+
+    try:
+        return export_query(build_query, request.args, f"{table1}_{table2}")
+    except (QueryError, ExportUnavailable) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Error exporting LEFT JOIN: {str(e)}"}), 500
+
+# API Endpoint: Migration history of a schema table
+@app.route("/api/schema_migrations/<string:table>", methods=["GET"])
+def get_schema_migrations(table):
+    try:
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                history = migration_history(cursor, table)
+            connection.commit()
+        return jsonify(history)
+    except Exception as e:
+        return jsonify({"error": f"Error retrieving migration history for table {table}: {str(e)}"}), 500
+
+# API Endpoint: Connection pool metrics of this worker
+@app.route("/api/db_pool", methods=["GET"])
+def get_db_pool_stats():
+    return jsonify(db_pool.stats())
+
+# API Endpoint: Per-route latency, DB and serialization time of this worker
+@app.route("/api/timing", methods=["GET"])
+def get_request_timing():
+    return jsonify(request_timer.stats())
+
+# API Endpoint: Sampling profiler of this worker (API_PROFILER in db_config.json)
+# POST starts a profile of ?seconds=, GET returns it as JSON or ?format=collapsed
+# stacks for flamegraph.pl/speedscope
+@app.route("/api/debug/profile", methods=["GET", "POST"])
+def sampling_profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled, set API_PROFILER in db_config.json"}), 404
+    if request.method == "POST":
+        try:
+            duration, interval = profiler.start(request.args.get("seconds", 30), request.args.get("interval", 0.005))
+        except ValueError:
+            return jsonify({"error": "seconds and interval must be numbers"}), 400
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify({"pid": os.getpid(), "seconds": duration, "interval": interval}), 202
+    result = profiler.result()
+    if result is None:
+        return jsonify({"error": "No profile recorded in this worker"}), 404
+    if request.args.get("format") == "collapsed":
+        return Response(collapsed(result["stacks"]), mimetype="text/plain")
+    return jsonify({
+        "pid": result["pid"],
+        "running": result["running"],
+        "samples": result["samples"],
+        "interval": result["interval"],
+        "top": top_functions(result["stacks"], result["samples"], request.args.get("limit", 30, type=int)),
+    })
+
 # if __name__ == "__main__":
 #    app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,411 @@
+"""Load test of the DB-UI API endpoints against a local gunicorn.
+
+    python api_benchmark.py [--rows 100000] [--clients 16] [--duration 20] [--json results.json]
+
+Creates a scratch database ``api_bench_<pid>`` on the configured server, seeds
+two tables (bench_samples, bench_conditions) into it, starts gunicorn on a free
+port against that database and drives /api/data, /api/left-join,
+/api/columns and /api/get_schemas with concurrent keep-alive clients, one
+endpoint after the other. Per endpoint it reports p50/p95/p99 latency,
+throughput and the peak RSS of the gunicorn workers; --json saves the results
+together with the current commit so runs can be compared. The application
+database itself is never written to.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+import pymysql
+
+from schema_tables import build_create_table_sql
+
+logger = logging.getLogger("api_benchmark")
+
+BACKEND_DIR = Path(__file__).resolve().parent
+SAMPLES_TABLE = "bench_samples"
+CONDITIONS_TABLE = "bench_conditions"
+SEED_CHUNK = 1000
+
+SAMPLE_PROPERTIES = {
+    "Identifier": {"type": "string"},
+    "SampleID": {"type": "string"},
+    "Creator": {"type": "string"},
+    "Date": {"type": "string"},
+    "RamanLaserPower": {"type": "number"},
+    "Accumulations": {"type": "integer"},
+    "Calibrated": {"type": "boolean"},
+    "Settings": {"type": "object"},
+}
+CONDITION_PROPERTIES = {
+    "Identifier": {"type": "string"},
+    "SampleID": {"type": "string", "x-index": True},
+    "ReactorType": {"type": "string"},
+    "FlameTemperature": {"type": "number"},
+    "CarrierGasFlowRate": {"type": "number"},
+}
+
+
+def load_db_config():
+    with open(os.path.join(BACKEND_DIR, 'conf', 'db_config.json'), 'r') as f:
+        return json.load(f)
+
+
+def endpoints(table1, table2):
+    join = {"table1": table1, "table2": table2, "column1": "SampleID", "column2": "SampleID"}
+    return {
+        "data": f"/api/data/{table1}",
+        "data_page": f"/api/data/{table1}?" + urlencode({"limit": 100, "sort": "-Date"}),
+        "left_join": "/api/left-join?" + urlencode(join),
+        "left_join_page": "/api/left-join?" + urlencode(dict(join, limit=100)),
+        "columns": f"/api/columns/{table1}",
+        "get_schemas": "/api/get_schemas",
+    }
+
+
+def seed_tables(connection, rows, join_rows, seed):
+    rng = random.Random(seed)
+    sample_ids = [f"S-{i:07d}" for i in range(max(1, rows // 4))]
+    with connection.cursor() as cursor:
+        for table, properties in ((SAMPLES_TABLE, SAMPLE_PROPERTIES), (CONDITIONS_TABLE, CONDITION_PROPERTIES)):
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+            cursor.execute(build_create_table_sql(table, properties))
+        for start in range(0, rows, SEED_CHUNK):
+            cursor.executemany(
+                f"INSERT INTO `{SAMPLES_TABLE}` (Identifier, SampleID, Creator, Date, RamanLaserPower, "
+                "Accumulations, Calibrated, Settings, documentlocation) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                [
+                    (f"EXP-{i:08d}", rng.choice(sample_ids), rng.choice(["Dr. Jane Doe", "Dr. John Roe"]),
+                     f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", round(rng.uniform(1, 50), 2),
+                     rng.randint(1, 20), rng.random() < 0.5, json.dumps({"grating": rng.choice([600, 1200, 1800])}),
+                     f"https://example.org/remote.php/dav/files/bench/EXP-{i:08d}.json")
+                    for i in range(start, min(start + SEED_CHUNK, rows))
+                ],
+            )
+            connection.commit()
+        for start in range(0, join_rows, SEED_CHUNK):
+            cursor.executemany(
+                f"INSERT INTO `{CONDITIONS_TABLE}` (Identifier, SampleID, ReactorType, FlameTemperature, "
+                "CarrierGasFlowRate, documentlocation) VALUES (%s, %s, %s, %s, %s, %s)",
+                [
+                    (f"SYN-{i:08d}", sample_ids[i % len(sample_ids)], rng.choice(["FSP", "LFSP", "Hot wall"]),
+                     round(rng.uniform(1500, 2800), 1), round(rng.uniform(1, 10), 2),
+                     f"https://example.org/remote.php/dav/files/bench/SYN-{i:08d}.json")
+                    for i in range(start, min(start + SEED_CHUNK, join_rows))
+                ],
+            )
+            connection.commit()
+        cursor.execute(f"ANALYZE TABLE `{SAMPLES_TABLE}`, `{CONDITIONS_TABLE}`")
+        cursor.fetchall()
+    logger.info(f'Seeded {rows} rows into {SAMPLES_TABLE} and {join_rows} rows into {CONDITIONS_TABLE}')
+
+
+class ScratchDatabase:
+    """Database the benchmark seeds and the benchmarked API reads.
+
+    Without ``name`` an ``api_bench_<pid>`` database is created on the configured
+    server and dropped on exit unless ``keep``; a given ``name`` (e.g. one kept
+    by an earlier run) is used as is and left in place. ``config_file`` is a copy
+    of db_config.json pointing at it, handed to gunicorn via DB_CONFIG_FILE.
+    """
+
+    def __init__(self, db_config, name=None, keep=False):
+        if name is not None and name == db_config['DB_NAME']:
+            raise SystemExit(f"Refusing to benchmark in the application database {name}")
+        self.db_config = db_config
+        self.created = name is None
+        self.name = name or f"api_bench_{os.getpid()}"
+        self.keep = keep
+        self.config_file = None
+
+    def connect(self, database=None):
+        return pymysql.connect(
+            host=self.db_config['DB_HOST'],
+            port=self.db_config['DB_PORT'],
+            user=self.db_config['DB_USER'],
+            password=self.db_config['DB_PASSWORD'],
+            database=database,
+        )
+
+    def __enter__(self):
+        if self.created:
+            connection = self.connect()
+            with connection.cursor() as cursor:
+                cursor.execute(f"CREATE DATABASE `{self.name}` CHARACTER SET utf8mb4")
+            connection.close()
+        fd, self.config_file = tempfile.mkstemp(prefix="api-bench-", suffix=".json")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dict(self.db_config, DB_NAME=self.name), f)
+        logger.info(f'Benchmark database: {self.name}')
+        return self
+
+    def __exit__(self, *exc):
+        os.unlink(self.config_file)
+        if not self.created or self.keep:
+            logger.info(f'Keeping benchmark database {self.name}')
+            return
+        connection = self.connect()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{self.name}`")
+        connection.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(port, workers, threads, config_file):
+    command = [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+               "--threads", str(threads), "--log-level", "warning", "api:app"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ, DB_CONFIG_FILE=config_file))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/api/schemas")
+            connection.getresponse().read()
+            connection.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("gunicorn did not start within 30s")
+
+
+def child_pids(pid):
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name may contain spaces; the parent pid follows the closing paren
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+
+def rss_mb(pid):
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of the gunicorn workers (children of ``pid``) from /proc.
+    Reports nothing on platforms without /proc or when gunicorn is external."""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_worker = None
+        self.peak_total = None
+
+    def run(self):
+        if self.pid is None or not Path("/proc").is_dir():
+            return
+        while not self.stopped.is_set():
+            sizes = [size for size in (rss_mb(pid) for pid in child_pids(self.pid)) if size is not None]
+            if sizes:
+                self.peak_worker = max(self.peak_worker or 0, max(sizes))
+                self.peak_total = max(self.peak_total or 0, sum(sizes))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_client(host, port, path, deadline, max_requests, results, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=120)
+    latencies, errors, received = [], 0, 0
+    try:
+        while time.monotonic() < deadline and (max_requests is None or len(latencies) + errors < max_requests):
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=120)
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status >= 400:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            received += len(body)
+    finally:
+        connection.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["errors"] += errors
+        results["bytes"] += received
+
+
+def run_endpoint(name, base_url, path, clients, duration, requests_per_client, warmup, gunicorn_pid):
+    parsed = urlparse(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    prefix = parsed.path.rstrip("/")
+    for _ in range(warmup):
+        connection = http.client.HTTPConnection(host, port, timeout=120)
+        connection.request("GET", prefix + path)
+        connection.getresponse().read()
+        connection.close()
+
+    results = {"latencies": [], "errors": 0, "bytes": 0}
+    lock = threading.Lock()
+    sampler = MemorySampler(gunicorn_pid)
+    sampler.start()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=run_client, args=(host, port, prefix + path, deadline, requests_per_client, results, lock))
+        for _ in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+
+    ordered = sorted(results["latencies"])
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    result = {
+        "endpoint": name,
+        "path": path,
+        "requests": len(ordered),
+        "errors": results["errors"],
+        "throughput_rps": round(len(ordered) / elapsed, 1),
+        "mean_ms": ms(statistics.fmean(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p95_ms": ms(percentile(ordered, 0.95)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1]) if ordered else None,
+        "bytes_per_response": int(results["bytes"] / len(ordered)) if ordered else None,
+        "peak_worker_rss_mb": round(sampler.peak_worker, 1) if sampler.peak_worker else None,
+        "peak_total_rss_mb": round(sampler.peak_total, 1) if sampler.peak_total else None,
+    }
+    logger.info(
+        f'{name:15} {result["requests"]:7d} req {result["errors"]:5d} err {result["throughput_rps"]:8.1f} req/s  '
+        f'p50 {result["p50_ms"]} ms  p95 {result["p95_ms"]} ms  p99 {result["p99_ms"]} ms  '
+        f'worker RSS {result["peak_worker_rss_mb"]} MB'
+    )
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the DB-UI API endpoints")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows seeded into bench_samples")
+    parser.add_argument("--join-rows", type=int, help="Rows seeded into bench_conditions (default: rows / 4)")
+    parser.add_argument("--database", help="Use this existing scratch database instead of creating one (required with --url)")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the bench tables already in --database")
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the created scratch database afterwards")
+    parser.add_argument("--endpoints", help="Comma-separated subset of: " + ", ".join(endpoints("t1", "t2")))
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent keep-alive clients per endpoint")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per endpoint")
+    parser.add_argument("--requests", type=int, help="Stop each client after this many requests")
+    parser.add_argument("--warmup", type=int, default=3, help="Requests sent before measuring an endpoint")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--url", help="Benchmark an already running API (e.g. http://127.0.0.1:5000) serving --database instead of starting gunicorn")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated rows")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    scenarios = endpoints(SAMPLES_TABLE, CONDITIONS_TABLE)
+    if args.endpoints:
+        names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+        unknown = [name for name in names if name not in scenarios]
+        if unknown:
+            parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+        scenarios = {name: scenarios[name] for name in names}
+    if args.url and not args.database:
+        parser.error("--url needs --database, the scratch database that server reads")
+    if args.no_seed and not args.database:
+        parser.error("--no-seed needs --database")
+    join_rows = args.join_rows if args.join_rows is not None else args.rows // 4
+
+    server = None
+    results = []
+    with ScratchDatabase(load_db_config(), args.database, args.keep_db) as db:
+        try:
+            if not args.no_seed:
+                connection = db.connect(db.name)
+                try:
+                    seed_tables(connection, args.rows, join_rows, args.seed)
+                finally:
+                    connection.close()
+            base_url = args.url
+            if base_url is None:
+                port = free_port()
+                server = start_gunicorn(port, args.workers, args.threads, db.config_file)
+                base_url = f"http://127.0.0.1:{port}"
+            for name, path in scenarios.items():
+                results.append(run_endpoint(name, base_url, path, args.clients, args.duration, args.requests,
+                                            args.warmup, server.pid if server else None))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+    if args.json:
+        report = {
+            "commit": current_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "settings": {
+                "rows": args.rows, "join_rows": join_rows, "clients": args.clients, "duration": args.duration,
+                "requests": args.requests, "workers": args.workers, "threads": args.threads, "url": args.url,
+                "database": args.database,
+            },
+            "results": results,
+        }
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        logger.info(f'Results written to {args.json}')
+
+
+if __name__ == "__main__":
+    main()
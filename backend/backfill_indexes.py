@@ -0,0 +1,79 @@
+"""Add the indexes create_table_from_schema now emits to tables created before it did.
+
+    python backfill_indexes.py [--dry-run] [schema_name ...]
+
+Every schema in backend/schemas (or only the given ones) is matched to the table of
+the same name; missing indexes are added online (ALGORITHM=INPLACE, LOCK=NONE).
+"""
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+
+import pymysql
+
+from schema_tables import extract_properties, missing_index_statements
+
+logger = logging.getLogger("backfill_indexes")
+
+BACKEND_DIR = Path(__file__).resolve().parent
+SCHEMA_DIR = BACKEND_DIR / "schemas"
+
+
+def load_db_config():
+    with open(os.path.join(BACKEND_DIR, 'conf', 'db_config.json'), 'r') as f:
+        return json.load(f)
+
+
+def table_exists(cursor, table):
+    cursor.execute("SHOW TABLES LIKE %s", (table,))
+    return cursor.fetchone() is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill Identifier/x-index indexes on schema tables")
+    parser.add_argument("schemas", nargs="*", help="Schema names (default: all files in backend/schemas)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the statements without executing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    schema_files = sorted(SCHEMA_DIR.glob("*.json"))
+    if args.schemas:
+        schema_files = [SCHEMA_DIR / f"{name}.json" for name in args.schemas]
+
+    db_config = load_db_config()
+    connection = pymysql.connect(
+        host=db_config['DB_HOST'],
+        port=db_config['DB_PORT'],
+        user=db_config['DB_USER'],
+        password=db_config['DB_PASSWORD'],
+        database=db_config['DB_NAME']
+    )
+    try:
+        with connection.cursor() as cursor:
+            for schema_file in schema_files:
+                table = schema_file.stem
+                if not schema_file.exists():
+                    logger.warning(f'Schema file not found: {schema_file}')
+                    continue
+                if not table_exists(cursor, table):
+                    logger.info(f'Table `{table}` does not exist, skipping')
+                    continue
+                schema = json.loads(schema_file.read_text(encoding='utf-8'))
+                flattened_properties = extract_properties(schema.get("properties", {}))
+                statements = missing_index_statements(cursor, table, flattened_properties)
+                if not statements:
+                    logger.info(f'Table `{table}` already has all indexes')
+                for statement in statements:
+                    logger.info(f'{"DRY RUN: " if args.dry_run else ""}{statement}')
+                    if not args.dry_run:
+                        cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created_at", "last_used", "checked_out_at", "checkout_stack", "leak_reported")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.checked_out_at = None
+        self.checkout_stack = None
+        self.leak_reported = False
+
+
+class ConnectionPool:
+    """Thread-safe pool of pymysql connections, one instance per worker process.
+
+    Connections are opened lazily up to ``max_size``. Idle connections older than
+    ``idle_timeout`` (or alive longer than ``max_lifetime``) are closed, connections
+    that sat idle longer than ``health_check_interval`` are pinged before reuse and
+    connections held longer than ``leak_timeout`` are reported with the stack that
+    checked them out. Long-running holders such as streamed responses call
+    ``touch()`` while they make progress, so only a stalled one is reported.
+    """
+
+    def __init__(self, connect_kwargs, max_size=10, idle_timeout=300, max_lifetime=3600,
+                 acquire_timeout=10, health_check_interval=30, leak_timeout=60):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.leak_timeout = leak_timeout
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+        self._counters = {
+            "created": 0,
+            "closed": 0,
+            "acquired": 0,
+            "released": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "leaks_detected": 0,
+        }
+        self._wait_time_total = 0.0
+
+    def _check_fork(self):
+        # Connections inherited from a parent process (gunicorn --preload) share
+        # their sockets with it, so drop them without sending COM_QUIT.
+        if os.getpid() != self._pid:
+            self._reset_state()
+
+    def _connect(self):
+        conn = pymysql.connect(autocommit=False, **self.connect_kwargs)
+        logger.debug('DB POOL: opened new connection')
+        return _PoolEntry(conn)
+
+    def _close(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return True
+        return bool(self.idle_timeout) and now - entry.last_used > self.idle_timeout
+
+    def _evict_idle_locked(self, now):
+        expired = [entry for entry in self._idle if self._expired(entry, now)]
+        if expired:
+            self._idle = [entry for entry in self._idle if entry not in expired]
+            self._size -= len(expired)
+            self._counters["closed"] += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def _detect_leaks_locked(self, now):
+        if not self.leak_timeout:
+            return
+        for entry in self._in_use.values():
+            if entry.leak_reported or now - entry.checked_out_at <= self.leak_timeout:
+                continue
+            entry.leak_reported = True
+            self._counters["leaks_detected"] += 1
+            logger.warning(
+                f'DB POOL: connection checked out for {now - entry.checked_out_at:.1f}s, possible leak. '
+                f'Checked out at:\n{"".join(entry.checkout_stack or [])}'
+            )
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        entry = None
+        with self._cond:
+            self._check_fork()
+            expired = self._evict_idle_locked(start)
+            self._detect_leaks_locked(start)
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolExhausted(
+                        f"No database connection available within {self.acquire_timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+        for stale in expired:
+            self._close(stale)
+
+        if entry is None:
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._counters["created"] += 1
+        elif self.health_check_interval and time.monotonic() - entry.last_used > self.health_check_interval:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                logger.info('DB POOL: health check failed, replacing connection')
+                self._close(entry)
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._counters["health_check_failures"] += 1
+                        self._counters["closed"] += 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters["health_check_failures"] += 1
+                    self._counters["closed"] += 1
+                    self._counters["created"] += 1
+
+        now = time.monotonic()
+        entry.checked_out_at = now
+        entry.leak_reported = False
+        entry.checkout_stack = traceback.format_stack(limit=8)[:-1] if self.leak_timeout else None
+        with self._cond:
+            self._in_use[id(entry.conn)] = entry
+            self._counters["acquired"] += 1
+            self._wait_time_total += now - start
+        return entry.conn
+
+    def touch(self, conn):
+        """Restart the leak timer of a checked-out connection that is still in use."""
+        with self._cond:
+            entry = self._in_use.get(id(conn))
+            if entry is not None:
+                entry.checked_out_at = time.monotonic()
+                entry.leak_reported = False
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            logger.warning('DB POOL: released a connection that is not checked out from this pool')
+            return
+
+        if not discard:
+            # End any open transaction so the next borrower gets a fresh snapshot.
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._counters["released"] += 1
+            if discard or conn.open is False:
+                self._size -= 1
+                self._counters["discarded"] += 1
+                self._counters["closed"] += 1
+                self._cond.notify()
+            else:
+                entry.last_used = time.monotonic()
+                entry.checked_out_at = None
+                entry.checkout_stack = None
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._close(entry)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (pymysql.OperationalError, pymysql.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._counters["closed"] += len(idle)
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self):
+        with self._cond:
+            self._check_fork()
+            now = time.monotonic()
+            acquired = self._counters["acquired"]
+            return {
+                "pid": self._pid,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "oldest_checkout_seconds": max(
+                    (now - entry.checked_out_at for entry in self._in_use.values()), default=0.0
+                ),
+                "avg_wait_ms": (self._wait_time_total / acquired * 1000.0) if acquired else 0.0,
+                **self._counters,
+            }
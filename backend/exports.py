@@ -0,0 +1,69 @@
+import datetime
+import decimal
+import json
+import re
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_SHEET_NAME = 31
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def safe_sheet_name(name):
+    # Same rules as the DB UI's client-side export
+    cleaned = re.sub(r"[\[\]:*?/\\]", "_", name or "Data")
+    return cleaned[:XLSX_MAX_SHEET_NAME]
+
+
+def safe_filename(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name or "data")
+
+
+def xlsx_cell(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def write_xlsx(stream, fileobj, sheet_name):
+    """Write the rows of a RowStream to ``fileobj`` as an XLSX workbook.
+
+    XlsxWriter's constant_memory mode flushes every finished row to a temporary
+    file, so memory stays flat regardless of the row count. Rows beyond Excel's
+    sheet limit continue on additional sheets.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ExportUnavailable("XLSX export requires the XlsxWriter package")
+
+    workbook = xlsxwriter.Workbook(fileobj, {"constant_memory": True, "in_memory": False,
+                                             "strings_to_numbers": False, "strings_to_urls": False})
+    base_name = safe_sheet_name(sheet_name)
+    columns = stream.columns
+    worksheet = None
+    sheet_count = 0
+    row_index = XLSX_MAX_ROWS
+    for record in stream.records():
+        if row_index >= XLSX_MAX_ROWS:
+            sheet_count += 1
+            suffix = f" ({sheet_count})" if sheet_count > 1 else ""
+            worksheet = workbook.add_worksheet(base_name[:XLSX_MAX_SHEET_NAME - len(suffix)] + suffix)
+            worksheet.write_row(0, 0, columns)
+            row_index = 1
+        worksheet.write_row(row_index, 0, [xlsx_cell(record.get(name)) for name in columns])
+        row_index += 1
+    if worksheet is None:
+        workbook.add_worksheet(base_name).write_row(0, 0, columns)
+    workbook.close()
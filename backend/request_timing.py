@@ -0,0 +1,247 @@
+import collections
+import logging
+import threading
+import time
+
+import pymysql
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+RECENT_REQUESTS = 1000
+MAX_LOGGED_SQL = 4000
+
+
+def _current_timing():
+    return g.get("timing") if has_request_context() else None
+
+
+def _current_route():
+    return f' ({request.method} {request.path})' if has_request_context() else ''
+
+
+def count_rows(rows):
+    """Add rows produced outside a cursor's rowcount (e.g. read from a RowStream
+    within the view) to the current request's timing."""
+    timing = _current_timing()
+    if timing is not None:
+        timing["rows"] += rows
+
+
+class TimedCursorMixin:
+    """Adds the time of every query to the current request's timing and logs
+    queries slower than ``slow_query_seconds`` together with their EXPLAIN plan."""
+
+    # Set by RequestTimer.init_app; None disables the slow-query log
+    slow_query_seconds = None
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, args)
+        finally:
+            elapsed = time.perf_counter() - started
+            timing = _current_timing()
+            if timing is not None:
+                timing["db"] += elapsed
+                timing["queries"] += 1
+        if timing is not None and self.description is not None:
+            timing["rows"] += max(self.rowcount, 0)
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            self._log_slow_query(elapsed)
+        return result
+
+    def _explain(self, sql, connection):
+        if connection is None or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        try:
+            with connection.cursor(pymysql.cursors.Cursor) as cursor:
+                cursor.execute(f"EXPLAIN {sql}")
+                names = [desc[0] for desc in cursor.description]
+                return [dict(zip(names, row)) for row in cursor.fetchall()]
+        except pymysql.Error as e:
+            return f"EXPLAIN failed: {e}"
+
+    def _log_slow_query(self, elapsed, route=None, connection=None, rows=None):
+        sql = self._executed or ""
+        if isinstance(sql, bytes):
+            sql = sql.decode("utf-8", errors="replace")
+        if route is None:
+            route = _current_route()
+        plan = self._explain(sql, connection or self.connection)
+        logger.warning(
+            f'SLOW QUERY {elapsed * 1000:.0f} ms{route}'
+            + (f', {rows} rows streamed' if rows is not None else '')
+            + f': {sql[:MAX_LOGGED_SQL]}'
+            + (f' PLAN: {plan}' if plan is not None else '')
+        )
+
+
+class TimedCursor(TimedCursorMixin, pymysql.cursors.Cursor):
+    pass
+
+
+class TimedSSCursor(TimedCursorMixin, pymysql.cursors.SSCursor):
+    """Unbuffered cursor for streamed responses.
+
+    Its rows are mostly read after the view returned, outside the request
+    context, so execute keeps a reference to the request's timing and every
+    fetch adds its time to it. The slow-query check runs on close, over execute
+    plus fetch time, once the result has been read and EXPLAIN can run.
+    """
+
+    _timing = None
+    _route = ''
+    _seconds = 0.0
+    _rows = 0
+
+    def execute(self, query, args=None):
+        self._timing = _current_timing()
+        self._route = _current_route()
+        self._seconds, self._rows = 0.0, 0
+        started = time.perf_counter()
+        try:
+            return pymysql.cursors.SSCursor.execute(self, query, args)
+        finally:
+            self._add(time.perf_counter() - started, queries=1)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._add(time.perf_counter() - started)
+        self._rows += len(rows)
+        return rows
+
+    def _add(self, seconds, queries=0):
+        self._seconds += seconds
+        if self._timing is not None:
+            self._timing["db"] += seconds
+            self._timing["queries"] += queries
+
+    def close(self):
+        connection = self.connection
+        super().close()
+        if connection is None or not self._executed:
+            return
+        if self.slow_query_seconds is not None and self._seconds >= self.slow_query_seconds:
+            self._log_slow_query(self._seconds, route=self._route, connection=connection, rows=self._rows)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, adding the time spent serializing to the request's timing."""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            timing = _current_timing()
+            if timing is not None:
+                timing["serialize"] += time.perf_counter() - started
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RequestTimer:
+    """Latency, DB time, serialization time, rows and bytes per route of this worker.
+
+    ``init_app`` installs the request hooks and the timed JSON provider. Queries
+    are only timed when the pool creates its connections with
+    ``cursorclass=TimedCursor``. Every response gets a Server-Timing header, which
+    the browser's network tab shows. ``stats()`` returns the per-route
+    aggregates, with percentiles over the last RECENT_REQUESTS requests.
+    Streamed responses are recorded when the last chunk has been sent.
+    """
+
+    def __init__(self, slow_query_ms=None):
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def init_app(self, app):
+        TimedCursorMixin.slow_query_seconds = self.slow_query_seconds
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.timing = {"started": time.perf_counter(), "db": 0.0, "serialize": 0.0, "queries": 0, "rows": 0}
+
+    def _finish(self, response):
+        timing = g.pop("timing", None)
+        if timing is None:
+            return response
+        elapsed = time.perf_counter() - timing["started"]
+        response.headers["Server-Timing"] = (
+            f'db;dur={timing["db"] * 1000:.1f}, serialize;dur={timing["serialize"] * 1000:.1f}, '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+        route = f'{request.method} {request.url_rule.rule if request.url_rule else "<unmatched>"}'
+        status = response.status_code
+        # send_file responses go to the server as they are and never run close callbacks
+        if response.is_streamed and not response.direct_passthrough:
+            started = timing["started"]
+            body = response.response
+
+            def closed():
+                # A RowStream counts what it sent; the response has been closed by now
+                timing["rows"] += getattr(body, "rows_sent", 0)
+                size = getattr(body, "bytes_sent", response.content_length)
+                self._record(route, status, time.perf_counter() - started, timing, size)
+            response.call_on_close(closed)
+        else:
+            self._record(route, status, elapsed, timing, response.calculate_content_length() or response.content_length)
+        return response
+
+    def _record(self, route, status, elapsed, timing, size):
+        logger.debug(
+            f'REQUEST {route} {status} {elapsed * 1000:.1f} ms (db {timing["db"] * 1000:.1f} ms, '
+            f'serialize {timing["serialize"] * 1000:.1f} ms, {timing["queries"]} queries, '
+            f'{timing["rows"]} rows, {size if size is not None else "unknown"} bytes)'
+        )
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    "count": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "db_seconds": 0.0,
+                    "serialize_seconds": 0.0, "queries": 0, "rows": 0, "bytes": 0,
+                    "recent": collections.deque(maxlen=RECENT_REQUESTS),
+                }
+            entry["count"] += 1
+            entry["errors"] += status >= 500
+            entry["seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+            entry["db_seconds"] += timing["db"]
+            entry["serialize_seconds"] += timing["serialize"]
+            entry["queries"] += timing["queries"]
+            entry["rows"] += timing["rows"]
+            entry["bytes"] += size or 0
+            entry["recent"].append(elapsed)
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(entry, recent=sorted(entry["recent"])) for route, entry in self._routes.items()}
+        result = {}
+        for route, entry in sorted(routes.items()):
+            count = entry["count"]
+            recent = entry.pop("recent")
+            result[route] = {
+                "count": count,
+                "errors": entry["errors"],
+                "mean_ms": round(entry["seconds"] / count * 1000, 2),
+                "p50_ms": round(_percentile(recent, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(recent, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(recent, 0.99) * 1000, 2),
+                "max_ms": round(entry["max_seconds"] * 1000, 2),
+                "db_ms_mean": round(entry["db_seconds"] / count * 1000, 2),
+                "serialize_ms_mean": round(entry["serialize_seconds"] / count * 1000, 2),
+                "queries_mean": round(entry["queries"] / count, 2),
+                "rows_mean": round(entry["rows"] / count, 1),
+                "bytes_mean": int(entry["bytes"] / count),
+            }
+        return result
@@ -0,0 +1,97 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+MAX_DURATION = 300
+MIN_INTERVAL = 0.001
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """Statistical profiler of the threads of this worker process.
+
+    ``start`` launches a background thread that records the stack of every other
+    thread every ``interval`` seconds for ``duration`` seconds, using
+    sys._current_frames(). Requests keep being served meanwhile, and the
+    overhead is one stack walk per thread and sample. Only one profile runs at a
+    time; ``result`` returns the running or the last finished one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._result = None
+
+    def start(self, duration, interval=0.005):
+        duration = min(max(float(duration), 0.1), MAX_DURATION)
+        interval = max(float(interval), MIN_INTERVAL)
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise ProfilerBusy("A profile is already running in this worker")
+            self._result = {"pid": os.getpid(), "duration": duration, "interval": interval,
+                            "running": True, "samples": 0, "stacks": collections.Counter()}
+            self._thread = threading.Thread(target=self._sample, args=(self._result,), name="sampling-profiler",
+                                            daemon=True)
+            self._thread.start()
+        return duration, interval
+
+    def _sample(self, result):
+        own = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + result["duration"]
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident != own:
+                        result["stacks"][self._collapse(names.get(ident, str(ident)), frame)] += 1
+                result["samples"] += 1
+            time.sleep(result["interval"])
+        with self._lock:
+            result["running"] = False
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+    def result(self):
+        with self._lock:
+            if self._result is None:
+                return None
+            return dict(self._result, stacks=collections.Counter(self._result["stacks"]))
+
+
+def collapsed(stacks):
+    """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks, samples, limit=30):
+    """Functions ordered by the share of samples in which they were running
+    (self) or on the stack (total)."""
+    own, total = collections.Counter(), collections.Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+    scale = 100 / samples if samples else 0
+    return [
+        {"function": name, "self_pct": round(count * scale, 1), "total_pct": round(total[name] * scale, 1)}
+        for name, count in own.most_common(limit)
+    ]
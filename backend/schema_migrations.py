@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import re
+from contextlib import contextmanager
+
+import pymysql
+
+from schema_tables import (
+    DOCUMENT_LOCATION_COLUMN,
+    build_create_table_sql,
+    missing_index_statements,
+    schema_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = "schema_migrations"
+LOCK_TIMEOUT = 30
+# MariaDB refuses LOCK=NONE for changes that need a table copy on older servers
+ER_ALTER_OPERATION_NOT_SUPPORTED = (1845, 1846)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def ensure_history_table(cursor):
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            table_name VARCHAR(64) NOT NULL,
+            schema_id VARCHAR(255),
+            schema_hash CHAR(64),
+            action VARCHAR(16),
+            statements TEXT,
+            status VARCHAR(16),
+            error TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            KEY ix_table_name (table_name)
+        )
+        """
+    )
+
+
+def schema_hash(schema_content):
+    return hashlib.sha256(schema_content.encode("utf-8")).hexdigest()
+
+
+def canonical_type(sql_type):
+    # information_schema reports BOOLEAN as tinyint(1), INT with a display width
+    # and JSON as longtext on MariaDB
+    normalized = sql_type.strip().lower()
+    if normalized in ("boolean", "bool", "tinyint(1)"):
+        return "tinyint(1)"
+    if normalized in ("json", "longtext"):
+        return "json"
+    return re.sub(r"^(tinyint|smallint|mediumint|int|bigint)\(\d+\)", r"\1", normalized)
+
+
+def live_columns(cursor, table):
+    cursor.execute(
+        "SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+        (table,),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    return {name: column_type for name, column_type in rows}
+
+
+@contextmanager
+def migration_lock(cursor, table):
+    # Serializes concurrent saves of the same schema across gunicorn workers
+    lock_name = f"schema_migration:{table}"
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (lock_name, LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise MigrationError(f"Timed out waiting for the migration lock of `{table}`")
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+        cursor.fetchone()
+
+
+def plan_migration(cursor, table, flattened_properties, drop_removed=False):
+    """Diff the flattened schema properties against the live table.
+
+    The live table, not the previous schema file, is the baseline, so columns
+    added or changed outside save_schema are taken into account. Columns that are
+    no longer in the schema are kept (and reported as ``removed``) unless
+    ``drop_removed`` is set.
+    """
+    current = live_columns(cursor, table)
+    if current is None:
+        return {
+            "table": table,
+            "action": "create",
+            "added": [name for name, _ in schema_columns(flattened_properties)],
+            "modified": [],
+            "removed": [],
+            "statements": [build_create_table_sql(table, flattened_properties)],
+        }
+
+    added, modified, removed, clauses = [], [], [], []
+    wanted = schema_columns(flattened_properties)
+    wanted_names = {name for name, _ in wanted}
+    for name, sql_type in wanted:
+        if name not in current:
+            added.append(name)
+            clauses.append(f"ADD COLUMN `{name}` {sql_type}")
+        elif canonical_type(current[name]) != canonical_type(sql_type):
+            modified.append({"column": name, "from": current[name], "to": sql_type})
+            clauses.append(f"MODIFY COLUMN `{name}` {sql_type}")
+    for name in current:
+        if name not in wanted_names and name != DOCUMENT_LOCATION_COLUMN:
+            removed.append(name)
+            if drop_removed:
+                clauses.append(f"DROP COLUMN `{name}`")
+    # All column changes go into one ALTER so the table is rebuilt at most once
+    statements = [f"ALTER TABLE `{table}` {', '.join(clauses)}"] if clauses else []
+    statements.extend(missing_index_statements(cursor, table, flattened_properties, new_columns=added))
+    return {
+        "table": table,
+        "action": "alter" if statements else "none",
+        "added": added,
+        "modified": modified,
+        "removed": removed,
+        "statements": statements,
+    }
+
+
+def execute_online(cursor, statement):
+    if not statement.startswith("ALTER TABLE") or "LOCK=" in statement:
+        cursor.execute(statement)
+        return
+    try:
+        cursor.execute(f"{statement}, LOCK=NONE")
+    except pymysql.err.OperationalError as e:
+        if not e.args or e.args[0] not in ER_ALTER_OPERATION_NOT_SUPPORTED:
+            raise
+        logger.warning(f'Online ALTER not supported, retrying with default locking: {statement}')
+        cursor.execute(statement)
+
+
+def record_migration(cursor, plan, schema_id, content_hash, status, error=None):
+    cursor.execute(
+        f"INSERT INTO {HISTORY_TABLE} (table_name, schema_id, schema_hash, action, statements, status, error) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (plan["table"], schema_id, content_hash, plan["action"], json.dumps(plan["statements"]), status, error),
+    )
+
+
+def apply_migration(connection, plan, schema_id, content_hash):
+    """Run the planned statements and record the outcome in the history table.
+
+    DDL commits implicitly, so a failure leaves the statements before it applied;
+    the history row lists the whole plan together with the error.
+    """
+    with connection.cursor() as cursor:
+        ensure_history_table(cursor)
+        try:
+            for statement in plan["statements"]:
+                logger.info(f'DB MIGRATION: {statement}')
+                execute_online(cursor, statement)
+        except pymysql.Error as e:
+            connection.rollback()
+            record_migration(cursor, plan, schema_id, content_hash, "failed", str(e))
+            connection.commit()
+            raise MigrationError(f"Migration of `{plan['table']}` failed: {e}")
+        record_migration(cursor, plan, schema_id, content_hash, "applied" if plan["statements"] else "noop")
+        connection.commit()
+
+
+def migration_history(cursor, table, limit=50):
+    ensure_history_table(cursor)
+    cursor.execute(
+        f"SELECT id, schema_id, schema_hash, action, statements, status, error, applied_at "
+        f"FROM {HISTORY_TABLE} WHERE table_name = %s ORDER BY id DESC LIMIT %s",
+        (table, limit),
+    )
+    return [
+        {"id": row[0], "schema_id": row[1], "schema_hash": row[2], "action": row[3],
+         "statements": json.loads(row[4] or "[]"), "status": row[5], "error": row[6],
+         "applied_at": row[7]}
+        for row in cursor.fetchall()
+    ]
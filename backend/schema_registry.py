@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+GZIP_MIN_BYTES = 1024
+
+
+class SchemaRegistry:
+    """In-process cache of the schema files below ``schema_dir``.
+
+    Each lookup stats the files and re-reads only those whose mtime or size
+    changed; ``invalidate`` drops entries right away after save_schema wrote them.
+    Serialized (and gzipped) payloads are cached per registry version, which is
+    also used as the ETag.
+    """
+
+    def __init__(self, schema_dir):
+        self.schema_dir = Path(schema_dir)
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._version = None
+        self._payloads = {}
+
+    def _read(self, path, stat):
+        content = path.read_text(encoding="utf-8")
+        try:
+            schema_id = json.loads(content).get("$id")
+        except (ValueError, AttributeError):
+            schema_id = None
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "content": content,
+            "hash": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            "id": schema_id,
+        }
+
+    def refresh(self):
+        self.schema_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            seen = set()
+            changed = False
+            for path in self.schema_dir.glob("**/*.json"):
+                name = path.relative_to(self.schema_dir).as_posix()
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                seen.add(name)
+                entry = self._entries.get(name)
+                if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    continue
+                self._entries[name] = self._read(path, stat)
+                changed = True
+            for name in set(self._entries) - seen:
+                del self._entries[name]
+                changed = True
+            if changed or self._version is None:
+                digest = hashlib.sha256()
+                for name in sorted(self._entries):
+                    digest.update(f"{name}\0{self._entries[name]['hash']}\n".encode("utf-8"))
+                self._version = digest.hexdigest()
+                self._payloads = {}
+            return self._version
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries = {}
+            else:
+                self._entries.pop(name, None)
+            self._version = None
+            self._payloads = {}
+
+    def get(self, name):
+        self.refresh()
+        with self._lock:
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
+
+    def payload(self, kind, build, gzip_ok=False):
+        """Serialized body for ``kind`` at the current version: ``(version, body, encoding)``.
+
+        ``build(entries)`` returns the JSON-serializable object; it is only called
+        when the schemas changed since the last call. With ``gzip_ok`` bodies of at
+        least GZIP_MIN_BYTES are returned gzip-compressed.
+        """
+        with self._lock:
+            version = self.refresh()
+            raw = self._payloads.get((kind, None))
+            if raw is None:
+                raw = json.dumps(build(dict(sorted(self._entries.items())))).encode("utf-8")
+                self._payloads[(kind, None)] = raw
+            if not gzip_ok or len(raw) < GZIP_MIN_BYTES:
+                return version, raw, None
+            compressed = self._payloads.get((kind, "gzip"))
+            if compressed is None:
+                compressed = self._payloads[(kind, "gzip")] = gzip.compress(raw, compresslevel=6)
+            return version, compressed, "gzip"
@@ -0,0 +1,129 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Schemas can ask for an index on a property with "x-index": true (or "unique")
+INDEX_KEYWORD = "x-index"
+DOCUMENT_LOCATION_COLUMN = "documentlocation"
+MAX_IDENTIFIER_LENGTH = 64
+
+
+def map_json_type_to_sql(json_type):
+    type_mapping = {
+        "string": "VARCHAR(255)",
+        "number": "FLOAT",
+        "integer": "INT",
+        "boolean": "BOOLEAN",
+        "file upload(string)": "VARCHAR(255)",
+        "object": "JSON",
+        "array": "JSON"
+    }
+    return type_mapping.get(json_type, "VARCHAR(255)")
+
+def normalize_json_type(json_type):
+    if isinstance(json_type, list):
+        for item in json_type:
+            if item != "null":
+                return item
+        return json_type[0] if json_type else "string"
+    if not json_type:
+        return "string"
+    return json_type
+
+def extract_properties(properties, parent_key=''):
+    items = {}
+    for key, value in properties.items():
+        # Adding parent property before the parameters under while separating with a _
+        # full_key = f"{parent_key}_{key}" if parent_key else key
+        full_key = f"{key}" if parent_key else key
+        if value['type'] == 'object' and 'properties' in value:
+            items.update(extract_properties(value['properties'], full_key))
+        else:
+            items[full_key] = value
+    return items
+
+def column_type(details):
+    return map_json_type_to_sql(normalize_json_type(details.get("type", "string")))
+
+def schema_columns(flattened_properties):
+    columns = [(prop, column_type(details)) for prop, details in flattened_properties.items()]
+    # Append documentLocation per default
+    columns.append((DOCUMENT_LOCATION_COLUMN, "VARCHAR(255)"))
+    return columns
+
+def index_name(column, unique):
+    return f"{'ux' if unique else 'ix'}_{column}"[:MAX_IDENTIFIER_LENGTH]
+
+def plan_indexes(flattened_properties):
+    """Indexes a schema table should have: a unique one on the ingester's
+    Identifier column plus one per property marked with ``x-index``."""
+    indexes = []
+    seen = set()
+    for prop, details in flattened_properties.items():
+        marker = details.get(INDEX_KEYWORD)
+        unique = prop.lower() == "identifier" or marker == "unique"
+        if not (unique or marker):
+            continue
+        if prop in seen:
+            continue
+        if column_type(details) == "JSON":
+            logger.warning(f'Cannot index JSON column `{prop}`, skipping {INDEX_KEYWORD}')
+            continue
+        seen.add(prop)
+        indexes.append({"name": index_name(prop, unique), "column": prop, "unique": unique})
+    return indexes
+
+def index_definition(index):
+    kind = "UNIQUE KEY" if index["unique"] else "KEY"
+    return f"{kind} `{index['name']}` (`{index['column']}`)"
+
+def build_create_table_sql(schema_name, flattened_properties):
+    parts = [f"`{prop}` {sql_type}" for prop, sql_type in schema_columns(flattened_properties)]
+    parts.extend(index_definition(index) for index in plan_indexes(flattened_properties))
+    return f"CREATE TABLE IF NOT EXISTS `{schema_name}` ({', '.join(parts)});"
+
+def existing_indexes(cursor, table):
+    """Map of column -> True/False (unique) for columns leading an existing index."""
+    cursor.execute(
+        "SELECT COLUMN_NAME, MIN(NON_UNIQUE) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND SEQ_IN_INDEX = 1 "
+        "GROUP BY COLUMN_NAME",
+        (table,),
+    )
+    return {column: not int(non_unique) for column, non_unique in cursor.fetchall()}
+
+def has_duplicates(cursor, table, column):
+    cursor.execute(
+        f"SELECT 1 FROM `{table}` WHERE `{column}` IS NOT NULL "
+        f"GROUP BY `{column}` HAVING COUNT(*) > 1 LIMIT 1"
+    )
+    return cursor.fetchone() is not None
+
+def missing_index_statements(cursor, table, flattened_properties, new_columns=()):
+    """ALTER TABLE statements adding the planned indexes a table does not have yet.
+
+    A unique index whose column already holds duplicate values is created as a
+    plain index instead, so the backfill never fails on legacy data. ``new_columns``
+    are columns about to be added by the same migration; they are empty, so they
+    are indexed without checking for duplicates.
+    """
+    present = existing_indexes(cursor, table)
+    cursor.execute(f"SHOW COLUMNS FROM `{table}`")
+    columns = {row[0] for row in cursor.fetchall()} | set(new_columns)
+    statements = []
+    for index in plan_indexes(flattened_properties):
+        column = index["column"]
+        if column not in columns:
+            logger.warning(f'Column `{column}` missing in table `{table}`, skipping index')
+            continue
+        if column in present and (present[column] or not index["unique"]):
+            continue
+        if index["unique"] and column not in new_columns and has_duplicates(cursor, table, column):
+            logger.warning(f'Duplicate values in `{table}`.`{column}`, adding a non-unique index instead')
+            if column in present:
+                continue
+            index = {"name": index_name(column, False), "column": column, "unique": False}
+        statements.append(
+            f"ALTER TABLE `{table}` ADD {index_definition(index)}, ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    return statements
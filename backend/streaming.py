@@ -0,0 +1,145 @@
+import csv
+import io
+import logging
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+STREAM_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+}
+CHUNK_BYTES = 64 * 1024
+FETCH_ROWS = 1000
+
+
+class RowStream:
+    """WSGI iterable that encodes rows from an unbuffered cursor as they arrive.
+
+    The stream owns a pooled connection and gives it back in ``close()``, which the
+    WSGI server calls whether or not the body was sent completely. A connection whose
+    result set was not read to the end is discarded instead of draining the rest of
+    the rows from the server.
+    """
+
+    def __init__(self, pool, connection, cursor, columns, fmt, dumps, transform=None, chunk_bytes=CHUNK_BYTES):
+        if fmt not in STREAM_MIMETYPES:
+            raise ValueError(f"Unknown stream format: {fmt}")
+        self.pool = pool
+        self.connection = connection
+        self.cursor = cursor
+        self.columns = columns
+        self.fmt = fmt
+        self.dumps = dumps
+        self.transform = transform
+        self.chunk_bytes = chunk_bytes
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self._exhausted = False
+        self._closed = False
+
+    @property
+    def mimetype(self):
+        return STREAM_MIMETYPES[self.fmt]
+
+    def records(self):
+        names = [desc[0] for desc in self.cursor.description]
+        while True:
+            rows = self.cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                self._exhausted = True
+                return
+            # Rows are flowing, so a stream outliving the leak timeout is not a leak
+            self.pool.touch(self.connection)
+            for row in rows:
+                record = dict(zip(names, row))
+                self.rows_sent += 1
+                yield self.transform(record) if self.transform else record
+
+    def _csv_line(self, values):
+        self._csv_buffer.seek(0)
+        self._csv_buffer.truncate()
+        self._csv_writer.writerow(values)
+        return self._csv_buffer.getvalue()
+
+    def _csv_cell(self, value):
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return self.dumps(value)
+        if isinstance(value, (bytes, bytearray)):
+            return value.decode("utf-8", errors="replace")
+        return value
+
+    def _prefix(self):
+        if self.fmt == "json":
+            return '{"columns": ' + self.dumps(self.columns) + ', "data": ['
+        if self.fmt == "csv":
+            self._csv_buffer = io.StringIO()
+            self._csv_writer = csv.writer(self._csv_buffer)
+            # The BOM makes Excel read the file as UTF-8
+            return "\ufeff" + self._csv_line(self.columns)
+        return ""
+
+    def _encode(self, record, first):
+        if self.fmt == "ndjson":
+            return self.dumps(record) + "\n"
+        if self.fmt == "csv":
+            return self._csv_line([self._csv_cell(record.get(name)) for name in self.columns])
+        return ("" if first else ",") + self.dumps(record)
+
+    def __iter__(self):
+        buffer = [self._prefix()]
+        size = len(buffer[0])
+        first = True
+        for record in self.records():
+            piece = self._encode(record, first)
+            first = False
+            buffer.append(piece)
+            size += len(piece)
+            if size >= self.chunk_bytes:
+                yield self._chunk(buffer)
+                buffer, size = [], 0
+        if self.fmt == "json":
+            buffer.append("]}")
+        if buffer:
+            yield self._chunk(buffer)
+
+    def _chunk(self, buffer):
+        chunk = "".join(buffer).encode("utf-8")
+        self.bytes_sent += len(chunk)
+        return chunk
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._exhausted:
+            try:
+                self.cursor.close()
+            except Exception:
+                self._exhausted = False
+        else:
+            logger.info(f'STREAM ABORTED after {self.rows_sent} rows, discarding connection')
+        self.pool.release(self.connection, discard=not self._exhausted)
+
+
+def open_stream(pool, execute, fmt, dumps, transform=None, cursor_class=pymysql.cursors.SSCursor):
+    """Run ``execute(connection, cursor)`` on an unbuffered cursor (``cursor_class``) and return a RowStream.
+
+    ``execute`` issues the query (and any preparatory ones on ``connection``) and
+    returns the output column names announced to the client; rows are keyed by the
+    cursor's own column names before ``transform`` is applied. Errors raised before
+    the first row is read are propagated, so callers can still answer with a
+    regular error response.
+    """
+    connection = pool.acquire()
+    try:
+        cursor = connection.cursor(cursor_class)
+        columns = execute(connection, cursor)
+    except BaseException as e:
+        pool.release(connection, discard=isinstance(e, (pymysql.OperationalError, pymysql.InterfaceError)))
+        raise
+    return RowStream(pool, connection, cursor, columns, fmt, dumps, transform=transform)
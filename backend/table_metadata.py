@@ -0,0 +1,105 @@
+import threading
+import time
+
+from table_query import QueryError
+
+
+def _describe_default(value):
+    # information_schema quotes defaults ('abc') and spells a NULL default as NULL
+    if value is None or value == "NULL":
+        return None
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+# A lookup of an unknown table reloads the metadata at most this often
+MISS_RELOAD_INTERVAL = 1.0
+MAX_MISSING = 1024
+
+
+class TableMetadataCache:
+    """Table list and DESCRIBE-style column metadata of the current database.
+
+    Everything is loaded with one information_schema query. Every ``ttl``
+    seconds ``version()`` is checked, and the metadata is reloaded when it
+    changed, at the latest after ``max_age`` seconds (default ten TTLs; one TTL
+    without ``version``) and whenever ``invalidate`` is called. The version lets
+    other gunicorn workers notice schema saves (e.g. through the schema registry
+    version) without sharing memory. Unknown tables are remembered for ``ttl``
+    seconds, so requests for them cannot force a reload each.
+    """
+
+    def __init__(self, ttl=60, version=None, max_age=None):
+        self.ttl = ttl
+        self.version = version
+        self.max_age = max_age if max_age is not None else (ttl * 10 if version else ttl)
+        self._lock = threading.Lock()
+        self._tables = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._loaded_version = None
+        self._missing = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._tables = None
+            self._missing.clear()
+
+    def _load(self, cursor):
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA "
+            "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+            "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        )
+        tables = {}
+        for table, name, column_type, nullable, key, default, extra in cursor.fetchall():
+            tables.setdefault(table, []).append({
+                "name": name, "type": column_type, "nullable": nullable == "YES",
+                "key": key, "default": _describe_default(default), "extra": extra,
+            })
+        return tables
+
+    def _current(self, cursor, reload=False):
+        now = time.monotonic()
+        with self._lock:
+            tables = self._tables
+            if tables is not None and not reload and now - self._checked_at < self.ttl:
+                return tables
+            loaded_at, loaded_version = self._loaded_at, self._loaded_version
+        version = self.version() if self.version else None
+        if tables is not None and not reload and version == loaded_version and now - loaded_at < self.max_age:
+            with self._lock:
+                self._checked_at = now
+            return tables
+        tables = self._load(cursor)
+        with self._lock:
+            self._tables = tables
+            self._loaded_at = self._checked_at = time.monotonic()
+            self._loaded_version = version
+            self._missing.clear()
+        return tables
+
+    def tables(self, cursor):
+        return sorted(self._current(cursor))
+
+    def describe(self, cursor, table):
+        """Cached equivalent of table_query.describe_table."""
+        columns = self._current(cursor).get(table)
+        if columns is None:
+            now = time.monotonic()
+            with self._lock:
+                missing_since = self._missing.get(table)
+                known_missing = missing_since is not None and now - missing_since < self.ttl
+                may_reload = not known_missing and now - self._loaded_at >= MISS_RELOAD_INTERVAL
+            if may_reload:
+                # The table may have been created after the last load
+                columns = self._current(cursor, reload=True).get(table)
+                if columns is None:
+                    with self._lock:
+                        if len(self._missing) >= MAX_MISSING:
+                            self._missing.clear()
+                        self._missing[table] = time.monotonic()
+        if columns is None:
+            raise QueryError(f"Unknown table: {table}")
+        return [dict(column) for column in columns]
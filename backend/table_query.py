@@ -0,0 +1,377 @@
+import base64
+import datetime
+import decimal
+import json
+
+import pymysql
+
+ER_NO_SUCH_TABLE = 1146
+
+FILTER_OPERATORS = {
+    "eq": "{col} = %s",
+    "ne": "({col} <> %s OR {col} IS NULL)",
+    "lt": "{col} < %s",
+    "lte": "{col} <= %s",
+    "gt": "{col} > %s",
+    "gte": "{col} >= %s",
+    "contains": "{col} LIKE %s ESCAPE '\\\\'",
+    "startswith": "{col} LIKE %s ESCAPE '\\\\'",
+    "endswith": "{col} LIKE %s ESCAPE '\\\\'",
+    "in": "{col} IN ({placeholders})",
+    "isnull": "{col} IS NULL",
+    "notnull": "{col} IS NOT NULL",
+}
+PAGING_ARGS = ("limit", "cursor", "columns", "sort", "filters", "count")
+DEFAULT_PAGE_SIZE = 100
+
+
+class QueryError(ValueError):
+    pass
+
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def escape_like(value):
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def describe_table(cursor, table):
+    try:
+        cursor.execute(f"DESCRIBE {quote_identifier(table)}")
+    except pymysql.ProgrammingError as e:
+        if e.args and e.args[0] == ER_NO_SUCH_TABLE:
+            raise QueryError(f"Unknown table: {table}")
+        raise
+    return [
+        {"name": col[0], "type": col[1], "nullable": col[2] == "YES",
+         "key": col[3], "default": col[4], "extra": col[5]}
+        for col in cursor.fetchall()
+    ]
+
+
+def pick_key_columns(described):
+    # Keyset paging needs a key no two rows share: the (possibly composite)
+    # primary key or a single-column unique key, both without NULLs. Anything
+    # else, e.g. an Identifier index created non-unique because of duplicates,
+    # would drop the rows tied at a page boundary, so those tables page by OFFSET.
+    for key_type in ("PRI", "UNI"):
+        keyed = [col["name"] for col in described if col["key"] == key_type and not col["nullable"]]
+        if keyed:
+            return keyed[:1] if key_type == "UNI" else keyed
+    return []
+
+
+def float_column_names(described):
+    # Single-precision values come back rounded to ~6 digits, so they cannot be
+    # compared exactly against a value taken from a previous page
+    return [col["name"] for col in described if str(col["type"]).lower().startswith("float")]
+
+
+def wants_paging(args):
+    return any(name in args for name in PAGING_ARGS)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise QueryError(f"Invalid cursor: {e}")
+    if not isinstance(payload, dict):
+        raise QueryError("Invalid cursor")
+    return payload
+
+
+class TableQuery:
+    """SELECT over a table (or join) with projection, filters, sorting and paging.
+
+    ``columns`` maps every output column name to the SQL expression producing it;
+    all user-supplied names are checked against it, so only values ever reach the
+    query as parameters. With ``key_columns`` pages are fetched by keyset
+    (``WHERE (sort, key) > last row``), otherwise by OFFSET. Sorting on one of
+    the ``float_columns`` also falls back to OFFSET paging.
+    """
+
+    def __init__(self, source, columns, key_columns=(), params=(), float_columns=()):
+        self.source = source
+        self.source_params = list(params)
+        self.columns = dict(columns)
+        self.key_columns = list(key_columns)
+        self.float_columns = set(float_columns)
+        self.projection = list(self.columns)
+        self.where = []
+        self.where_params = []
+        self.sort = []
+        self.limit = None
+        self.after = None
+        self.offset = 0
+
+    @classmethod
+    def for_table(cls, cursor, table, describe=describe_table):
+        described = describe(cursor, table)
+        columns = {col["name"]: f"{quote_identifier(table)}.{quote_identifier(col['name'])}" for col in described}
+        return cls(quote_identifier(table), columns, pick_key_columns(described),
+                   float_columns=float_column_names(described))
+
+    @classmethod
+    def for_left_join(cls, cursor, table1, table2, column1, column2, suffix="_condition", describe=describe_table):
+        """``table1 LEFT JOIN table2 ON column1 = column2``.
+
+        Columns of table2 other than ``column2`` are exposed as ``<name><suffix>``
+        and win over equally named columns of table1. Every match of a duplicated
+        key in table2 produces its own row.
+        """
+        described_a = describe(cursor, table1)
+        described_b = describe(cursor, table2)
+        if column1 not in {col["name"] for col in described_a}:
+            raise QueryError(f"Unknown column {column1} in table {table1}")
+        if column2 not in {col["name"] for col in described_b}:
+            raise QueryError(f"Unknown column {column2} in table {table2}")
+        columns = {col["name"]: f"a.{quote_identifier(col['name'])}" for col in described_a}
+        for col in described_b:
+            if col["name"] != column2:
+                columns[f"{col['name']}{suffix}"] = f"b.{quote_identifier(col['name'])}"
+        source = (
+            f"{quote_identifier(table1)} AS a LEFT JOIN {quote_identifier(table2)} AS b "
+            f"ON a.{quote_identifier(column1)} = b.{quote_identifier(column2)}"
+        )
+        key_columns = pick_key_columns(described_a)
+        keys_b = pick_key_columns(described_b)
+        if keys_b != [column2]:
+            # table2 may match several rows per row of table1, so its key breaks ties
+            key_columns = key_columns + [f"{name}{suffix}" for name in keys_b] if key_columns and keys_b else []
+        float_columns = float_column_names(described_a) + [
+            f"{name}{suffix}" for name in float_column_names(described_b) if name != column2
+        ]
+        return cls(source, columns, key_columns, float_columns=float_columns)
+
+    def _expr(self, name):
+        if name not in self.columns:
+            raise QueryError(f"Unknown column: {name}")
+        return self.columns[name]
+
+    def select(self, names):
+        names = [name for name in names if name]
+        for name in names:
+            self._expr(name)
+        if names:
+            self.projection = names
+
+    def order_by(self, specs):
+        self.sort = []
+        for spec in specs:
+            spec = spec.strip()
+            if not spec:
+                continue
+            desc = spec.startswith("-")
+            name = spec.lstrip("+-")
+            self._expr(name)
+            self.sort.append((name, desc))
+
+    def add_filter(self, name, op, value=None):
+        expr = self._expr(name)
+        op = (op or "eq").lower()
+        if op not in FILTER_OPERATORS:
+            raise QueryError(f"Unknown filter operator: {op}")
+        template = FILTER_OPERATORS[op]
+        if op in ("isnull", "notnull"):
+            self.where.append(template.format(col=expr))
+            return
+        if op == "in":
+            values = value if isinstance(value, list) else [value]
+            if not values:
+                self.where.append("1 = 0")
+                return
+            self.where.append(template.format(col=expr, placeholders=", ".join(["%s"] * len(values))))
+            self.where_params.extend(values)
+            return
+        if isinstance(value, (dict, list)):
+            raise QueryError(f"Filter value for {name} must be a scalar")
+        if op == "contains":
+            value = f"%{escape_like(value)}%"
+        elif op == "startswith":
+            value = f"{escape_like(value)}%"
+        elif op == "endswith":
+            value = f"%{escape_like(value)}"
+        self.where.append(template.format(col=expr))
+        self.where_params.append(value)
+
+    def apply_args(self, args, max_limit, paged=True):
+        """Apply ``columns``, ``sort``, ``filters`` and, if ``paged``, ``limit``/``cursor`` request args."""
+        if args.get("columns"):
+            self.select(args["columns"].split(","))
+        if args.get("sort"):
+            self.order_by(args["sort"].split(","))
+        if args.get("filters"):
+            try:
+                filters = json.loads(args["filters"])
+            except ValueError as e:
+                raise QueryError(f"filters must be JSON: {e}")
+            if isinstance(filters, dict):
+                filters = [{"column": name, "value": value} for name, value in filters.items()]
+            if not isinstance(filters, list):
+                raise QueryError("filters must be a JSON list or object")
+            for item in filters:
+                if not isinstance(item, dict):
+                    raise QueryError("Each filter must be an object")
+                # Accept material-react-table's {id, value} column filter shape as well
+                name = item.get("column", item.get("id"))
+                op = item.get("op", "in" if isinstance(item.get("value"), list) else "contains")
+                self.add_filter(name, op, item.get("value"))
+        if not paged:
+            return
+        limit = args.get("limit")
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise QueryError("limit must be an integer")
+            if limit < 1:
+                raise QueryError("limit must be positive")
+            self.limit = min(limit, max_limit)
+        else:
+            self.limit = min(DEFAULT_PAGE_SIZE, max_limit)
+        if args.get("cursor"):
+            payload = decode_cursor(args["cursor"])
+            if "o" in payload:
+                offset = payload["o"]
+                if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+                    raise QueryError("Invalid cursor")
+                self.offset = offset
+            elif "k" in payload and isinstance(payload["k"], list):
+                self.after = payload["k"]
+            else:
+                raise QueryError("Invalid cursor")
+
+    def _order_columns(self):
+        order = list(self.sort)
+        sorted_names = {name for name, _ in order}
+        for name in self.key_columns:
+            if name not in sorted_names:
+                order.append((name, False))
+        return order
+
+    def _uses_keyset(self):
+        return bool(self.key_columns) and not any(name in self.float_columns for name, _ in self._order_columns())
+
+    def _keyset_predicate(self, order):
+        # Lexicographic "comes after" over the ORDER BY columns, following
+        # MariaDB's NULL ordering (first on ASC, last on DESC).
+        if len(self.after) != len(order):
+            raise QueryError("Cursor does not match the requested sort order")
+        clauses, params = [], []
+        for i, (name, desc) in enumerate(order):
+            expr, value = self.columns[name], self.after[i]
+            parts, part_params = [], []
+            for j, (prev_name, _) in enumerate(order[:i]):
+                prev_value = self.after[j]
+                if prev_value is None:
+                    parts.append(f"{self.columns[prev_name]} IS NULL")
+                else:
+                    parts.append(f"{self.columns[prev_name]} = %s")
+                    part_params.append(prev_value)
+            if desc:
+                if value is None:
+                    continue
+                parts.append(f"({expr} < %s OR {expr} IS NULL)")
+                part_params.append(value)
+            elif value is None:
+                parts.append(f"{expr} IS NOT NULL")
+            else:
+                parts.append(f"{expr} > %s")
+                part_params.append(value)
+            clauses.append("(" + " AND ".join(parts) + ")")
+            params.extend(part_params)
+        if not clauses:
+            return "1 = 0", []
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def _where_sql(self, extra=None):
+        clauses = list(self.where)
+        params = list(self.where_params)
+        if extra:
+            clauses.append(extra[0])
+            params.extend(extra[1])
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+
+    def select_columns(self):
+        # Sort and key columns are fetched as well so the next cursor can be built
+        names = list(self.projection)
+        if self.limit is not None and self._uses_keyset():
+            for name, _ in self._order_columns():
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def select_sql(self):
+        names = self.select_columns()
+        select_list = ", ".join(f"{self.columns[name]} AS {quote_identifier(name)}" for name in names)
+        order = self._order_columns() if self.key_columns else list(self.sort)
+        keyset_paging = self._uses_keyset()
+        if self.after is not None and not keyset_paging:
+            raise QueryError("Cursor does not match the requested sort order")
+        keyset = self._keyset_predicate(order) if self.after is not None else None
+        where_sql, where_params = self._where_sql(keyset)
+        sql = f"SELECT {select_list} FROM {self.source}{where_sql}"
+        if order:
+            sql += " ORDER BY " + ", ".join(
+                f"{self.columns[name]} {'DESC' if desc else 'ASC'}" for name, desc in order
+            )
+        if self.limit is not None:
+            # One extra row tells whether another page follows
+            sql += f" LIMIT {int(self.limit) + 1}"
+            if not keyset_paging and self.offset:
+                sql += f" OFFSET {int(self.offset)}"
+        return sql, self.source_params + where_params
+
+    def count_sql(self):
+        where_sql, where_params = self._where_sql()
+        return f"SELECT COUNT(*) FROM {self.source}{where_sql}", self.source_params + where_params
+
+    def page(self, names, rows):
+        """Turn fetched tuples into ``(data, next_cursor)`` for the projected columns."""
+        has_more = self.limit is not None and len(rows) > self.limit
+        if has_more:
+            rows = rows[:self.limit]
+        records = [dict(zip(names, row)) for row in rows]
+        next_cursor = None
+        if has_more and records:
+            if self._uses_keyset():
+                last = records[-1]
+                next_cursor = encode_cursor({"k": [last[name] for name, _ in self._order_columns()]})
+            else:
+                next_cursor = encode_cursor({"o": self.offset + len(records)})
+        projection = self.projection
+        if names != projection:
+            records = [{name: record[name] for name in projection} for record in records]
+        return records, next_cursor
+
+
+def estimate_row_count(cursor, table):
+    cursor.execute(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
@@ -0,0 +1,550 @@
+import argparse
+import datetime
+import getpass
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote, urlparse
+from xml.sax.saxutils import escape as xml_escape
+
+import pymysql
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from ingest_metrics import METRICS
+from webdav_ingest import (
+    IngestPipeline,
+    TableCatalog,
+    build_validator,
+    build_webdav_source,
+    ensure_state_table,
+    load_config,
+    process_scan,
+    setup_logging,
+)
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "backend"))
+from schema_tables import build_create_table_sql, extract_properties  # noqa: E402
+
+logger = logging.getLogger("ingest_benchmark")
+
+DAV_ROOT = "/remote.php/dav/files/bench/"
+WORDS = ["alpha", "bravo", "carbon", "delta", "flame", "graphene", "oxide", "raman", "soot", "spray"]
+
+
+class DocumentGenerator:
+    """Schema-valid metadata documents for the schemas in ``schema_dir``.
+
+    Values are derived from each property's type, enum, bounds and default, so
+    the generator follows schema edits. Document ``index`` always belongs to the
+    same schema and Identifier; ``version`` changes the other values, as an
+    edited file would. Schemas for which no valid document can be generated
+    (e.g. because of ``pattern`` constraints) are left out.
+    """
+
+    def __init__(self, schema_dir: Path, schema_ids: Optional[List[str]] = None, seed: int = 0):
+        self.seed = seed
+        self.schemas: List[tuple] = []
+        for path in sorted(schema_dir.glob("*.json")):
+            if schema_ids and path.stem not in schema_ids:
+                continue
+            schema = json.loads(path.read_text(encoding="utf-8"))
+            validator = build_validator(schema)
+            errors = list(validator.iter_errors(self.sample(schema, random.Random(seed), 0)))
+            if errors:
+                logger.warning("Cannot generate valid documents for %s: %s", path.stem, errors[0].message)
+                continue
+            self.schemas.append((path.stem, schema))
+        if not self.schemas:
+            raise SystemExit(f"No usable schemas in {schema_dir}")
+
+    def sample(self, schema: Dict, rng: random.Random, index: int) -> Dict:
+        document = self.value("", schema, rng, index)
+        document["Identifier"] = f"BENCH-{index:08d}"
+        return document
+
+    def value(self, name: str, prop: Dict, rng: random.Random, index: int):
+        if "const" in prop:
+            return prop["const"]
+        if prop.get("enum"):
+            return rng.choice(prop["enum"])
+        kind = prop.get("type", "string")
+        if isinstance(kind, list):
+            kind = next((k for k in kind if k != "null"), "string")
+        if kind == "object":
+            return {key: self.value(key, sub, rng, index) for key, sub in prop.get("properties", {}).items()}
+        if kind == "array":
+            count = max(prop.get("minItems", 0), rng.randint(0, 3))
+            return [self.value(name, prop.get("items", {}), rng, index) for _ in range(count)]
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if kind in ("number", "integer"):
+            low = prop.get("minimum", prop.get("exclusiveMinimum", 0))
+            high = prop.get("maximum", prop.get("exclusiveMaximum", low + 1000))
+            if kind == "integer":
+                low = math.floor(low) + 1 if "exclusiveMinimum" in prop else math.ceil(low)
+                high = math.ceil(high) - 1 if "exclusiveMaximum" in prop else math.floor(high)
+                return rng.randint(low, max(low, high))
+            return round(rng.uniform(low, high), 3)
+        if prop.get("format") == "date" or name == "Date":
+            return (datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(730))).isoformat()
+        if prop.get("format") == "time" or name == "Time":
+            return f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+        if "pattern" in prop or "format" in prop:
+            return prop.get("default", "")
+        text = f"{rng.choice(WORDS)}-{index}-{rng.randrange(10000)}"
+        return text[:prop.get("maxLength", 255)].ljust(prop.get("minLength", 0), "x")
+
+    def document(self, index: int, version: int = 0) -> bytes:
+        schema_id, schema = self.schemas[index % len(self.schemas)]
+        rng = random.Random(f"{self.seed}:{index}:{version}")
+        return json.dumps(self.sample(schema, rng, index), indent=2).encode("utf-8")
+
+
+class SyntheticTree:
+    """Folder tree served by the WebDAV stub: ``depth`` levels of ``fanout``
+    subfolders below the root, with ``files`` documents spread over the leaf
+    folders. Like Nextcloud, a folder's ETag changes when anything below it does.
+    """
+
+    def __init__(self, root: str, depth: int, fanout: int, files: int, generator: DocumentGenerator):
+        self.root = root
+        self.generator = generator
+        self.created = time.time()
+        self.folders: Dict[str, Dict] = {}
+        self.files: Dict[str, Dict] = {}
+        leaves = []
+
+        def build(path: str, level: int) -> None:
+            self.folders[path] = {"folders": [], "files": [], "version": 0}
+            if level == depth:
+                leaves.append(path)
+                return
+            for i in range(fanout):
+                child = f"{path}d{level}-{i}/"
+                self.folders[path]["folders"].append(child)
+                build(child, level + 1)
+
+        build(root, 0)
+        for index in range(files):
+            folder = leaves[index % len(leaves)]
+            path = f"{folder}doc-{index:07d}.json"
+            self.folders[folder]["files"].append(path)
+            self.files[path] = {"index": index, "version": 0, "saved": 0}
+
+    def etag(self, path: str, version: int) -> str:
+        return f'"{zlib.crc32(path.encode("utf-8")):08x}-{version}"'
+
+    def modified(self, version: int) -> str:
+        return formatdate(self.created + version, usegmt=True)
+
+    def listing(self, path: str) -> Optional[bytes]:
+        folder = self.folders.get(path)
+        if folder is None:
+            return None
+        responses = [self.response(path, folder["version"], folder["version"], True)]
+        for child in folder["folders"]:
+            version = self.folders[child]["version"]
+            responses.append(self.response(child, version, version, True))
+        for child in folder["files"]:
+            entry = self.files[child]
+            responses.append(self.response(child, entry["version"], entry["version"] + entry["saved"], False))
+        body = '<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">' + "".join(responses) + "</d:multistatus>"
+        return body.encode("utf-8")
+
+    def response(self, path: str, version: int, modified: int, collection: bool) -> str:
+        return (
+            f"<d:response><d:href>{xml_escape(quote(path))}</d:href><d:propstat><d:prop>"
+            f"<d:getetag>{xml_escape(self.etag(path, version))}</d:getetag>"
+            f"<d:getlastmodified>{self.modified(modified)}</d:getlastmodified>"
+            f"<d:resourcetype>{'<d:collection/>' if collection else ''}</d:resourcetype>"
+            "</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+        )
+
+    def content(self, path: str) -> Optional[tuple]:
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+        return self.generator.document(entry["index"], entry["version"]), self.etag(path, entry["version"])
+
+    def touch(self, count: int, rng: random.Random, content: bool = True) -> List[str]:
+        """Edit ``count`` random files and bump the ETags of their folders.
+
+        With ``content=False`` the files are only saved again: their modification
+        time changes but their ETag and content stay the same.
+        """
+        touched = rng.sample(sorted(self.files), min(count, len(self.files)))
+        for path in touched:
+            self.files[path]["version" if content else "saved"] += 1
+            folder = path.rsplit("/", 1)[0] + "/"
+            while folder.startswith(self.root):
+                self.folders[folder]["version"] += 1
+                folder = folder.rstrip("/").rsplit("/", 1)[0] + "/"
+        return touched
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        logger.debug("Stub %s - " + format, self.address_string(), *args)
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count("connections")
+
+    def reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+        headers = dict(headers or {})
+        if body and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes", len(body))
+
+    def begin(self, method: str) -> str:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.count(method)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        return unquote(urlparse(self.path).path)
+
+    def do_PROPFIND(self) -> None:
+        path = self.begin("PROPFIND")
+        body = self.server.tree.listing(path if path.endswith("/") else path + "/")
+        if body is None:
+            self.reply(404)
+            return
+        self.reply(207, body, {"Content-Type": "application/xml; charset=utf-8"})
+
+    def do_GET(self) -> None:
+        found = self.server.tree.content(self.begin("GET"))
+        if found is None:
+            self.reply(404)
+            return
+        body, etag = found
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count("not_modified")
+            self.reply(304, headers={"ETag": etag})
+            return
+        self.reply(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+    def do_REPORT(self) -> None:
+        self.begin("REPORT")
+        self.reply(501)
+
+
+class WebDAVStub(ThreadingHTTPServer):
+    """Local WebDAV stand-in (PROPFIND Depth 1 and conditional GET, gzip when
+    accepted) serving a SyntheticTree, with a fixed ``latency`` added to every
+    request."""
+
+    daemon_threads = True
+
+    def __init__(self, tree: SyntheticTree, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.tree = tree
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{DAV_ROOT}"
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="webdav-stub", daemon=True).start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class CountingConnection(pymysql.connections.Connection):
+    """pymysql connection that counts the commands sent to the server
+    (queries, COMMITs, pings), i.e. the DB round trips."""
+
+    round_trips = 0
+
+    def _execute_command(self, command, sql):
+        self.round_trips += 1
+        return super()._execute_command(command, sql)
+
+
+class ThrowawayDatabase:
+    """Scratch database for one benchmark run.
+
+    With ``mariadbd`` a private server is started on a temporary data directory
+    and unix socket; otherwise an ``ingest_bench_<pid>`` database is created on
+    the server from the ingester config. Either is removed on exit unless ``keep``.
+    """
+
+    def __init__(self, cfg: Dict, mariadbd: Optional[str] = None, keep: bool = False):
+        self.cfg = cfg
+        self.mariadbd = mariadbd
+        self.keep = keep
+        self.name = f"ingest_bench_{os.getpid()}"
+        self.datadir: Optional[Path] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    def connect_args(self) -> Dict:
+        if self.datadir is not None:
+            return {"unix_socket": str(self.datadir / "mysqld.sock"), "user": "root"}
+        return {
+            "host": self.cfg["db_host"],
+            "port": self.cfg["db_port"],
+            "user": self.cfg["db_user"],
+            "password": self.cfg["db_password"],
+        }
+
+    def connect(self, database: Optional[str] = None, counting: bool = False):
+        connection_class = CountingConnection if counting else pymysql.connections.Connection
+        return connection_class(database=database, autocommit=False, **self.connect_args())
+
+    def start_server(self) -> None:
+        self.datadir = Path(tempfile.mkdtemp(prefix="ingest-bench-db-"))
+        install = shutil.which("mariadb-install-db") or shutil.which("mysql_install_db")
+        if install is None:
+            raise SystemExit("mariadb-install-db not found next to mariadbd")
+        subprocess.run(
+            [install, "--no-defaults", f"--datadir={self.datadir / 'data'}", "--auth-root-authentication-method=normal",
+             "--skip-test-db"],
+            check=True,
+            capture_output=True,
+        )
+        self.process = subprocess.Popen(
+            [self.mariadbd, "--no-defaults", f"--datadir={self.datadir / 'data'}",
+             f"--socket={self.datadir / 'mysqld.sock'}", "--skip-networking", "--skip-grant-tables",
+             f"--user={getpass.getuser()}", f"--log-error={self.datadir / 'error.log'}"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                self.connect().close()
+                return
+            except pymysql.err.OperationalError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit(f"mariadbd did not start, see {self.datadir / 'error.log'}")
+                time.sleep(0.2)
+
+    def __enter__(self) -> "ThrowawayDatabase":
+        if self.mariadbd:
+            self.start_server()
+        conn = self.connect()
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE `{self.name}` CHARACTER SET utf8mb4")
+        conn.close()
+        logger.info("Benchmark database: %s", self.name)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.keep:
+            logger.info("Keeping benchmark database %s", self.name)
+            return
+        try:
+            conn = self.connect()
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP DATABASE IF EXISTS `{self.name}`")
+            conn.close()
+        finally:
+            if self.process is not None:
+                self.process.terminate()
+                self.process.wait(timeout=60)
+            if self.datadir is not None:
+                shutil.rmtree(self.datadir, ignore_errors=True)
+
+
+def create_schema_tables(cursor, schema_dir: Path, schema_ids: List[str]) -> None:
+    for schema_id in schema_ids:
+        schema = json.loads((schema_dir / f"{schema_id}.json").read_text(encoding="utf-8"))
+        cursor.execute(build_create_table_sql(schema_id, extract_properties(schema.get("properties", {}))))
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Peak resident set size so far of this process and of its largest child
+    (the parse workers). Peaks never go down, so later phases include earlier ones."""
+    if resource is None:
+        return {"self": None, "children": None}
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def run_phase(name: str, conn, source, pipeline, catalog, cfg: Dict, stub: WebDAVStub) -> Dict:
+    requests_before = stub.snapshot()
+    trips_before = conn.round_trips
+    started = time.perf_counter()
+    METRICS.begin_scan()
+    with conn.cursor() as cursor:
+        scan = source.scan(cursor)
+        conn.commit()
+        scanned = time.perf_counter()
+        summary = process_scan(conn, cursor, source, scan, pipeline, catalog, cfg)
+    finished = time.perf_counter()
+    requests_after = stub.snapshot()
+    http = {key: requests_after.get(key, 0) - requests_before.get(key, 0) for key in requests_after}
+    result = {
+        "phase": name,
+        "files": summary["files"],
+        "changed": summary["changed"],
+        "scan_seconds": round(scanned - started, 3),
+        "ingest_seconds": round(finished - scanned, 3),
+        "total_seconds": round(finished - started, 3),
+        "files_per_second": round(summary["files"] / (finished - started), 1),
+        "changed_per_second": round(summary["changed"] / (finished - scanned), 1) if summary["changed"] else None,
+        "db_round_trips": conn.round_trips - trips_before,
+        "http": http,
+        "peak_rss_mb": peak_rss_mb(),
+        "ingester": METRICS.end_scan(),
+    }
+    logger.info(
+        "%-8s %6d files %6d changed  scan %7.2fs  ingest %7.2fs  %8.1f files/s  %6d DB round trips  %5d PROPFIND  %6d GET",
+        name,
+        result["files"],
+        result["changed"],
+        result["scan_seconds"],
+        result["ingest_seconds"],
+        result["files_per_second"],
+        result["db_round_trips"],
+        http.get("PROPFIND", 0),
+        http.get("GET", 0),
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of webdav_ingest against a local WebDAV stub")
+    parser.add_argument("--files", type=int, default=2000, help="Documents in the synthetic tree")
+    parser.add_argument("--depth", type=int, default=3, help="Folder levels below the root")
+    parser.add_argument("--fanout", type=int, default=4, help="Subfolders per folder")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every WebDAV request")
+    parser.add_argument("--touch", type=int, default=0, help="Files edited before an extra warm run")
+    parser.add_argument(
+        "--retouch", type=int, default=0, help="Files saved again unchanged (same ETag, newer mtime) before an extra run"
+    )
+    parser.add_argument("--schema-dir", help="Schemas to generate documents for (default: SCHEMA_DIR)")
+    parser.add_argument("--schemas", help="Comma-separated SchemaIDs to use (default: all)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the document generator")
+    parser.add_argument("--mariadbd", help="Start a private MariaDB from this mariadbd binary instead of using DB_HOST")
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the benchmark database")
+    parser.add_argument("--concurrency", type=int, help="Parallel PROPFIND requests while crawling")
+    parser.add_argument("--download-workers", type=int, help="Parallel file downloads")
+    parser.add_argument("--parse-workers", type=int, help="Processes for JSON parsing and validation")
+    parser.add_argument("--batch-size", type=int, help="Files written per DB transaction")
+    parser.add_argument("--mode", choices=["insert", "upsert"], default="upsert", help="Ingest mode for the runs")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (DEBUG, INFO, WARNING, ERROR)")
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+    cfg = load_config(REPO_ROOT)
+    schema_dir = Path(args.schema_dir or cfg["schema_dir"])
+    if args.concurrency is not None:
+        cfg["webdav_concurrency"] = args.concurrency
+    if args.download_workers is not None:
+        cfg["download_workers"] = args.download_workers
+    if args.parse_workers is not None:
+        cfg["parse_workers"] = args.parse_workers
+    if args.batch_size is not None:
+        cfg["ingest_batch_size"] = args.batch_size
+    cfg["ingest_mode"] = args.mode
+    cfg["webdav_sync"] = False
+
+    generator = DocumentGenerator(schema_dir, [s.strip() for s in (args.schemas or "").split(",") if s.strip()], args.seed)
+    schema_ids = [schema_id for schema_id, _ in generator.schemas]
+    tree = SyntheticTree(f"{DAV_ROOT}bench/", args.depth, args.fanout, args.files, generator)
+    stub = WebDAVStub(tree, args.latency)
+    stub.start()
+    cfg.update(webdav_url=stub.url, webdav_root="bench", webdav_user="bench", webdav_password="bench")
+    logger.info(
+        "Synthetic tree: %d folders, %d files, schemas %s, latency %.3fs",
+        len(tree.folders), len(tree.files), ", ".join(schema_ids), args.latency,
+    )
+
+    results = []
+    source = build_webdav_source(cfg)
+    pipeline = IngestPipeline(
+        source.read,
+        schema_dir,
+        None,
+        error_mode=cfg["validation_errors"],
+        download_workers=cfg["download_workers"],
+        parse_workers=cfg["parse_workers"],
+        queue_size=cfg["ingest_queue_size"],
+        validator_cache_size=cfg["validator_cache_size"],
+    )
+    try:
+        with ThrowawayDatabase(cfg, args.mariadbd, args.keep_db) as db:
+            conn = db.connect(db.name, counting=True)
+            with conn.cursor() as cursor:
+                create_schema_tables(cursor, schema_dir, schema_ids)
+                ensure_state_table(cursor)
+                source.prepare(cursor)
+            conn.commit()
+            catalog = TableCatalog(schema_dir)
+            results.append(run_phase("cold", conn, source, pipeline, catalog, cfg, stub))
+            results.append(run_phase("warm", conn, source, pipeline, catalog, cfg, stub))
+            if args.touch:
+                tree.touch(args.touch, random.Random(args.seed))
+                results.append(run_phase("touched", conn, source, pipeline, catalog, cfg, stub))
+            if args.retouch:
+                tree.touch(args.retouch, random.Random(args.seed + 1), content=False)
+                results.append(run_phase("retouched", conn, source, pipeline, catalog, cfg, stub))
+            conn.close()
+    finally:
+        pipeline.close()
+        source.close()
+        stub.stop()
+
+    if args.json:
+        report = {
+            "settings": {
+                "files": args.files, "depth": args.depth, "fanout": args.fanout, "latency": args.latency,
+                "touch": args.touch, "retouch": args.retouch, "schemas": schema_ids, "mode": args.mode,
+                "concurrency": cfg["webdav_concurrency"], "download_workers": cfg["download_workers"],
+                "parse_workers": cfg["parse_workers"], "batch_size": cfg["ingest_batch_size"],
+            },
+            "results": results,
+        }
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        logger.info("Results written to %s", args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+from ingest_paths import canonicalize_path, normalize_dir_path
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional, without it the directory is only polled
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger("webdav_ingest")
+
+
+class InboxEventHandler(FileSystemEventHandler):
+    """Collects the paths touched by inotify (watchdog) events."""
+
+    def __init__(self, source: "LocalDirectorySource"):
+        super().__init__()
+        self.source = source
+
+    def on_any_event(self, event) -> None:
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        paths = [event.src_path]
+        if getattr(event, "dest_path", None):
+            paths.append(event.dest_path)
+        self.source.mark_dirty(paths)
+
+
+class LocalDirectorySource:
+    """JSON files below a local directory such as ``data_inbox/``.
+
+    Changes are picked up incrementally from inotify events (through watchdog)
+    and a full mtime/size reconciliation walk runs on the first scan, every
+    ``reconcile_interval`` seconds and whenever watching is not available.
+    Files modified less than ``settle`` seconds ago are left for the next scan,
+    so half-written files are not ingested. Hrefs are the URL paths of the
+    files' ``file://`` URIs, which are also used as documentlocation.
+    """
+
+    name = "local"
+    base_url = "file:///"
+
+    def __init__(self, root: Path, reconcile_interval: float = 300, settle: float = 2.0, watch: bool = True):
+        self.root = root.resolve()
+        self.base_path = self.href(self.root, directory=True)
+        self.reconcile_interval = reconcile_interval
+        self.settle = settle
+        self._lock = threading.Lock()
+        self._dirty: set = set()
+        self.wake = threading.Event()
+        self._last_reconcile: Optional[float] = None
+        self.observer = None
+        if watch and Observer is None:
+            logger.warning("watchdog is not installed, %s is only scanned by polling", self.root)
+        elif watch:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.observer = Observer()
+            self.observer.schedule(InboxEventHandler(self), str(self.root), recursive=True)
+            self.observer.daemon = True
+            self.observer.start()
+
+    @staticmethod
+    def href(path: Path, directory: bool = False) -> str:
+        href = canonicalize_path(urlparse(path.as_uri()).path)
+        return normalize_dir_path(href) if directory else href
+
+    def mark_dirty(self, paths: Iterable[str]) -> None:
+        with self._lock:
+            self._dirty.update(paths)
+        self.wake.set()
+
+    def prepare(self, cursor) -> None:
+        pass
+
+    def _item(self, path: Path, stat) -> Dict[str, str]:
+        return {
+            "href": self.href(path),
+            "etag": f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            "last_modified": formatdate(stat.st_mtime, usegmt=True),
+            "content_length": str(stat.st_size),
+            "is_collection": False,
+        }
+
+    def _settled(self, stat) -> bool:
+        return time.time() - stat.st_mtime >= self.settle
+
+    def _walk(self, top: Path, files: List[Dict[str, str]], crawled: Optional[Dict[str, bool]]) -> None:
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            folder = Path(dirpath)
+            listed = True
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(".json"):
+                    continue
+                path = folder / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if not self._settled(stat):
+                    # Not complete yet: retry with the next scan and keep the
+                    # folder out of the deletion check until then
+                    self.mark_dirty([str(path)])
+                    listed = False
+                    continue
+                files.append(self._item(path, stat))
+            if crawled is not None:
+                crawled[self.href(folder, directory=True)] = listed
+
+    def scan(self, cursor, subtree: Optional[str] = None) -> Dict:
+        if subtree:
+            path = (self.root / unquote(subtree).strip("/")).resolve()
+            if path == self.root or self.root in path.parents:
+                self.mark_dirty([str(path)])
+        now = time.monotonic()
+        reconcile = (
+            self.observer is None
+            or self._last_reconcile is None
+            or now - self._last_reconcile >= self.reconcile_interval
+        )
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        self.wake.clear()
+        files: List[Dict[str, str]] = []
+
+        if reconcile:
+            self.root.mkdir(parents=True, exist_ok=True)
+            crawled: Dict[str, bool] = {}
+            self._walk(self.root, files, crawled)
+            self._last_reconcile = now
+            logger.info("Scan: %d folders, %d json files in %s", len(crawled), len(files), self.root)
+            return {"files": files, "crawled": crawled, "deleted": []}
+
+        deleted = []
+        seen = set()
+        for name in sorted(dirty):
+            path = Path(name)
+            if path.is_dir():
+                self._walk(path, files, None)
+            elif path.is_file():
+                if not path.name.lower().endswith(".json"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if not self._settled(stat):
+                    self.mark_dirty([name])
+                    continue
+                files.append(self._item(path, stat))
+            elif not path.exists():
+                # Gone: a file, or a folder whose whole subtree is gone
+                deleted.append(self.href(path) if path.name.lower().endswith(".json") else self.href(path, directory=True))
+        files = [f for f in files if not (f["href"] in seen or seen.add(f["href"]))]
+        logger.info("Events: %d changed json files, %d deleted entries", len(files), len(deleted))
+        return {"files": files, "crawled": None, "deleted": deleted}
+
+    def finish(self, cursor, scan: Dict) -> None:
+        pass
+
+    def abort(self, cursor, scan: Dict, unprocessed: Optional[List[str]] = None) -> None:
+        if unprocessed is None:
+            if scan["crawled"] is not None:
+                self._last_reconcile = None
+            unprocessed = [item["href"] for item in scan["files"]] + scan["deleted"]
+        self.mark_dirty([url2pathname(href) for href in unprocessed])
+
+    def read(self, href: str, etag: Optional[str] = None) -> bytes:
+        return Path(url2pathname(href)).read_bytes()
+
+    def wait(self, timeout: float) -> None:
+        if self.wake.wait(timeout) and self._dirty:
+            # Let a burst of events (e.g. a copied folder) settle into one scan
+            time.sleep(min(self.settle, timeout))
+
+    def close(self) -> None:
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout=5)
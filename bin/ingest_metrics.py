@@ -0,0 +1,141 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class IngestMetrics:
+    """Counters, gauges and stage timings of the ingester.
+
+    ``render`` returns them in the Prometheus text format for ``GET /metrics``.
+    Counters, timings and queue-depth peaks are also collected per scan between
+    ``begin_scan`` and ``end_scan``; ``end_scan`` returns them as the summary
+    that is logged as JSON after every scan. Updated from the crawler and
+    download threads, so every access takes the lock.
+    """
+
+    PREFIX = "webdav_ingest_"
+    METRICS = {
+        "stage_seconds": ("histogram", "Seconds per stage: propfind/sync request, download, parse, validate, DB flush, whole scan"),
+        "files_total": ("counter", "Changed files processed, by resulting ingest_state status"),
+        "folders_total": ("counter", "Folders listed with PROPFIND (crawled) or skipped by their ETag (skipped)"),
+        "downloaded_bytes_total": ("counter", "Bytes of JSON files downloaded"),
+        "not_modified_total": ("counter", "Conditional GETs answered with 304 Not Modified"),
+        "scans_total": ("counter", "Completed scans"),
+        "queue_depth": ("gauge", "Items waiting in the propfind, pipeline and write queues"),
+        "last_scan_timestamp_seconds": ("gauge", "Unix time the last scan finished"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, List[float]] = {}
+        self.begin_scan()
+
+    @staticmethod
+    def key(name: str, labels: Dict[str, str]) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def begin_scan(self) -> None:
+        with self._lock:
+            self.scan_counters: Dict[tuple, float] = {}
+            self.scan_stages: Dict[str, List[float]] = {}
+            self.scan_peaks: Dict[str, float] = {}
+            self.scan_started = time.monotonic()
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = self.key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.scan_counters[key] = self.scan_counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        key = self.key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+            peak = "/".join(str(v) for _, v in key[1])
+            self.scan_peaks[peak] = max(self.scan_peaks.get(peak, 0), value)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        key = self.key("stage_seconds", {"stage": stage})
+        with self._lock:
+            values = self.histograms.setdefault(key, [0] * (len(STAGE_BUCKETS) + 2))
+            index = bisect.bisect_left(STAGE_BUCKETS, seconds)
+            if index < len(STAGE_BUCKETS):
+                values[index] += 1
+            values[-2] += seconds
+            values[-1] += 1
+            totals = self.scan_stages.setdefault(stage, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def end_scan(self) -> Dict:
+        duration = time.monotonic() - self.scan_started
+        self.observe("scan", duration)
+        self.inc("scans_total")
+        self.set_gauge("last_scan_timestamp_seconds", time.time())
+        with self._lock:
+            grouped: Dict[str, Dict[str, float]] = {}
+            for (name, labels), value in self.scan_counters.items():
+                if labels:
+                    grouped.setdefault(name, {})[labels[0][1]] = value
+            return {
+                "duration_seconds": round(duration, 3),
+                "statuses": grouped.get("files_total", {}),
+                "folders": grouped.get("folders_total", {}),
+                "downloaded_bytes": int(self.scan_counters.get(self.key("downloaded_bytes_total", {}), 0)),
+                "not_modified": int(self.scan_counters.get(self.key("not_modified_total", {}), 0)),
+                "stages": {
+                    stage: {"count": count, "seconds": round(seconds, 3)}
+                    for stage, (count, seconds) in sorted(self.scan_stages.items())
+                },
+                "queue_peaks": {name: value for name, value in self.scan_peaks.items() if name},
+            }
+
+    @staticmethod
+    def format_labels(labels: tuple, **extra: str) -> str:
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self.METRICS.items():
+                full_name = self.PREFIX + name
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                if kind == "histogram":
+                    for (metric, labels), values in sorted(self.histograms.items()):
+                        if metric != name:
+                            continue
+                        cumulative = 0
+                        for bound, count in zip(STAGE_BUCKETS, values):
+                            cumulative += count
+                            lines.append(f"{full_name}_bucket{self.format_labels(labels, le=repr(bound))} {cumulative}")
+                        lines.append(f"{full_name}_bucket{self.format_labels(labels, le='+Inf')} {values[-1]}")
+                        lines.append(f"{full_name}_sum{self.format_labels(labels)} {values[-2]}")
+                        lines.append(f"{full_name}_count{self.format_labels(labels)} {values[-1]}")
+                    continue
+                values = self.counters if kind == "counter" else self.gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{full_name}{self.format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = IngestMetrics()
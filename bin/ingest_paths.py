@@ -0,0 +1,26 @@
+from urllib.parse import quote, unquote, urljoin, urlparse
+
+
+def normalize_webdav_url(url: str) -> str:
+    if not url.endswith("/"):
+        return url + "/"
+    return url
+
+
+def normalize_dir_path(path: str) -> str:
+    return path if path.endswith("/") else path + "/"
+
+
+def canonicalize_path(path: str) -> str:
+    return quote(unquote(path), safe="/")
+
+
+def build_file_url(base_url: str, href: str) -> str:
+    parsed = urlparse(base_url)
+    if href.startswith(parsed.path):
+        return f"{parsed.scheme}://{parsed.netloc}{href}"
+    return urljoin(base_url, href.lstrip("/"))
+
+
+def parent_dir(path: str) -> str:
+    return path.rstrip("/").rsplit("/", 1)[0] + "/"
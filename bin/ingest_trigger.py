@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+from ingest_metrics import METRICS
+
+logger = logging.getLogger("webdav_ingest")
+
+
+class TriggerHandler(BaseHTTPRequestHandler):
+    server_version = "webdav-ingest"
+
+    def log_message(self, format, *args) -> None:
+        logger.debug("Trigger %s - " + format, self.address_string(), *args)
+
+    def send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self) -> bool:
+        token = self.server.token
+        if not token:
+            return True
+        return self.headers.get("Authorization") == f"Bearer {token}" or self.headers.get("X-Trigger-Token") == token
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            body = METRICS.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path != "/health":
+            self.send_json(404, {"error": "not found"})
+            return
+        self.send_json(200, self.server.health())
+
+    def do_POST(self) -> None:
+        parsed = urlparse(self.path)
+        if parsed.path != "/trigger":
+            self.send_json(404, {"error": "not found"})
+            return
+        if not self.authorized():
+            self.send_json(401, {"error": "unauthorized"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            self.send_json(400, {"error": "invalid JSON body"})
+            return
+        path = parse_qs(parsed.query).get("path", [None])[0]
+        if path is None and isinstance(payload, dict):
+            # Own {"path": ...} body or a Nextcloud webhook event
+            node = (payload.get("event") or {}).get("node") or {}
+            path = payload.get("path") or node.get("path")
+        try:
+            subtree = self.server.relative_subtree(path)
+        except ValueError as exc:
+            self.send_json(400, {"error": str(exc)})
+            return
+        self.server.queue(subtree)
+        self.send_json(202, {"queued": subtree or "/"})
+
+
+class TriggerServer(ThreadingHTTPServer):
+    """HTTP endpoint that requests an immediate scan: ``POST /trigger`` with an
+    optional ``path`` (query or JSON body, or a Nextcloud webhook event) limits
+    the scan to that subtree. ``GET /health`` reports the last scan and
+    ``GET /metrics`` the ingester metrics in the Prometheus text format."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, wake: threading.Event, root_name: str = "", token: str = ""):
+        super().__init__(address, TriggerHandler)
+        self.wake = wake
+        self.root_name = root_name.strip("/")
+        self.token = token
+        self._lock = threading.Lock()
+        self._pending: List[Optional[str]] = []
+        self.last_scan: Dict = {}
+
+    def relative_subtree(self, path: Optional[str]) -> Optional[str]:
+        """Path below the ingest root; Nextcloud paths (/<user>/files/<root>/...)
+        are reduced to it. None means the whole tree."""
+        path = unquote(path or "").strip("/")
+        if "/files/" in f"/{path}":
+            path = f"/{path}".split("/files/", 1)[1]
+        if self.root_name and (path == self.root_name or path.startswith(self.root_name + "/")):
+            path = path[len(self.root_name):].strip("/")
+        if ".." in path.split("/"):
+            raise ValueError("path must not contain '..'")
+        return path or None
+
+    def queue(self, subtree: Optional[str]) -> None:
+        with self._lock:
+            if subtree not in self._pending:
+                self._pending.append(subtree)
+        self.wake.set()
+
+    def take(self) -> List[Optional[str]]:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def health(self) -> Dict:
+        with self._lock:
+            return {"status": "ok", "pending": len(self._pending), "last_scan": self.last_scan}
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="trigger", daemon=True).start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
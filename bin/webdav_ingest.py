@@ -1,17 +1,40 @@
 import argparse
+import decimal
+import hashlib
+import importlib.util
 import json
 import logging
+import multiprocessing
+import os
+import random
+import signal
 import sys
+import threading
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 from urllib.parse import quote, unquote, urljoin, urlparse
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
 
 import pymysql
 import requests
+from requests.adapters import HTTPAdapter
 from jsonschema import Draft4Validator, Draft7Validator
 
+from ingest_local import LocalDirectorySource
+from ingest_metrics import METRICS
+from ingest_paths import build_file_url, canonicalize_path, normalize_dir_path, normalize_webdav_url, parent_dir
+from ingest_trigger import TriggerServer
+
+try:
+    import httpx
+except ImportError:  # optional, the requests session is used instead
+    httpx = None
+
 FILE_TYPE_IDENTIFIER = "This is a EMPI-RF metadata File. Do not change this for crawler identification"
 logger = logging.getLogger("webdav_ingest")
 
@@ -70,37 +93,120 @@ def load_config(repo_root: Path) -> Dict[str, str]:
         "schema_dir": env.get("SCHEMA_DIR", str(repo_root / "backend" / "schemas")),
         "poll_interval": int(env.get("POLL_INTERVAL", 10)),
         "allowed_schemaids": env.get("ALLOWED_SCHEMAIDS", "").strip(),
+        "webdav_concurrency": int(env.get("WEBDAV_CONCURRENCY", 8)),
+        "webdav_max_per_host": int(env.get("WEBDAV_MAX_PER_HOST") or 0),
+        "webdav_retries": int(env.get("WEBDAV_RETRIES", 3)),
+        "webdav_retry_backoff": float(env.get("WEBDAV_RETRY_BACKOFF", 0.5)),
+        "poll_interval_max": int(env.get("POLL_INTERVAL_MAX", 120)),
+        "trigger_host": env.get("INGEST_TRIGGER_HOST", "127.0.0.1"),
+        "trigger_port": int(env.get("INGEST_TRIGGER_PORT") or 0),
+        "trigger_token": env.get("INGEST_TRIGGER_TOKEN", ""),
+        "scan_summary_file": env.get("INGEST_SCAN_SUMMARY_FILE", ""),
+        "ingest_source": env.get("INGEST_SOURCE", "webdav").strip().lower(),
+        "local_inbox": env.get("LOCAL_INBOX", "./data_inbox"),
+        "local_reconcile_interval": float(env.get("LOCAL_RECONCILE_INTERVAL", 300)),
+        "local_settle": float(env.get("LOCAL_SETTLE_SECONDS", 2)),
+        "webdav_sync": env.get("WEBDAV_SYNC", "false").strip().lower() in ("1", "true", "yes"),
+        "webdav_timeout": float(env.get("WEBDAV_TIMEOUT", 30)),
+        "webdav_http_client": env.get("WEBDAV_HTTP_CLIENT", "auto").strip().lower(),
+        "webdav_http2": env.get("WEBDAV_HTTP2", "true").strip().lower() in ("1", "true", "yes"),
+        "webdav_keepalive": float(env.get("WEBDAV_KEEPALIVE_SECONDS", 60)),
+        "download_workers": int(env.get("INGEST_DOWNLOAD_WORKERS", 8)),
+        "parse_workers": int(env.get("INGEST_PARSE_WORKERS") or os.cpu_count() or 1),
+        "ingest_queue_size": int(env.get("INGEST_QUEUE_SIZE", 64)),
+        "ingest_mode": env.get("INGEST_MODE", "insert").strip().lower(),
+        "content_hash": env.get("INGEST_CONTENT_HASH", "true").strip().lower() in ("1", "true", "yes"),
+        "on_delete": env.get("INGEST_ON_DELETE", "delete").strip().lower(),
+        "ingest_batch_size": int(env.get("INGEST_BATCH_SIZE", 200)),
+        "validation_errors": env.get("VALIDATION_ERRORS", "first").strip().lower(),
+        "validator_cache_size": int(env.get("VALIDATOR_CACHE_SIZE", 128)),
+        "precompile_schemas": env.get("PRECOMPILE_SCHEMAS", "").strip().lower() in ("1", "true", "yes"),
     }
+    # Per-request-type overrides, e.g. a short PROPFIND timeout with patient GETs of large files
+    for operation in ("propfind", "get", "report"):
+        name = operation.upper()
+        cfg[f"webdav_{operation}_timeout"] = float(env.get(f"WEBDAV_{name}_TIMEOUT") or cfg["webdav_timeout"])
+        cfg[f"webdav_{operation}_retries"] = int(env.get(f"WEBDAV_{name}_RETRIES") or cfg["webdav_retries"])
 
     return cfg
 
 
-def normalize_webdav_url(url: str) -> str:
-    if not url.endswith("/"):
-        return url + "/"
-    return url
+def escape_like(value: str, escape: str = "\\") -> str:
+    return value.replace(escape, escape + escape).replace("%", escape + "%").replace("_", escape + "_")
 
 
-def normalize_dir_path(path: str) -> str:
-    return path if path.endswith("/") else path + "/"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.HTTPError)
+if httpx is not None:
+    TRANSPORT_ERRORS += (httpx.TransportError, httpx.HTTPStatusError)
+# httpx speaks HTTP/2 only with the h2 package installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
 
-def canonicalize_path(path: str) -> str:
-    return quote(unquote(path), safe="/")
+class HostLimiter:
+    """Caps the number of concurrent requests per WebDAV host."""
 
+    def __init__(self, max_per_host: int):
+        self.max_per_host = max(1, max_per_host)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
 
-def escape_like(value: str, escape: str = "\\") -> str:
-    return value.replace(escape, escape + escape).replace("%", escape + "%").replace("_", escape + "_")
+    def __call__(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.max_per_host)
+            return self._semaphores[host]
 
 
-def build_file_url(base_url: str, href: str) -> str:
-    parsed = urlparse(base_url)
-    if href.startswith(parsed.path):
-        return f"{parsed.scheme}://{parsed.netloc}{href}"
-    return urljoin(base_url, href.lstrip("/"))
+def with_retries(func, retries: int, backoff: float, what: str):
+    """Call ``func`` and retry on connection errors, timeouts and 429/5xx responses
+    with exponential backoff plus jitter."""
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except TRANSPORT_ERRORS as exc:
+            status = exc.response.status_code if getattr(exc, "response", None) is not None else None
+            retryable = status is None or status in RETRY_STATUS_CODES
+            if not retryable or attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random() * 0.25)
+            attempt += 1
+            logger.warning("%s failed (%s), retry %d/%d in %.1fs", what, exc, attempt, retries, delay)
+            time.sleep(delay)
+
+
+class HttpxSession:
+    """The part of the requests.Session interface this script uses, on top of
+    one httpx.Client shared by the crawler and download threads. With HTTP/2
+    their requests are multiplexed over a single connection per host instead of
+    one keep-alive connection (and TLS handshake) per thread."""
+
+    def __init__(self, auth: tuple, max_connections: int, http2: bool = True, keepalive_expiry: float = 60):
+        self.http2 = http2
+        self.client = httpx.Client(
+            auth=auth,
+            http2=http2,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+
+    def request(self, method: str, url: str, data=None, headers: Optional[Dict[str, str]] = None, timeout: float = 30):
+        return self.client.request(method, url, content=data, headers=headers, timeout=timeout)
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 30):
+        return self.request("GET", url, headers=headers, timeout=timeout)
 
+    def close(self) -> None:
+        self.client.close()
 
-def propfind(session: requests.Session, url: str) -> List[Dict[str, str]]:
+
+def propfind(session: requests.Session, url: str, timeout: float = 30) -> List[Dict[str, str]]:
     headers = {"Depth": "1"}
     body = """
     <d:propfind xmlns:d="DAV:">
@@ -112,74 +218,156 @@ def propfind(session: requests.Session, url: str) -> List[Dict[str, str]]:
       </d:prop>
     </d:propfind>
     """.strip()
-    response = session.request("PROPFIND", url, data=body, headers=headers)
+    response = session.request("PROPFIND", url, data=body, headers=headers, timeout=timeout)
     response.raise_for_status()
     return parse_propfind(response.text)
 
 
+class PropfindCrawler:
+    """Issues PROPFINDs from a thread pool with per-host limits and retries."""
+
+    def __init__(
+        self,
+        session: requests.Session,
+        workers: int = 8,
+        max_per_host: Optional[int] = None,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30,
+    ):
+        self.session = session
+        self.workers = max(1, workers)
+        self.limiter = HostLimiter(max_per_host or self.workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def fetch(self, url: str) -> List[Dict[str, str]]:
+        def attempt():
+            with self.limiter(url), METRICS.timed("propfind"):
+                return propfind(self.session, url, self.timeout)
+        return with_retries(attempt, self.retries, self.backoff, f"PROPFIND {url}")
+
+
+def changes_since_last_sync(
+    session: requests.Session,
+    url: str,
+    token: Optional[str],
+    timeout: float = 30,
+    retries: int = 0,
+    backoff: float = 0.5,
+) -> tuple[Optional[List[Dict[str, str]]], List[str], str]:
+    """Changed items, deleted hrefs and the token to store after this scan.
+
+    The items are None when the caller has to crawl: on the first sync and when
+    the stored token was rejected. The token is then fetched before crawling, so
+    changes made during the crawl are reported by the next sync.
+    """
+    if token:
+        try:
+            return sync_collection(session, url, token, timeout, retries, backoff)
+        except SyncTokenRejected:
+            logger.warning("Sync token rejected by the server, falling back to a full crawl")
+    new_token = with_retries(
+        lambda: current_sync_token(session, url, timeout), retries, backoff, f"PROPFIND sync-token {url}"
+    )
+    if not new_token:
+        raise SyncNotSupported("collection has no DAV:sync-token property")
+    return None, [], new_token
+
+
 def list_json_files_recursive(
     session: requests.Session,
     base_url: str,
     start_url: str,
     cursor,
     folder_state: Dict[str, Dict[str, str]],
+    crawler: Optional[PropfindCrawler] = None,
+    crawled: Optional[Dict[str, bool]] = None,
 ) -> tuple[List[Dict[str, str]], int, int, int]:
     files: List[Dict[str, str]] = []
     entry_count = 0
     visited_dirs = set()
     seen_files = set()
     skipped_dirs = 0
+    crawler = crawler or PropfindCrawler(session, workers=1)
 
     start_path = canonicalize_path(normalize_dir_path(urlparse(start_url).path))
     visited_dirs.add(start_path)
-    queue = [start_url]
 
-    while queue:
-        current_url = queue.pop(0)
-        current_path = canonicalize_path(normalize_dir_path(urlparse(current_url).path))
-        entries = propfind(session, current_url)
-        entry_count += len(entries)
+    # Folders are PROPFINDed concurrently, but their results are consumed in
+    # submission order, so files, folder-state writes and the skip decisions come
+    # out exactly as in a sequential breadth-first walk. Only this thread touches
+    # the DB cursor. Folder states that changed are buffered and written in
+    # multi-row chunks; unchanged ones are not rewritten.
+    pending_state: Dict[str, tuple] = {}
+    with ThreadPoolExecutor(max_workers=crawler.workers, thread_name_prefix="propfind") as executor:
+        queue = deque()
 
-        for item in entries:
-            href = item.get("href")
-            if not href:
-                continue
-            href_url = build_file_url(base_url, href)
-            href_path = canonicalize_path(normalize_dir_path(urlparse(href_url).path))
-            if item.get("is_collection"):
-                prev_state = folder_state.get(href_path)
-                etag = item.get("etag") or ""
-                last_modified = item.get("last_modified") or ""
-
-                if href_path != current_path and prev_state is not None:
-                    if prev_state.get("etag") == etag and prev_state.get("last_modified") == last_modified and (etag or last_modified):
-                        cursor.execute(
-                            "REPLACE INTO ingest_folder_state (path, etag, last_modified, scanned_at) VALUES (%s, %s, %s, NOW())",
-                            (href_path, etag, last_modified),
+        def enqueue(url: str) -> None:
+            queue.append((url, executor.submit(crawler.fetch, url)))
+
+        enqueue(start_url)
+        try:
+            while queue:
+                current_url, future = queue.popleft()
+                METRICS.set_gauge("queue_depth", len(queue), queue="propfind")
+                current_path = canonicalize_path(normalize_dir_path(urlparse(current_url).path))
+                entries = future.result()
+                entry_count += len(entries)
+                if crawled is not None:
+                    crawled[current_path] = True
+
+                for item in entries:
+                    href = item.get("href")
+                    if not href:
+                        continue
+                    href_url = build_file_url(base_url, href)
+                    href_path = canonicalize_path(normalize_dir_path(urlparse(href_url).path))
+                    if item.get("is_collection"):
+                        prev_state = folder_state.get(href_path)
+                        etag = item.get("etag") or ""
+                        last_modified = item.get("last_modified") or ""
+
+                        unchanged = (
+                            prev_state is not None
+                            and prev_state.get("etag") == etag
+                            and prev_state.get("last_modified") == last_modified
                         )
-                        folder_state[href_path] = {"etag": etag, "last_modified": last_modified}
-                        skipped_dirs += 1
+                        if not unchanged:
+                            pending_state[href_path] = (etag, last_modified)
+                            if len(pending_state) >= FOLDER_STATE_CHUNK:
+                                write_folder_state(cursor, pending_state)
+                                pending_state.clear()
+                            folder_state[href_path] = {"etag": etag, "last_modified": last_modified}
+
+                        if href_path != current_path and unchanged and (etag or last_modified):
+                            if crawled is not None:
+                                crawled.setdefault(href_path, False)
+                            skipped_dirs += 1
+                            continue
+
+                        if href_path == current_path:
+                            if current_path == start_path and unchanged and (etag or last_modified) and crawled is not None:
+                                # The start folder is always listed, but nothing below it changed
+                                crawled[current_path] = False
+                            continue
+                        if href_path not in visited_dirs:
+                            visited_dirs.add(href_path)
+                            enqueue(href_url)
                         continue
 
-                cursor.execute(
-                    "REPLACE INTO ingest_folder_state (path, etag, last_modified, scanned_at) VALUES (%s, %s, %s, NOW())",
-                    (href_path, etag, last_modified),
-                )
-                folder_state[href_path] = {"etag": etag, "last_modified": last_modified}
-
-                if href_path == current_path:
-                    continue
-                if href_path not in visited_dirs:
-                    visited_dirs.add(href_path)
-                    queue.append(href_url)
-                continue
-
-            if href.lower().endswith(".json"):
-                if href in seen_files:
-                    continue
-                seen_files.add(href)
-                files.append(item)
-
+                    if href.lower().endswith(".json"):
+                        if href in seen_files:
+                            continue
+                        seen_files.add(href)
+                        files.append(item)
+        except BaseException:
+            for _, future in queue:
+                future.cancel()
+            raise
+
+    write_folder_state(cursor, pending_state)
     return files, entry_count, len(visited_dirs), skipped_dirs
 
 
@@ -207,6 +395,105 @@ def parse_propfind(xml_text: str) -> List[Dict[str, str]]:
     return items
 
 
+class SyncTokenRejected(Exception):
+    """The server no longer accepts the stored sync-token (RFC 6578 valid-sync-token)."""
+
+
+class SyncNotSupported(Exception):
+    """The collection does not support the sync-collection REPORT."""
+
+
+SYNC_COLLECTION_BODY = """
+<?xml version="1.0" encoding="utf-8" ?>
+<d:sync-collection xmlns:d="DAV:">
+  <d:sync-token>{token}</d:sync-token>
+  <d:sync-level>infinite</d:sync-level>
+  <d:prop>
+    <d:getetag />
+    <d:getlastmodified />
+    <d:getcontentlength />
+    <d:resourcetype />
+  </d:prop>
+</d:sync-collection>
+""".strip()
+
+
+def parse_sync_collection(xml_text: str) -> tuple[List[Dict[str, str]], List[str], str, bool]:
+    """Changed members, deleted hrefs, the new sync-token and whether the server
+    truncated the result (507 on the collection itself)."""
+    ns = {"d": "DAV:"}
+    root = ET.fromstring(xml_text)
+    deleted = []
+    truncated = False
+    for resp in root.findall("d:response", ns):
+        status = resp.findtext("d:status", default="", namespaces=ns)
+        if " 404" in status:
+            deleted.append(resp.findtext("d:href", default="", namespaces=ns))
+        elif " 507" in status:
+            truncated = True
+    token = (root.findtext("d:sync-token", default="", namespaces=ns) or "").strip()
+    return parse_propfind(xml_text), deleted, token, truncated
+
+
+def sync_collection(
+    session: requests.Session,
+    url: str,
+    token: str,
+    timeout: float = 30,
+    retries: int = 0,
+    backoff: float = 0.5,
+) -> tuple[List[Dict[str, str]], List[str], str]:
+    """Members of ``url`` (recursively) changed or deleted since ``token``.
+
+    Returns the changed items in parse_propfind's format, the deleted hrefs and
+    the new token. Truncated results are continued with the intermediate token.
+    """
+    changed: Dict[str, Dict[str, str]] = OrderedDict()
+    deleted: Dict[str, None] = OrderedDict()
+    headers = {"Content-Type": "application/xml; charset=utf-8"}
+    while True:
+        body = SYNC_COLLECTION_BODY.format(token=xml_escape(token)).encode("utf-8")
+
+        def attempt():
+            response = session.request("REPORT", url, data=body, headers=headers, timeout=timeout)
+            if response.status_code in RETRY_STATUS_CODES:
+                response.raise_for_status()
+            return response
+        response = with_retries(attempt, retries, backoff, f"REPORT {url}")
+        if response.status_code in (403, 409) and "valid-sync-token" in response.text:
+            raise SyncTokenRejected(token)
+        if response.status_code != 207:
+            raise SyncNotSupported(f"REPORT returned HTTP {response.status_code}")
+        items, gone, new_token, truncated = parse_sync_collection(response.text)
+        if not new_token:
+            raise SyncNotSupported("REPORT response has no sync-token")
+        for item in items:
+            deleted.pop(item["href"], None)
+            changed.pop(item["href"], None)
+            changed[item["href"]] = item
+        for href in gone:
+            changed.pop(href, None)
+            deleted[href] = None
+        if not truncated or new_token == token:
+            return list(changed.values()), list(deleted), new_token
+        token = new_token
+
+
+def current_sync_token(session: requests.Session, url: str, timeout: float = 30) -> Optional[str]:
+    body = """
+    <d:propfind xmlns:d="DAV:">
+      <d:prop>
+        <d:sync-token />
+      </d:prop>
+    </d:propfind>
+    """.strip()
+    response = session.request("PROPFIND", url, data=body, headers={"Depth": "0"}, timeout=timeout)
+    response.raise_for_status()
+    root = ET.fromstring(response.text)
+    token = root.findtext("d:response/d:propstat/d:prop/d:sync-token", default="", namespaces={"d": "DAV:"})
+    return token.strip() or None
+
+
 def get_state_map(cursor, paths: List[str]) -> Dict[str, Dict[str, str]]:
     if not paths:
         return {}
@@ -215,13 +502,19 @@ def get_state_map(cursor, paths: List[str]) -> Dict[str, Dict[str, str]]:
     for i in range(0, len(paths), chunk_size):
         chunk = paths[i:i + chunk_size]
         placeholders = ",".join(["%s"] * len(chunk))
-        query = f"SELECT path, etag, last_modified, status FROM ingest_state WHERE path IN ({placeholders})"
+        query = (
+            "SELECT path, etag, last_modified, schema_id, identifier, status, content_hash "
+            f"FROM ingest_state WHERE path IN ({placeholders})"
+        )
         cursor.execute(query, chunk)
-        for path, etag, last_modified, status in cursor.fetchall():
+        for path, etag, last_modified, schema_id, identifier, status, content_hash in cursor.fetchall():
             state[path] = {
                 "etag": etag,
                 "last_modified": last_modified,
+                "schema_id": schema_id,
+                "identifier": identifier,
                 "status": status,
+                "content_hash": content_hash,
             }
     return state
 
@@ -237,10 +530,26 @@ def ensure_state_table(cursor):
             identifier VARCHAR(255),
             processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             status VARCHAR(32),
-            error TEXT
+            error TEXT,
+            content_hash CHAR(64)
         )
         """
     )
+    cursor.execute("ALTER TABLE ingest_state ADD COLUMN IF NOT EXISTS content_hash CHAR(64)")
+
+
+STATE_COLUMNS = ("path", "etag", "last_modified", "schema_id", "identifier", "status", "error", "content_hash")
+
+
+def write_ingest_state(cursor, rows: List[tuple]) -> None:
+    if not rows:
+        return
+    row_placeholders = "(" + ", ".join(["%s"] * len(STATE_COLUMNS)) + ")"
+    query = (
+        f"REPLACE INTO ingest_state ({', '.join(STATE_COLUMNS)}) "
+        f"VALUES {', '.join([row_placeholders] * len(rows))}"
+    )
+    cursor.execute(query, [value for row in rows for value in row])
 
 
 def ensure_folder_state_table(cursor):
@@ -256,6 +565,47 @@ def ensure_folder_state_table(cursor):
     )
 
 
+FOLDER_STATE_CHUNK = 500
+
+
+def write_folder_state(cursor, states: Dict[str, tuple]) -> None:
+    rows = list(states.items())
+    for i in range(0, len(rows), FOLDER_STATE_CHUNK):
+        chunk = rows[i:i + FOLDER_STATE_CHUNK]
+        placeholders = ", ".join(["(%s, %s, %s, NOW())"] * len(chunk))
+        cursor.execute(
+            "INSERT INTO ingest_folder_state (path, etag, last_modified, scanned_at) "
+            f"VALUES {placeholders} "
+            "ON DUPLICATE KEY UPDATE etag = VALUES(etag), last_modified = VALUES(last_modified), scanned_at = NOW()",
+            [value for path, (etag, last_modified) in chunk for value in (path, etag, last_modified)],
+        )
+
+
+def ensure_sync_state_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_sync_state (
+            path VARCHAR(512) PRIMARY KEY,
+            sync_token VARCHAR(512),
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def get_sync_token(cursor, path: str) -> Optional[str]:
+    cursor.execute("SELECT sync_token FROM ingest_sync_state WHERE path = %s", (path,))
+    row = cursor.fetchone()
+    return row[0] if row and row[0] else None
+
+
+def save_sync_token(cursor, path: str, token: Optional[str]) -> None:
+    cursor.execute(
+        "REPLACE INTO ingest_sync_state (path, sync_token, synced_at) VALUES (%s, %s, NOW())",
+        (path, token),
+    )
+
+
 def get_folder_state_map(cursor, base_path: str) -> Dict[str, Dict[str, str]]:
     state = {}
     base_path = canonicalize_path(normalize_dir_path(base_path))
@@ -279,6 +629,81 @@ def get_columns(cursor, table: str) -> List[str]:
     return [row[0] for row in cursor.fetchall()]
 
 
+class TableCatalog:
+    """Column lists of the tables in the ingest database.
+
+    Loaded with a single information_schema query (forced once per scan) and
+    reloaded when a schema file in ``schema_dir`` is added, removed or changes
+    its mtime/size, e.g. after the DB UI created or migrated a table. Lookups
+    themselves never query the catalog.
+    """
+
+    def __init__(self, schema_dir: Path):
+        self.schema_dir = schema_dir
+        self.tables: Optional[Dict[str, List[str]]] = None
+        self.unique: Dict[str, set] = {}
+        self.stamp: Optional[tuple] = None
+
+    def schema_stamp(self) -> tuple:
+        stamp = []
+        for path in sorted(self.schema_dir.glob("*.json")):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            stamp.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def load(self, cursor) -> None:
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_KEY FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        )
+        tables: Dict[str, List[str]] = {}
+        unique: Dict[str, set] = {}
+        for table, column, key in cursor.fetchall():
+            tables.setdefault(table, []).append(column)
+            if key in ("PRI", "UNI"):
+                unique.setdefault(table, set()).add(column)
+        self.tables = tables
+        self.unique = unique
+        logger.debug("Loaded column metadata of %d tables", len(tables))
+
+    def refresh(self, cursor, force: bool = False) -> bool:
+        stamp = self.schema_stamp()
+        if not force and self.tables is not None and stamp == self.stamp:
+            return False
+        self.load(cursor)
+        self.stamp = stamp
+        return True
+
+    def columns(self, cursor, table: str) -> Optional[List[str]]:
+        if self.tables is None:
+            self.refresh(cursor)
+        columns = self.tables.get(table)
+        if columns is None and self.refresh(cursor):
+            columns = self.tables.get(table)
+        return columns
+
+
+def lookup_unique_columns(cursor, table: str, catalog: Optional[TableCatalog] = None) -> set:
+    """Columns leading a unique index (COLUMN_KEY PRI/UNI) of ``table``."""
+    if catalog is not None:
+        catalog.columns(cursor, table)
+        return catalog.unique.get(table, set())
+    cursor.execute(f"SHOW INDEX FROM `{table}` WHERE Non_unique = 0 AND Seq_in_index = 1")
+    return {row[4] for row in cursor.fetchall()}
+
+
+def lookup_columns(cursor, table: str, catalog: Optional[TableCatalog] = None) -> Optional[List[str]]:
+    """Columns of ``table`` or None if it does not exist."""
+    if catalog is not None:
+        return catalog.columns(cursor, table)
+    if not table_exists(cursor, table):
+        return None
+    return get_columns(cursor, table)
+
+
 def normalize_value(value):
     if isinstance(value, (dict, list)):
         return json.dumps(value, ensure_ascii=False)
@@ -303,52 +728,104 @@ def build_validator(schema_data: Dict):
     return Draft7Validator(schema_data)
 
 
-def validate_payload(schema_path: Path, payload: Dict) -> Optional[str]:
-    schema_data = json.loads(schema_path.read_text(encoding="utf-8"))
-    validator = build_validator(schema_data)
-    errors = sorted(validator.iter_errors(payload), key=lambda e: e.path)
-    if errors:
-        return errors[0].message
-    return None
-
-
-def process_file(
-    cursor,
-    conn,
+class ValidatorCache:
+    """LRU cache of compiled validators keyed by schema path.
+
+    Entries are revalidated with a stat call; when mtime or size changed the file is
+    re-read, and the validator is only rebuilt if the content hash differs too.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, schema_path: Path):
+        key = str(schema_path)
+        stat = schema_path.stat()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["validator"]
+        raw = schema_path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            if entry and entry["hash"] == digest:
+                validator = entry["validator"]
+                self.hits += 1
+            else:
+                validator = build_validator(json.loads(raw.decode("utf-8")))
+                self.misses += 1
+            self._entries[key] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": digest,
+                "validator": validator,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return validator
+
+    def precompile(self, schema_dir: Path) -> int:
+        count = 0
+        for schema_path in sorted(schema_dir.glob("*.json")):
+            try:
+                self.get(schema_path)
+                count += 1
+            except Exception as exc:
+                logger.warning("Could not compile schema %s (%s)", schema_path, exc)
+        return count
+
+
+VALIDATOR_CACHE = ValidatorCache()
+
+
+def format_validation_error(error) -> str:
+    location = "/".join(str(part) for part in error.absolute_path)
+    return f"{location}: {error.message}" if location else error.message
+
+
+def validate_payload(
+    schema_path: Path,
+    payload: Dict,
+    error_mode: str = "first",
+    cache: Optional[ValidatorCache] = None,
+) -> Optional[str]:
+    validator = (cache or VALIDATOR_CACHE).get(schema_path)
+    if error_mode == "all":
+        errors = [format_validation_error(error) for error in validator.iter_errors(payload)]
+        return "; ".join(errors) if errors else None
+    # iter_errors is lazy, so this stops at the first violation
+    error = next(validator.iter_errors(payload), None)
+    return error.message if error is not None else None
+
+
+def check_document(
     schema_dir: Path,
-    url: str,
     data: Dict,
     schema_id: str,
-    identifier: str,
     allowed_schemaids: Optional[List[str]],
-):
+    error_mode: str = "first",
+) -> Optional[str]:
     if allowed_schemaids is not None and schema_id not in allowed_schemaids:
-        return False, f"SchemaID '{schema_id}' not in allow-list."
+        return f"SchemaID '{schema_id}' not in allow-list."
 
     schema_path = schema_dir / f"{schema_id}.json"
     if not schema_path.exists():
-        return False, f"Schema file not found: {schema_path}"
+        return f"Schema file not found: {schema_path}"
 
-    validation_error = validate_payload(schema_path, data)
+    validation_error = validate_payload(schema_path, data, error_mode=error_mode)
     if validation_error:
-        return False, f"Schema validation failed: {validation_error}"
-
-    table = schema_id
-    if not table_exists(cursor, table):
-        return False, f"Table '{table}' does not exist."
-
-    columns = get_columns(cursor, table)
-    if not columns:
-        return False, f"Table '{table}' has no columns."
-
-    identifier_col = "Identifier" if "Identifier" in columns else "identifier"
+        return f"Schema validation failed: {validation_error}"
+    return None
 
-    # Transactional check to avoid duplicates without UNIQUE constraint
-    cursor.execute(f"SELECT 1 FROM `{table}` WHERE `{identifier_col}` = %s LIMIT 1 FOR UPDATE", (identifier,))
-    if cursor.fetchone() is not None:
-        conn.commit()
-        return False, f"Identifier '{identifier}' already exists in '{table}'."
 
+def build_row(columns: List[str], data: Dict, identifier: str, url: str) -> List:
     data_keys = {str(k).lower(): k for k in data.keys()}
     values = []
     for column in columns:
@@ -360,24 +837,1018 @@ def process_file(
             elif column.lower() == "documentlocation":
                 value = url
         values.append(normalize_value(value))
+    return values
+
+
+def content_hash(data: Dict) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def prepare_document(
+    href: str,
+    content: bytes,
+    schema_dir: str,
+    allowed_schemaids: Optional[List[str]],
+    error_mode: str = "first",
+) -> Dict:
+    """Parse and validate one downloaded file. Runs in the parse worker processes,
+    so it only takes and returns picklable values."""
+    started = time.perf_counter()
+    try:
+        data = json.loads(content)
+    except ValueError as exc:
+        return {"status": "error", "stage": "parse", "error": f"download/parse error: {exc}"}
+    parsed = time.perf_counter()
+
+    if not isinstance(data, dict) or data.get("FileTypeIdentifier") != FILE_TYPE_IDENTIFIER:
+        return {"status": "skipped", "stage": "parse", "error": "invalid FileTypeIdentifier"}
+
+    schema_id = get_schema_id(data)
+    if not schema_id:
+        return {"status": "skipped", "stage": "parse", "error": "missing SchemaID"}
+
+    identifier = get_identifier(data, Path(href).stem)
+    error = check_document(Path(schema_dir), data, schema_id, allowed_schemaids, error_mode)
+    outcome = {
+        "schema_id": schema_id,
+        "identifier": identifier,
+        "content_hash": content_hash(data),
+        # Measured here because this runs in a parse worker process
+        "timings": {"parse": parsed - started, "validate": time.perf_counter() - parsed},
+    }
+    if error:
+        outcome.update(status="skipped", stage="check", error=error)
+    else:
+        outcome.update(status="ready", stage="check", data=data)
+    return outcome
+
+
+def init_parse_worker(cache_size: int, schema_dir: Optional[str]) -> None:
+    VALIDATOR_CACHE.max_entries = cache_size
+    if schema_dir:
+        VALIDATOR_CACHE.precompile(Path(schema_dir))
+
+
+class IngestPipeline:
+    """Download -> parse/validate -> DB write pipeline for changed files.
+
+    Downloads (``read(href)`` of the source) run in a thread pool, parsing and
+    schema validation in a process pool (or inline in the download threads when
+    ``parse_workers`` is 0), and the caller writes to the DB from a single
+    thread while iterating ``run``. At most
+    ``queue_size`` files are in flight, so a slow DB writer throttles the
+    downloads, and results are yielded in input order. After ``stop`` only the
+    files already in flight are yielded.
+    """
+
+    def __init__(
+        self,
+        read: Callable[[str, Optional[str]], Optional[bytes]],
+        schema_dir: Path,
+        allowed_schemaids: Optional[List[str]],
+        error_mode: str = "first",
+        download_workers: int = 8,
+        parse_workers: int = 0,
+        queue_size: int = 64,
+        validator_cache_size: int = 128,
+        precompile: bool = False,
+    ):
+        self.read = read
+        self.schema_dir = str(schema_dir)
+        self.allowed_schemaids = allowed_schemaids
+        self.error_mode = error_mode
+        self.queue_size = max(1, queue_size)
+        self.stopping = threading.Event()
+        self.downloads = ThreadPoolExecutor(max_workers=max(1, download_workers), thread_name_prefix="download")
+        self.parsers = None
+        if parse_workers > 0:
+            # spawn avoids forking a process that already runs download threads
+            self.parsers = ProcessPoolExecutor(
+                max_workers=parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_parse_worker,
+                initargs=(validator_cache_size, self.schema_dir if precompile else None),
+            )
+
+    def _prepare_inline(self, href: str, content: bytes) -> Dict:
+        return prepare_document(href, content, self.schema_dir, self.allowed_schemaids, self.error_mode)
+
+    def _submit(self, href: str, etag: Optional[str] = None) -> Future:
+        result: Future = Future()
+
+        def parsed(future: Future) -> None:
+            exc = future.exception()
+            if exc is not None:
+                result.set_exception(exc)
+            else:
+                result.set_result(future.result())
+
+        def downloaded(future: Future) -> None:
+            exc = future.exception()
+            if exc is not None:
+                result.set_result({"status": "error", "stage": "download", "error": f"download/parse error: {exc}"})
+                return
+            content = future.result()
+            if content is None:
+                # 304 Not Modified: the stored document is still current
+                result.set_result({"status": "unchanged", "stage": "download"})
+                return
+            parsers = self.parsers
+            if parsers is not None:
+                try:
+                    parsers.submit(
+                        prepare_document, href, content, self.schema_dir, self.allowed_schemaids, self.error_mode
+                    ).add_done_callback(parsed)
+                    return
+                except (BrokenProcessPool, RuntimeError) as pool_exc:
+                    logger.error("Parse worker pool unavailable (%s), validating in download threads", pool_exc)
+                    self.parsers = None
+            try:
+                result.set_result(self._prepare_inline(href, content))
+            except Exception as prepare_exc:
+                result.set_exception(prepare_exc)
+
+        self.downloads.submit(self._download, href, etag).add_done_callback(downloaded)
+        return result
+
+    def _download(self, href: str, etag: Optional[str]) -> Optional[bytes]:
+        with METRICS.timed("download"):
+            content = self.read(href, etag)
+        if content is None:
+            METRICS.inc("not_modified_total")
+        else:
+            METRICS.inc("downloaded_bytes_total", len(content))
+        return content
+
+    def run(self, items: Iterable[Dict[str, str]]) -> Iterator[tuple[Dict[str, str], Dict]]:
+        pending = deque()
+        iterator = iter(items)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.queue_size and not self.stopping.is_set():
+                item = next(iterator, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending.append((item, self._submit(item["href"], item.get("if_none_match"))))
+            METRICS.set_gauge("queue_depth", len(pending), queue="pipeline")
+            if not pending:
+                return
+            item, future = pending.popleft()
+            try:
+                outcome = future.result()
+            except BrokenProcessPool as exc:
+                logger.error("Parse worker crashed on %s (%s)", item["href"], exc)
+                self.parsers = None
+                outcome = {"status": "error", "stage": "parse", "error": f"parse worker crashed: {exc}"}
+            except Exception as exc:
+                outcome = {"status": "error", "stage": "parse", "error": f"download/parse error: {exc}"}
+            for stage, seconds in outcome.get("timings", {}).items():
+                METRICS.observe(stage, seconds)
+            yield item, outcome
+
+    def stop(self) -> None:
+        """Stop taking new files; ``run`` still yields the ones in flight."""
+        self.stopping.set()
+
+    def close(self) -> None:
+        self.downloads.shutdown(wait=True, cancel_futures=True)
+        if self.parsers is not None:
+            self.parsers.shutdown(wait=True, cancel_futures=True)
+
+
+TOMBSTONE_STATUSES = ("deleted", "moved")
+
+
+def location_column(columns: List[str]) -> Optional[str]:
+    for column in columns:
+        if column.lower() == "documentlocation":
+            return column
+    return None
+
+
+def relocate_rows(cursor, table: str, identifier_col: str, location_col: Optional[str], relocations: List[tuple]) -> None:
+    """Point rows at their new documentlocation: ``relocations`` holds
+    (identifier, old location, new location) tuples. One UPDATE per table."""
+    if not location_col or not relocations:
+        return
+    cases = " ".join(["WHEN %s THEN %s"] * len(relocations))
+    keys = ", ".join(["(%s, %s)"] * len(relocations))
+    cursor.execute(
+        f"UPDATE `{table}` SET `{location_col}` = CASE `{identifier_col}` {cases} ELSE `{location_col}` END "
+        f"WHERE (`{identifier_col}`, `{location_col}`) IN ({keys})",
+        [value for identifier, _, new in relocations for value in (identifier, new)]
+        + [value for identifier, old, _ in relocations for value in (identifier, old)],
+    )
 
-    column_list = ", ".join(f"`{col}`" for col in columns)
-    placeholders = ", ".join(["%s"] * len(columns))
-    query = f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders})"
-    cursor.execute(query, values)
+
+def get_live_states(cursor, prefixes: Iterable[str] = (), paths: Iterable[str] = ()) -> Dict[str, Dict[str, str]]:
+    """ingest_state rows below the folder ``prefixes`` or at ``paths``, without tombstones."""
+    conditions = []
+    params: List[str] = []
+    for prefix in prefixes:
+        conditions.append("path LIKE %s ESCAPE '\\'")
+        params.append(f"{escape_like(prefix)}%")
+    paths = list(paths)
+    if paths:
+        conditions.append(f"path IN ({', '.join(['%s'] * len(paths))})")
+        params.extend(paths)
+    if not conditions:
+        return {}
+    return select_live_states(cursor, conditions, params)
+
+
+def get_live_states_in_folders(cursor, folders: Dict[str, List[str]]) -> Dict[str, Dict[str, str]]:
+    """ingest_state rows without tombstones inside the listed ``folders``.
+
+    ``folders`` maps each folder to the names of the subfolders its listing
+    showed. Rows below those subfolders are left out, because the subfolders are
+    listed themselves or were skipped by their ETag. Rows below subfolders that
+    are gone from the listing are included.
+    """
+    states: Dict[str, Dict[str, str]] = {}
+    items = list(folders.items())
+    for i in range(0, len(items), FOLDER_STATE_CHUNK):
+        conditions = []
+        params: List = []
+        for folder, subfolders in items[i:i + FOLDER_STATE_CHUNK]:
+            condition = "path LIKE %s ESCAPE '\\'"
+            params.append(f"{escape_like(folder)}%")
+            if subfolders:
+                # First path component below the folder: a file name or a subfolder name
+                condition += (
+                    f" AND SUBSTRING_INDEX(SUBSTRING(path, %s), '/', 1) NOT IN ({', '.join(['%s'] * len(subfolders))})"
+                )
+                params.append(len(folder) + 1)
+                params.extend(subfolders)
+            conditions.append(f"({condition})")
+        states.update(select_live_states(cursor, conditions, params))
+    return states
+
+
+def select_live_states(cursor, conditions: List[str], params: List) -> Dict[str, Dict[str, str]]:
+    cursor.execute(
+        "SELECT path, etag, last_modified, schema_id, identifier, status, content_hash FROM ingest_state "
+        f"WHERE ({' OR '.join(conditions)}) AND status NOT IN ({', '.join(['%s'] * len(TOMBSTONE_STATUSES))})",
+        params + list(TOMBSTONE_STATUSES),
+    )
+    return {
+        path: {"etag": etag, "last_modified": last_modified, "schema_id": schema_id,
+               "identifier": identifier, "status": status, "content_hash": content_hash}
+        for path, etag, last_modified, schema_id, identifier, status, content_hash in cursor.fetchall()
+    }
+
+
+def find_removed(
+    cursor,
+    base_url: str,
+    base_path: str,
+    crawled: Optional[Dict[str, bool]] = None,
+    seen_hrefs: Iterable[str] = (),
+    deleted_hrefs: Iterable[str] = (),
+) -> Dict[str, Dict[str, str]]:
+    """ingest_state rows of files that no longer exist.
+
+    After a crawl, ``crawled`` maps every folder met to whether it was listed
+    (True) or skipped by its ETag (False). A file is gone when it is missing from
+    the listing of its folder, or when its folder vanished from a listed parent;
+    files below skipped folders are left alone. In sync mode the server reports
+    ``deleted_hrefs`` directly, which may also be whole folders.
+    """
+    if crawled is not None:
+        base_path = canonicalize_path(base_path)
+        # Only listed folders can reveal removals; when every folder was skipped
+        # by its ETag there is nothing to look up
+        listed: Dict[str, List[str]] = {folder: [] for folder, was_listed in crawled.items() if was_listed}
+        if not listed:
+            return {}
+        for folder in crawled:
+            parent = parent_dir(folder)
+            if parent != folder and parent in listed:
+                listed[parent].append(folder[len(parent):].rstrip("/"))
+        seen = set(seen_hrefs)
+        removed = {}
+        for path, state in get_live_states_in_folders(cursor, listed).items():
+            if path in seen:
+                continue
+            folder = parent_dir(canonicalize_path(urlparse(build_file_url(base_url, path)).path))
+            while folder not in crawled and folder.startswith(base_path) and folder != base_path:
+                folder = parent_dir(folder)
+            if crawled.get(folder):
+                removed[path] = state
+        return removed
+    deleted_hrefs = list(deleted_hrefs)
+    folders = [normalize_dir_path(href) for href in deleted_hrefs if not href.lower().endswith(".json")]
+    files = [href for href in deleted_hrefs if href.lower().endswith(".json")]
+    return get_live_states(cursor, prefixes=folders, paths=files)
+
+
+def match_moves(
+    changed: List[Dict[str, str]],
+    state_map: Dict[str, Dict[str, str]],
+    removed: Dict[str, Dict[str, str]],
+) -> tuple[List[tuple], List[Dict[str, str]]]:
+    """Pair new files with removed ones that had the same ETag.
+
+    Returns (old path, old state, new item) moves, which need no download, and
+    the remaining changed files. Ambiguous ETags are not treated as moves.
+    """
+    by_etag: Dict[str, Optional[str]] = {}
+    for path, state in removed.items():
+        if state["etag"] and state["status"] == "ok":
+            by_etag[state["etag"]] = None if state["etag"] in by_etag else path
+    moves = []
+    remaining = []
+    for item in changed:
+        prev_status = (state_map.get(item["href"]) or {}).get("status")
+        is_new = prev_status is None or prev_status in TOMBSTONE_STATUSES
+        old_path = by_etag.get(item["etag"]) if item["etag"] and is_new else None
+        if old_path is None:
+            remaining.append(item)
+            continue
+        by_etag[item["etag"]] = None
+        moves.append((old_path, removed[old_path], item))
+    return moves, remaining
+
+
+def apply_moves(cursor, base_url: str, moves: List[tuple], catalog: Optional[TableCatalog] = None) -> None:
+    """Relocate the rows of files moved with an unchanged ETag and move their
+    ingest_state to the new path, leaving a 'moved' tombstone behind."""
+    by_table: Dict[str, List[tuple]] = OrderedDict()
+    states = []
+    for old_path, state, item in moves:
+        by_table.setdefault(state["schema_id"], []).append(
+            (state["identifier"], build_file_url(base_url, old_path), build_file_url(base_url, item["href"]))
+        )
+        states.append((
+            item["href"], item["etag"], item["last_modified"], state["schema_id"], state["identifier"],
+            "ok", None, state["content_hash"],
+        ))
+        states.append((
+            old_path, state["etag"], state["last_modified"], state["schema_id"], state["identifier"],
+            "moved", item["href"], state["content_hash"],
+        ))
+    for table, relocations in by_table.items():
+        columns = lookup_columns(cursor, table, catalog)
+        if not columns:
+            continue
+        identifier_col = "Identifier" if "Identifier" in columns else "identifier"
+        relocate_rows(cursor, table, identifier_col, location_column(columns), relocations)
+    write_ingest_state(cursor, states)
+
+
+def remove_documents(
+    cursor,
+    base_url: str,
+    removed: Dict[str, Dict[str, str]],
+    moved: Dict[str, str],
+    delete_rows: bool = True,
+    catalog: Optional[TableCatalog] = None,
+) -> int:
+    """Tombstone the ingest_state of removed files and delete their rows.
+
+    Files relocated by the BatchWriter (``moved``: old path -> new path) get a
+    'moved' tombstone instead. Only rows that still point at the removed file are
+    deleted, with one DELETE per table. Returns the number of deleted rows.
+    """
+    states = []
+    by_table: Dict[str, List[tuple]] = OrderedDict()
+    for path, state in removed.items():
+        new_path = moved.get(path)
+        status = "moved" if new_path else "deleted"
+        states.append((
+            path, state["etag"], state["last_modified"], state["schema_id"], state["identifier"],
+            status, new_path, state["content_hash"],
+        ))
+        if not new_path and state["status"] == "ok" and state["schema_id"] and state["identifier"]:
+            by_table.setdefault(state["schema_id"], []).append((state["identifier"], build_file_url(base_url, path)))
+
+    deleted = 0
+    if delete_rows:
+        for table, keys in by_table.items():
+            columns = lookup_columns(cursor, table, catalog)
+            if not columns:
+                continue
+            identifier_col = "Identifier" if "Identifier" in columns else "identifier"
+            location_col = location_column(columns)
+            chunk_size = 500
+            for i in range(0, len(keys), chunk_size):
+                chunk = keys[i:i + chunk_size]
+                if location_col:
+                    placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+                    cursor.execute(
+                        f"DELETE FROM `{table}` WHERE (`{identifier_col}`, `{location_col}`) IN ({placeholders})",
+                        [value for key in chunk for value in key],
+                    )
+                else:
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    cursor.execute(
+                        f"DELETE FROM `{table}` WHERE `{identifier_col}` IN ({placeholders})",
+                        [identifier for identifier, _ in chunk],
+                    )
+                deleted += cursor.rowcount
+    write_ingest_state(cursor, states)
+    return deleted
+
+
+def same_value(current, new) -> bool:
+    """Whether a value read from MariaDB equals one about to be written
+    (after normalize_value); numbers are compared numerically."""
+    if current is None or new is None:
+        return current is None and new is None
+    numeric = (int, float, decimal.Decimal)
+    if isinstance(current, numeric) and isinstance(new, numeric):
+        return float(current) == float(new)
+    if isinstance(current, (bytes, bytearray)):
+        current = current.decode("utf-8", errors="replace")
+    return str(current) == str(new)
+
+
+class BatchWriter:
+    """Writes validated documents and their ingest_state rows in batches.
+
+    Documents are grouped per schema table: one ``SELECT ... FOR UPDATE`` finds
+    identifiers that already exist, one multi-row INSERT adds the rest, and one
+    REPLACE records the state of every file in the batch before a single commit.
+    Existing rows whose document was removed in this scan are relocated to the
+    new file (``moved`` maps the old path to the new one). With ``upsert`` an
+    existing row of the same file is updated instead of skipped, writing only
+    the columns whose value changed.
+
+    If the batch fails, it is rolled back and its documents are written one by
+    one, so a bad row only fails itself. With ``batch_size`` 1 every file is
+    committed on its own.
+    """
+
+    def __init__(
+        self,
+        cursor,
+        conn,
+        batch_size: int = 200,
+        catalog: Optional[TableCatalog] = None,
+        removed: Optional[Dict[str, str]] = None,
+        upsert: bool = False,
+    ):
+        self.cursor = cursor
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.catalog = catalog
+        # documentlocation -> path of files removed in this scan; an existing row
+        # pointing at one of them is moved to the new file instead of skipped
+        self.removed = removed or {}
+        self.upsert = upsert
+        self.moved: Dict[str, str] = {}
+        self.documents: List[Dict] = []
+        self.states: List[tuple] = []
+
+    def add_state(
+        self,
+        item: Dict[str, str],
+        schema_id,
+        identifier,
+        status: str,
+        error: Optional[str],
+        content_hash: Optional[str] = None,
+    ) -> None:
+        self.states.append((
+            item["href"], item["etag"], item["last_modified"], schema_id, identifier, status, error, content_hash,
+        ))
+        pending = len(self.states) + len(self.documents)
+        METRICS.set_gauge("queue_depth", pending, queue="write")
+        if pending >= self.batch_size:
+            self.flush()
+
+    def add_document(
+        self,
+        item: Dict[str, str],
+        url: str,
+        data: Dict,
+        schema_id: str,
+        identifier: str,
+        content_hash: Optional[str] = None,
+    ) -> None:
+        self.documents.append({
+            "item": item, "url": url, "data": data, "schema_id": schema_id, "identifier": identifier,
+            "content_hash": content_hash,
+        })
+        pending = len(self.states) + len(self.documents)
+        METRICS.set_gauge("queue_depth", pending, queue="write")
+        if pending >= self.batch_size:
+            self.flush()
+
+    def _write_updates(
+        self,
+        table: str,
+        columns: List[str],
+        identifier_col: str,
+        location_col: Optional[str],
+        updates: Dict[tuple, List[tuple]],
+    ) -> None:
+        """Write changed columns, one statement per set of changed columns.
+
+        With a unique index on the identifier this is a multi-row INSERT ... ON
+        DUPLICATE KEY UPDATE of just those columns; otherwise the rows are updated
+        one by one, matched on identifier and their current documentlocation.
+        """
+        unique = identifier_col in lookup_unique_columns(self.cursor, table, self.catalog)
+        column_list = ", ".join(f"`{col}`" for col in columns)
+        row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for changed, entries in updates.items():
+            if unique:
+                assignments = ", ".join(f"`{col}` = VALUES(`{col}`)" for col in changed)
+                self.cursor.execute(
+                    f"INSERT INTO `{table}` ({column_list}) VALUES {', '.join([row_placeholders] * len(entries))} "
+                    f"ON DUPLICATE KEY UPDATE {assignments}",
+                    [value for row, _ in entries for value in row],
+                )
+                continue
+            assignments = ", ".join(f"`{col}` = %s" for col in changed)
+            condition = f"`{identifier_col}` = %s"
+            if location_col:
+                condition += f" AND `{location_col}` <=> %s"
+            for row, location in entries:
+                values = dict(zip(columns, row))
+                params = [values[col] for col in changed] + [values[identifier_col]]
+                if location_col:
+                    params.append(location)
+                self.cursor.execute(f"UPDATE `{table}` SET {assignments} WHERE {condition}", params)
+
+    def _insert_batch(self, documents: List[Dict], moved: Dict[str, str]) -> List[tuple]:
+        """(status, error, action) per document; action is one of inserted,
+        updated, unchanged or moved for documents written successfully."""
+        results: List[tuple] = [("ok", None, "inserted")] * len(documents)
+        by_table: Dict[str, List[int]] = OrderedDict()
+        for index, document in enumerate(documents):
+            by_table.setdefault(document["schema_id"], []).append(index)
+
+        for table, indexes in by_table.items():
+            columns = lookup_columns(self.cursor, table, self.catalog)
+            if columns is None:
+                for index in indexes:
+                    results[index] = ("skipped", f"Table '{table}' does not exist.", None)
+                continue
+            if not columns:
+                for index in indexes:
+                    results[index] = ("skipped", f"Table '{table}' has no columns.", None)
+                continue
+            identifier_col = "Identifier" if "Identifier" in columns else "identifier"
+            location_col = location_column(columns)
+
+            # Upserts compare against the whole row, inserts only need the owner
+            if self.upsert:
+                selected = [identifier_col] + [col for col in columns if col != identifier_col]
+            else:
+                selected = [identifier_col] + ([location_col] if location_col else [])
+            identifiers = list(dict.fromkeys(documents[index]["identifier"] for index in indexes))
+            placeholders = ", ".join(["%s"] * len(identifiers))
+            self.cursor.execute(
+                f"SELECT {', '.join(f'`{col}`' for col in selected)} FROM `{table}` "
+                f"WHERE `{identifier_col}` IN ({placeholders}) FOR UPDATE",
+                identifiers,
+            )
+            existing = {str(row[0]): dict(zip(selected, row)) for row in self.cursor.fetchall()}
+            seen = set(existing)
+            rows = []
+            relocations = []
+            updates: Dict[tuple, List[tuple]] = OrderedDict()
+            for index in indexes:
+                document = documents[index]
+                identifier = document["identifier"]
+                current = existing.get(identifier)
+                location = current.get(location_col) if current is not None and location_col else None
+                old_path = self.removed.get(location or "")
+                is_move = old_path is not None and old_path not in moved and old_path not in self.moved
+                if is_move:
+                    moved[old_path] = document["item"]["href"]
+
+                same_file = is_move or location_col is None or location == document["url"]
+                if current is not None and self.upsert and same_file:
+                    row = build_row(columns, document["data"], identifier, document["url"])
+                    changed = tuple(col for col, value in zip(columns, row) if not same_value(current[col], value))
+                    if changed:
+                        updates.setdefault(changed, []).append((row, location))
+                    results[index] = ("ok", None, "moved" if is_move else ("updated" if changed else "unchanged"))
+                    continue
+                if is_move:
+                    relocations.append((identifier, location, document["url"]))
+                    results[index] = ("ok", None, "moved")
+                    continue
+                if identifier in seen:
+                    results[index] = ("skipped", f"Identifier '{identifier}' already exists in '{table}'.", None)
+                    continue
+                seen.add(identifier)
+                rows.append(build_row(columns, document["data"], identifier, document["url"]))
+            if relocations:
+                relocate_rows(self.cursor, table, identifier_col, location_col, relocations)
+            if updates:
+                self._write_updates(table, columns, identifier_col, location_col, updates)
+            if not rows:
+                continue
+
+            column_list = ", ".join(f"`{col}`" for col in columns)
+            row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+            # The no-op update only guards against a concurrent writer on tables with a
+            # unique Identifier index; unlike INSERT IGNORE it keeps type errors fatal
+            query = (
+                f"INSERT INTO `{table}` ({column_list}) VALUES {', '.join([row_placeholders] * len(rows))} "
+                f"ON DUPLICATE KEY UPDATE `{identifier_col}` = `{identifier_col}`"
+            )
+            self.cursor.execute(query, [value for row in rows for value in row])
+        return results
+
+    def _insert_each(self, documents: List[Dict], moved: Dict[str, str]) -> List[tuple]:
+        results = []
+        for document in documents:
+            document_moved = dict(moved)
+            try:
+                results.extend(self._insert_batch([document], document_moved))
+                self.conn.commit()
+                moved.update(document_moved)
+            except Exception as exc:
+                self.conn.rollback()
+                logger.exception("Processing error: %s", document["item"]["href"])
+                results.append(("error", str(exc), None))
+        return results
+
+    def flush(self) -> None:
+        if not self.documents and not self.states:
+            return
+        started = time.perf_counter()
+        documents, self.documents = self.documents, []
+        states, self.states = self.states, []
+        METRICS.set_gauge("queue_depth", 0, queue="write")
+        if documents and self.catalog is not None:
+            self.catalog.refresh(self.cursor)
+        moved: Dict[str, str] = {}
+        try:
+            results = self._insert_batch(documents, moved)
+        except pymysql.Error as exc:
+            moved = {}
+            self.conn.rollback()
+            logger.warning("Batch insert of %d files failed (%s), retrying one by one", len(documents), exc)
+            results = self._insert_each(documents, moved)
+
+        for document, (status, error, _) in zip(documents, results):
+            item = document["item"]
+            states.append((
+                item["href"], item["etag"], item["last_modified"],
+                document["schema_id"], document["identifier"], status, error,
+                document["content_hash"] if status == "ok" else None,
+            ))
+        write_ingest_state(self.cursor, states)
+        self.conn.commit()
+        self.moved.update(moved)
+        METRICS.observe("db", time.perf_counter() - started)
+        for state in states:
+            METRICS.inc("files_total", status=state[5])
+
+        for document, (status, error, action) in zip(documents, results):
+            href = document["item"]["href"]
+            if status == "ok":
+                logger.info("%s: %s", action.capitalize(), href)
+            elif status == "skipped":
+                logger.warning("Skipped: %s (%s)", href, error)
+
+
+class WebDAVSource:
+    """JSON files below a WebDAV folder, listed by crawling with PROPFIND or,
+    with ``sync``, through the sync-collection REPORT."""
+
+    name = "webdav"
+
+    def __init__(
+        self,
+        session: requests.Session,
+        base_url: str,
+        target_url: str,
+        crawler: PropfindCrawler,
+        sync: bool = False,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff: float = 0.5,
+        report_timeout: Optional[float] = None,
+        report_retries: Optional[int] = None,
+    ):
+        self.session = session
+        self.base_url = base_url
+        self.target_url = target_url
+        self.base_path = normalize_dir_path(urlparse(target_url).path)
+        self.crawler = crawler
+        self.sync = sync
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.report_timeout = timeout if report_timeout is None else report_timeout
+        self.report_retries = retries if report_retries is None else report_retries
+        self.wake = threading.Event()
+
+    def prepare(self, cursor) -> None:
+        ensure_folder_state_table(cursor)
+        ensure_sync_state_table(cursor)
+
+    def subtree_url(self, subtree: str) -> str:
+        path = unquote(subtree).strip("/")
+        if path.lower().endswith(".json"):
+            path = path.rsplit("/", 1)[0] if "/" in path else ""
+        return urljoin(self.target_url, quote(path) + "/") if path else self.target_url
+
+    def scan(self, cursor, subtree: Optional[str] = None) -> Dict:
+        """Files to look at plus what find_removed needs: ``crawled`` after a
+        crawl, ``deleted`` hrefs after a sync, and the sync token to store.
+
+        ``subtree`` (relative to the target folder) limits a crawl to that
+        folder; a sync always covers everything.
+        """
+        self.wake.clear()
+        if self.sync:
+            try:
+                with METRICS.timed("sync"):
+                    files, deleted, sync_token = changes_since_last_sync(
+                        self.session,
+                        self.target_url,
+                        get_sync_token(cursor, self.base_path),
+                        self.report_timeout,
+                        self.report_retries,
+                        self.backoff,
+                    )
+            except SyncNotSupported as exc:
+                logger.warning("sync-collection not supported (%s), crawling from now on", exc)
+                self.sync = False
+                files, deleted, sync_token = None, [], None
+            except Exception:
+                logger.exception("sync-collection REPORT failed, crawling instead")
+                files, deleted, sync_token = None, [], None
+            if files is not None:
+                files = [f for f in files if not f.get("is_collection") and f["href"].lower().endswith(".json")]
+                logger.info("Sync: %d changed json files, %d deleted entries", len(files), len(deleted))
+                return {"files": files, "crawled": None, "deleted": deleted, "sync_token": sync_token}
+        else:
+            sync_token = None
+
+        start_url = self.subtree_url(subtree) if subtree else self.target_url
+        base_path = normalize_dir_path(urlparse(start_url).path)
+        folder_state = get_folder_state_map(cursor, base_path)
+        crawled: Dict[str, bool] = {}
+        files, entry_count, dir_count, skipped_dirs = list_json_files_recursive(
+            self.session,
+            self.base_url,
+            start_url,
+            cursor,
+            folder_state,
+            self.crawler,
+            crawled,
+        )
+        METRICS.inc("folders_total", dir_count, result="crawled")
+        METRICS.inc("folders_total", skipped_dirs, result="skipped")
+        logger.info(
+            "Scan: %d entries across %d folders (%d skipped), %d json files",
+            entry_count,
+            dir_count,
+            skipped_dirs,
+            len(files),
+        )
+        if subtree:
+            # A partial crawl cannot stand in for the listing a new token needs
+            sync_token = None
+        return {"files": files, "crawled": crawled, "deleted": [], "sync_token": sync_token, "base_path": base_path}
+
+    def finish(self, cursor, scan: Dict) -> None:
+        if scan.get("sync_token"):
+            save_sync_token(cursor, self.base_path, scan["sync_token"])
+
+    def abort(self, cursor, scan: Dict, unprocessed: Optional[List[str]] = None) -> None:
+        """Forget the folder state above files a stopped scan did not process,
+        so the next crawl does not skip those folders by their ETag.
+
+        ``unprocessed=None`` means the whole scan failed: every folder it listed
+        is forgotten as well, so files removed meanwhile are still noticed.
+        """
+        base_path = canonicalize_path(self.base_path)
+        folders = set()
+        listed = set()
+        if unprocessed is None:
+            unprocessed = [item["href"] for item in scan["files"]]
+            listed = {folder for folder, was_listed in (scan["crawled"] or {}).items() if was_listed}
+        for href in unprocessed:
+            folder = parent_dir(canonicalize_path(urlparse(build_file_url(self.base_url, href)).path))
+            while folder.startswith(base_path) and folder not in folders:
+                folders.add(folder)
+                folder = parent_dir(folder)
+        folders = sorted(folders | listed)
+        for i in range(0, len(folders), FOLDER_STATE_CHUNK):
+            chunk = folders[i:i + FOLDER_STATE_CHUNK]
+            cursor.execute(
+                f"DELETE FROM ingest_folder_state WHERE path IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+
+    def read(self, href: str, etag: Optional[str] = None) -> Optional[bytes]:
+        """Content of ``href``, or None when the server answers a conditional
+        GET for ``etag`` with 304 Not Modified."""
+        url = build_file_url(self.base_url, href)
+        headers = {"If-None-Match": etag} if etag else None
+
+        def attempt():
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if etag and response.status_code == 304:
+                return None
+            response.raise_for_status()
+            return response.content
+        return with_retries(attempt, self.retries, self.backoff, f"GET {url}")
+
+    def wait(self, timeout: float) -> None:
+        self.wake.wait(timeout)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def build_http_session(cfg: Dict):
+    """The HTTP client shared by the crawler and the download threads: an
+    httpx client (HTTP/2 when h2 is installed) if available, requests otherwise."""
+    auth = (cfg["webdav_user"], cfg["webdav_password"])
+    pool_size = max(10, cfg["webdav_concurrency"], cfg["download_workers"])
+    client = cfg["webdav_http_client"]
+    if client not in ("auto", "httpx", "requests"):
+        raise SystemExit(f"Unknown WEBDAV_HTTP_CLIENT: {client!r} (expected auto, httpx or requests)")
+    if client == "httpx" and httpx is None:
+        raise SystemExit("WEBDAV_HTTP_CLIENT=httpx requires the httpx package (pip install 'httpx[http2]')")
+    if client != "requests" and httpx is not None:
+        http2 = cfg["webdav_http2"] and HTTP2_AVAILABLE
+        if cfg["webdav_http2"] and not HTTP2_AVAILABLE:
+            logger.warning("WEBDAV_HTTP2 is on but the h2 package is missing, using HTTP/1.1 keep-alive")
+        logger.info("WebDAV client: httpx (%s, %d connections)", "HTTP/2" if http2 else "HTTP/1.1", pool_size)
+        return HttpxSession(auth, pool_size, http2=http2, keepalive_expiry=cfg["webdav_keepalive"])
+    session = requests.Session()
+    session.auth = auth
+    # Keep one pooled keep-alive connection per crawler thread
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    logger.info("WebDAV client: requests (HTTP/1.1, %d connections)", pool_size)
+    return session
+
+
+def build_webdav_source(cfg: Dict) -> WebDAVSource:
+    session = build_http_session(cfg)
+    crawler = PropfindCrawler(
+        session,
+        workers=cfg["webdav_concurrency"],
+        max_per_host=cfg["webdav_max_per_host"] or None,
+        retries=cfg["webdav_propfind_retries"],
+        backoff=cfg["webdav_retry_backoff"],
+        timeout=cfg["webdav_propfind_timeout"],
+    )
+    base_url = normalize_webdav_url(cfg["webdav_url"])
+    target_url = urljoin(base_url, cfg["webdav_root"].strip("/") + "/")
+    return WebDAVSource(
+        session,
+        base_url,
+        target_url,
+        crawler,
+        sync=cfg["webdav_sync"],
+        timeout=cfg["webdav_get_timeout"],
+        retries=cfg["webdav_get_retries"],
+        backoff=cfg["webdav_retry_backoff"],
+        report_timeout=cfg["webdav_report_timeout"],
+        report_retries=cfg["webdav_report_retries"],
+    )
+
+
+def log_scan_summary(summary: Dict, path: str = "") -> None:
+    line = json.dumps(summary, sort_keys=True)
+    logger.info("Scan summary: %s", line)
+    if path:
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+
+def connect_db(cfg: Dict):
+    return pymysql.connect(
+        host=cfg["db_host"],
+        port=cfg["db_port"],
+        user=cfg["db_user"],
+        password=cfg["db_password"],
+        database=cfg["db_name"],
+        autocommit=False,
+    )
+
+
+def process_scan(conn, cursor, source, scan: Dict, pipeline: IngestPipeline, catalog: TableCatalog, cfg: Dict) -> Dict:
+    """Validate and write the changed files of one scan and reconcile removed ones."""
+    base_url = source.base_url
+    files = scan["files"]
+    paths = [f["href"] for f in files]
+    state_map = get_state_map(cursor, paths)
+
+    changed = []
+    for item in files:
+        prev = state_map.get(item["href"])
+        if prev and prev.get("etag") == item["etag"] and prev.get("last_modified") == item["last_modified"] and prev.get("status") == "ok":
+            logger.debug("Unchanged: %s", item["href"])
+            continue
+        if cfg["content_hash"] and prev and prev.get("status") == "ok" and prev.get("etag") and prev.get("content_hash"):
+            # Only the metadata moved on: let the server answer 304 if the ETag still matches
+            item = dict(item, if_none_match=prev["etag"])
+        changed.append(item)
+
+    catalog.refresh(cursor, force=True)
+    removed = find_removed(cursor, base_url, scan.get("base_path", source.base_path), scan["crawled"], paths, scan["deleted"])
+    if removed:
+        moves, changed = match_moves(changed, state_map, removed)
+        if moves:
+            apply_moves(cursor, base_url, moves, catalog)
+            conn.commit()
+            for old_path, _, item in moves:
+                logger.info("Moved: %s -> %s", old_path, item["href"])
+                removed.pop(old_path)
+    removed_locations = {build_file_url(base_url, path): path for path in removed}
+    writer = BatchWriter(
+        cursor, conn, cfg["ingest_batch_size"], catalog, removed_locations, cfg["ingest_mode"] == "upsert"
+    )
+    processed = set()
+    for item, outcome in pipeline.run(changed):
+        href = item["href"]
+        processed.add(href)
+        schema_id = outcome.get("schema_id")
+        identifier = outcome.get("identifier")
+
+        if outcome["status"] == "unchanged":
+            prev = state_map[href]
+            logger.debug("Not modified: %s", href)
+            writer.add_state(item, prev["schema_id"], prev["identifier"], "ok", None, prev["content_hash"])
+            continue
+
+        if outcome["status"] != "ready":
+            if outcome["status"] == "error":
+                logger.warning("Download/parse error: %s (%s)", href, outcome["error"])
+            elif outcome["stage"] == "parse":
+                logger.warning("Skipped (%s): %s", outcome["error"], href)
+            else:
+                logger.warning("Skipped: %s (%s)", href, outcome["error"])
+            writer.add_state(item, schema_id, identifier, outcome["status"], outcome["error"])
+            continue
+
+        prev = state_map.get(href)
+        if cfg["content_hash"] and prev and prev.get("status") == "ok" and prev.get("content_hash") == outcome["content_hash"]:
+            logger.debug("Unchanged content: %s", href)
+            writer.add_state(item, schema_id, identifier, "ok", None, outcome["content_hash"])
+            continue
+
+        logger.info("Processing: %s (schema=%s, id=%s)", href, schema_id, identifier)
+        writer.add_document(
+            item, build_file_url(base_url, href), outcome["data"], schema_id, identifier, outcome["content_hash"]
+        )
+    writer.flush()
+    deleted_rows = 0
+    if removed:
+        deleted_rows = remove_documents(
+            cursor, base_url, removed, writer.moved, cfg["on_delete"] == "delete", catalog
+        )
+        conn.commit()
+        logger.info(
+            "Removed: %d files gone (%d moved), %d rows deleted",
+            len(removed), len(writer.moved), deleted_rows,
+        )
+    unprocessed = [item["href"] for item in changed if item["href"] not in processed]
+    if unprocessed:
+        logger.warning("Scan stopped early, %d changed files left for the next scan", len(unprocessed))
+        source.abort(cursor, scan, unprocessed)
+    else:
+        source.finish(cursor, scan)
     conn.commit()
-    return True, "inserted"
+    return {
+        "files": len(files),
+        "changed": len(changed),
+        "removed": len(removed),
+        "deleted_rows": deleted_rows,
+        "interrupted": bool(unprocessed),
+    }
 
 
 def main():
-    parser = argparse.ArgumentParser(description="WebDAV JSON -> MariaDB ingester")
+    parser = argparse.ArgumentParser(description="WebDAV / local directory JSON -> MariaDB ingester")
     parser.add_argument("--once", action="store_true", help="Run a single scan then exit")
     parser.add_argument("--interval", type=int, help="Seconds between scans")
+    parser.add_argument("--max-interval", type=int, help="Upper bound for the interval while nothing changes")
+    parser.add_argument("--trigger-port", type=int, help="Port of the HTTP trigger and metrics endpoint (0 = off)")
+    parser.add_argument("--summary-file", help="Append a JSON summary line per scan to this file")
+    parser.add_argument("--source", choices=["webdav", "local"], help="Ingest from WebDAV or a local directory")
+    parser.add_argument("--inbox", help="Local directory for --source local")
     parser.add_argument("--webdav-url", help="Base WebDAV URL (files endpoint)")
     parser.add_argument("--webdav-root", help="Remote folder under WebDAV base")
     parser.add_argument("--webdav-user", help="WebDAV user")
     parser.add_argument("--webdav-password", help="WebDAV password")
     parser.add_argument("--schema-dir", help="Path to backend schemas")
+    parser.add_argument("--concurrency", type=int, help="Parallel PROPFIND requests while crawling")
+    parser.add_argument("--sync", action="store_true", help="Use the sync-collection REPORT instead of crawling when supported")
+    parser.add_argument("--download-workers", type=int, help="Parallel file downloads")
+    parser.add_argument("--parse-workers", type=int, help="Processes for JSON parsing and validation (0 = in download threads)")
+    parser.add_argument("--batch-size", type=int, help="Files written per DB transaction (1 = commit every file)")
+    parser.add_argument("--mode", choices=["insert", "upsert"], help="Skip (insert) or update (upsert) documents that already exist")
+    parser.add_argument("--on-delete", choices=["delete", "keep"], help="Delete the rows of removed files or only tombstone them")
+    parser.add_argument("--validation-errors", choices=["first", "all"], help="Report the first or all schema violations")
+    parser.add_argument("--precompile-schemas", action="store_true", help="Compile all schema validators at startup")
     parser.add_argument("--log-level", default="INFO", help="Logging level (DEBUG, INFO, WARNING, ERROR)")
     args = parser.parse_args()
 
@@ -387,6 +1858,16 @@ def main():
     cfg = load_config(repo_root)
     if args.interval is not None:
         cfg["poll_interval"] = args.interval
+    if args.max_interval is not None:
+        cfg["poll_interval_max"] = args.max_interval
+    if args.trigger_port is not None:
+        cfg["trigger_port"] = args.trigger_port
+    if args.summary_file:
+        cfg["scan_summary_file"] = args.summary_file
+    if args.source:
+        cfg["ingest_source"] = args.source
+    if args.inbox:
+        cfg["local_inbox"] = args.inbox
     if args.webdav_url:
         cfg["webdav_url"] = args.webdav_url
     if args.webdav_root:
@@ -397,154 +1878,193 @@ def main():
         cfg["webdav_password"] = args.webdav_password
     if args.schema_dir:
         cfg["schema_dir"] = args.schema_dir
+    if args.concurrency is not None:
+        cfg["webdav_concurrency"] = args.concurrency
+    if args.sync:
+        cfg["webdav_sync"] = True
+    if args.download_workers is not None:
+        cfg["download_workers"] = args.download_workers
+    if args.parse_workers is not None:
+        cfg["parse_workers"] = args.parse_workers
+    if args.batch_size is not None:
+        cfg["ingest_batch_size"] = args.batch_size
+    if args.mode:
+        cfg["ingest_mode"] = args.mode
+    if args.on_delete:
+        cfg["on_delete"] = args.on_delete
+    if args.validation_errors:
+        cfg["validation_errors"] = args.validation_errors
+    if args.precompile_schemas:
+        cfg["precompile_schemas"] = True
 
     schema_dir = resolve_path(cfg["schema_dir"], repo_root)
     allowed_schemaids = None
     if cfg["allowed_schemaids"]:
         allowed_schemaids = [s.strip() for s in cfg["allowed_schemaids"].split(",") if s.strip()]
 
-    session = requests.Session()
-    session.auth = (cfg["webdav_user"], cfg["webdav_password"])
-
-    base_url = normalize_webdav_url(cfg["webdav_url"])
-    webdav_root = cfg["webdav_root"].strip("/")
-    target_url = urljoin(base_url, webdav_root + "/")
-
-    logger.info("Starting WebDAV ingest (once=%s, interval=%ss)", args.once, cfg["poll_interval"])
-    logger.info("WebDAV target: %s", target_url)
+    if cfg["ingest_source"] == "local":
+        source = LocalDirectorySource(
+            resolve_path(cfg["local_inbox"], repo_root),
+            reconcile_interval=cfg["local_reconcile_interval"],
+            settle=cfg["local_settle"],
+            watch=not args.once,
+        )
+        logger.info("Starting local ingest (once=%s, interval=%ss)", args.once, cfg["poll_interval"])
+        logger.info("Inbox: %s", source.root)
+    else:
+        source = build_webdav_source(cfg)
+        logger.info("Starting WebDAV ingest (once=%s, interval=%ss)", args.once, cfg["poll_interval"])
+        logger.info("WebDAV target: %s", source.target_url)
     logger.info("Schema dir: %s", schema_dir)
     if allowed_schemaids:
         logger.info("Allowed SchemaIDs: %s", ", ".join(allowed_schemaids))
 
-    while True:
+    VALIDATOR_CACHE.max_entries = cfg["validator_cache_size"]
+    if cfg["precompile_schemas"]:
+        logger.info("Precompiled %d schema validators", VALIDATOR_CACHE.precompile(schema_dir))
+
+    catalog = TableCatalog(schema_dir)
+    pipeline = IngestPipeline(
+        source.read,
+        schema_dir,
+        allowed_schemaids,
+        error_mode=cfg["validation_errors"],
+        download_workers=cfg["download_workers"],
+        parse_workers=cfg["parse_workers"],
+        queue_size=cfg["ingest_queue_size"],
+        validator_cache_size=cfg["validator_cache_size"],
+        precompile=cfg["precompile_schemas"],
+    )
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop.is_set():
+            raise SystemExit(1)
+        logger.info("Received signal %d, finishing in-flight files (repeat to exit now)", signum)
+        stop.set()
+        pipeline.stop()
+        source.wake.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    trigger = None
+    if cfg["trigger_port"] and not args.once:
+        root_name = cfg["webdav_root"] if source.name == "webdav" else ""
+        trigger = TriggerServer((cfg["trigger_host"], cfg["trigger_port"]), source.wake, root_name, cfg["trigger_token"])
+        trigger.start()
+        logger.info("Trigger/metrics endpoint: http://%s:%d/", cfg["trigger_host"], cfg["trigger_port"])
+
+    # Adaptive polling: back off while nothing changes, return to poll_interval after changes
+    max_interval = max(cfg["poll_interval"], cfg["poll_interval_max"])
+    interval = cfg["poll_interval"]
+    conn = None
+    failures = 0
+    # Scans whose processing failed after their folder state was committed; they
+    # are undone (source.abort) before the next scan so their files are retried
+    failed_scans: List[Dict] = []
+
+    def undo_failed_scans(cursor) -> None:
+        if not failed_scans:
+            return
+        for scan in failed_scans:
+            source.abort(cursor, scan)
+        conn.commit()
+        logger.info("Undid %d failed scan(s), their files are retried", len(failed_scans))
+        failed_scans.clear()
+
+    def back_off() -> None:
+        # Wait out consecutive failures (doubling up to max_interval); triggers
+        # arriving meanwhile are picked up by the next attempt
+        if stop.is_set():
+            return
+        delay = min(cfg["poll_interval"] * 2 ** min(failures - 1, 16), max_interval)
+        logger.warning("%d failed attempt(s) in a row, retrying in %ss", failures, delay)
+        stop.wait(delay)
+
+    while not stop.is_set():
         try:
-            conn = pymysql.connect(
-                host=cfg["db_host"],
-                port=cfg["db_port"],
-                user=cfg["db_user"],
-                password=cfg["db_password"],
-                database=cfg["db_name"],
-                autocommit=False,
-            )
+            if conn is None:
+                conn = connect_db(cfg)
+                with conn.cursor() as cursor:
+                    ensure_state_table(cursor)
+                    source.prepare(cursor)
+                conn.commit()
+            else:
+                conn.ping(reconnect=True)
         except Exception:
             logger.exception("DB connection failed")
+            conn = None
             if args.once:
                 raise
-            time.sleep(cfg["poll_interval"])
+            failures += 1
+            back_off()
             continue
+
+        subtrees = trigger.take() if trigger else []
+        targets = [None] if not subtrees or None in subtrees else subtrees
+        changes = 0
+        failed = False
         try:
             with conn.cursor() as cursor:
-                ensure_state_table(cursor)
-                ensure_folder_state_table(cursor)
-                conn.commit()
-
-                try:
-                    base_path = normalize_dir_path(urlparse(target_url).path)
-                    folder_state = get_folder_state_map(cursor, base_path)
-                    files, entry_count, dir_count, skipped_dirs = list_json_files_recursive(
-                        session,
-                        base_url,
-                        target_url,
-                        cursor,
-                        folder_state,
-                    )
-                except Exception:
-                    logger.exception("WebDAV PROPFIND failed")
-                    if args.once:
-                        raise
-                    time.sleep(cfg["poll_interval"])
-                    continue
-                conn.commit()
-                paths = [f["href"] for f in files]
-                state_map = get_state_map(cursor, paths)
-                logger.info(
-                    "Scan: %d entries across %d folders (%d skipped), %d json files",
-                    entry_count,
-                    dir_count,
-                    skipped_dirs,
-                    len(files),
-                )
-
-                for item in files:
-                    href = item["href"]
-                    etag = item["etag"]
-                    last_modified = item["last_modified"]
-                    prev = state_map.get(href)
-
-                    if prev and prev.get("etag") == etag and prev.get("last_modified") == last_modified and prev.get("status") == "ok":
-                        logger.debug("Unchanged: %s", href)
-                        continue
-
-                    file_url = build_file_url(base_url, href)
-                    try:
-                        response = session.get(file_url, timeout=30)
-                        response.raise_for_status()
-                        data = response.json()
-                    except Exception as exc:
-                        logger.warning("Download/parse error: %s (%s)", href, exc)
-                        cursor.execute(
-                            "REPLACE INTO ingest_state (path, etag, last_modified, status, error) VALUES (%s, %s, %s, %s, %s)",
-                            (href, etag, last_modified, "error", f"download/parse error: {exc}"),
-                        )
-                        conn.commit()
-                        continue
-
-                    if data.get("FileTypeIdentifier") != FILE_TYPE_IDENTIFIER:
-                        logger.warning("Skipped (invalid FileTypeIdentifier): %s", href)
-                        cursor.execute(
-                            "REPLACE INTO ingest_state (path, etag, last_modified, status, error) VALUES (%s, %s, %s, %s, %s)",
-                            (href, etag, last_modified, "skipped", "invalid FileTypeIdentifier"),
-                        )
-                        conn.commit()
-                        continue
-
-                    schema_id = get_schema_id(data)
-                    if not schema_id:
-                        logger.warning("Skipped (missing SchemaID): %s", href)
-                        cursor.execute(
-                            "REPLACE INTO ingest_state (path, etag, last_modified, status, error) VALUES (%s, %s, %s, %s, %s)",
-                            (href, etag, last_modified, "skipped", "missing SchemaID"),
-                        )
-                        conn.commit()
-                        continue
-
-                    identifier = get_identifier(data, Path(href).stem)
-                    try:
-                        logger.info("Processing: %s (schema=%s, id=%s)", href, schema_id, identifier)
-                        ok, msg = process_file(
-                            cursor,
-                            conn,
-                            schema_dir,
-                            file_url,
-                            data,
-                            schema_id,
-                            identifier,
-                            allowed_schemaids,
-                        )
-                        status = "ok" if ok else "skipped"
-                        cursor.execute(
-                            "REPLACE INTO ingest_state (path, etag, last_modified, schema_id, identifier, status, error) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                            (href, etag, last_modified, schema_id, identifier, status, None if ok else msg),
-                        )
-                        conn.commit()
-                        if ok:
-                            logger.info("Inserted: %s", href)
-                        else:
-                            logger.warning("Skipped: %s (%s)", href, msg)
-                    except Exception as exc:
-                        conn.rollback()
-                        logger.exception("Processing error: %s", href)
-                        cursor.execute(
-                            "REPLACE INTO ingest_state (path, etag, last_modified, schema_id, identifier, status, error) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                            (href, etag, last_modified, schema_id, identifier, "error", str(exc)),
-                        )
-                        conn.commit()
-        finally:
-            conn.close()
+                undo_failed_scans(cursor)
+                for subtree in targets:
+                    if stop.is_set():
+                        break
+                    METRICS.begin_scan()
+                    scan = source.scan(cursor, subtree)
+                    conn.commit()
+                    failed_scans.append(scan)
+                    summary = process_scan(conn, cursor, source, scan, pipeline, catalog, cfg)
+                    failed_scans.pop()
+                    changes += summary["changed"] + summary["removed"]
+                    summary.update(METRICS.end_scan(), subtree=subtree or "/", finished_at=round(time.time(), 3))
+                    log_scan_summary(summary, cfg["scan_summary_file"])
+                    if trigger:
+                        trigger.last_scan = summary
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            logger.exception("Lost the DB connection, reconnecting")
+            failed = True
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+            if args.once:
+                raise
+        except Exception:
+            # A WebDAV outage or an unexpected bug must not end the daemon
+            logger.exception("Scan of %s source failed", source.name)
+            failed = True
+            try:
+                conn.rollback()
+                with conn.cursor() as cursor:
+                    undo_failed_scans(cursor)
+            except Exception:
+                logger.exception("Could not undo the failed scan yet")
+                conn = None
+            if args.once:
+                raise
 
         if args.once:
             break
-        time.sleep(cfg["poll_interval"])
+        if failed:
+            failures += 1
+            back_off()
+            continue
+        failures = 0
+        interval = cfg["poll_interval"] if changes or subtrees else min(interval * 2, max_interval)
+        logger.debug("Next scan in %ss", interval)
+        source.wait(interval)
+
+    if trigger:
+        trigger.stop()
+    if conn is not None:
+        conn.close()
+    pipeline.close()
+    source.close()
+    logger.info("Stopped")
 
 
 if __name__ == "__main__":
@@ -229,6 +229,8 @@ Environment="PATH=$ROOT_DIR/backend/venv/bin"
 ExecStart=$ROOT_DIR/backend/venv/bin/python $ROOT_DIR/bin/webdav_ingest.py --log-level INFO
 Restart=always
 RestartSec=5
+# Leave time to write the files in flight after SIGTERM
+TimeoutStopSec=120
 
 [Install]
 WantedBy=multi-user.target
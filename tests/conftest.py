@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# backend/ and bin/ are flat script directories, imported the way they import each other
+REPO_ROOT = Path(__file__).resolve().parents[1]
+for directory in ("backend", "bin"):
+    sys.path.insert(0, str(REPO_ROOT / directory))
@@ -0,0 +1,126 @@
+import pytest
+
+from schema_migrations import plan_migration
+from schema_tables import plan_indexes
+
+
+class FakeCursor:
+    """Answers the information_schema queries of plan_migration from a fixed table."""
+
+    def __init__(self, columns=None, indexes=None, duplicates=()):
+        self.columns = columns
+        self.indexes = indexes or {}
+        self.duplicates = set(duplicates)
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if "information_schema.COLUMNS" in sql:
+            self.result = list((self.columns or {}).items())
+        elif "information_schema.STATISTICS" in sql:
+            self.result = [(name, 0 if unique else 1) for name, unique in self.indexes.items()]
+        elif sql.startswith("SHOW COLUMNS"):
+            self.result = [(name,) for name in self.columns or {}]
+        elif "HAVING COUNT(*) > 1" in sql:
+            self.result = [(1,)] if any(f"`{name}`" in sql for name in self.duplicates) else []
+        else:
+            raise AssertionError(f"Unexpected query: {sql}")
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+PROPERTIES = {
+    "Identifier": {"type": "string"},
+    "SampleID": {"type": "string", "x-index": True},
+    "Power": {"type": "number"},
+    "Count": {"type": "integer"},
+    "Calibrated": {"type": "boolean"},
+    "Settings": {"type": "object"},
+}
+LIVE_COLUMNS = {
+    "Identifier": "varchar(255)",
+    "SampleID": "varchar(255)",
+    "Power": "float",
+    "Count": "int(11)",
+    "Calibrated": "tinyint(1)",
+    "Settings": "longtext",
+    "documentlocation": "varchar(255)",
+}
+LIVE_INDEXES = {"Identifier": True, "SampleID": False}
+
+
+def test_plan_indexes():
+    indexes = plan_indexes({
+        "Identifier": {"type": "string"},
+        "SampleID": {"type": "string", "x-index": True},
+        "Serial": {"type": "string", "x-index": "unique"},
+        "Settings": {"type": "object", "x-index": True},
+        "Power": {"type": "number"},
+    })
+    assert indexes == [
+        {"name": "ux_Identifier", "column": "Identifier", "unique": True},
+        {"name": "ix_SampleID", "column": "SampleID", "unique": False},
+        {"name": "ux_Serial", "column": "Serial", "unique": True},
+    ]
+
+
+def test_plan_indexes_truncates_long_names():
+    name = "x" * 80
+    assert plan_indexes({name: {"type": "string", "x-index": True}})[0]["name"] == ("ix_" + name)[:64]
+
+
+def test_plan_migration_creates_a_missing_table():
+    plan = plan_migration(FakeCursor(), "samples", PROPERTIES)
+    assert plan["action"] == "create"
+    assert plan["added"] == list(PROPERTIES) + ["documentlocation"]
+    assert plan["statements"][0].startswith("CREATE TABLE IF NOT EXISTS `samples`")
+    assert "UNIQUE KEY `ux_Identifier` (`Identifier`)" in plan["statements"][0]
+
+
+def test_plan_migration_ignores_equivalent_types():
+    # MariaDB reports INT as int(11), BOOLEAN as tinyint(1) and JSON as longtext
+    plan = plan_migration(FakeCursor(LIVE_COLUMNS, LIVE_INDEXES), "samples", PROPERTIES)
+    assert plan == {
+        "table": "samples", "action": "none", "added": [], "modified": [], "removed": [], "statements": [],
+    }
+
+
+def test_plan_migration_diffs_columns_in_one_alter():
+    properties = dict(PROPERTIES, Count={"type": "string"}, Operator={"type": "string"})
+    live = dict(LIVE_COLUMNS, Legacy="varchar(255)")
+    plan = plan_migration(FakeCursor(live, LIVE_INDEXES), "samples", properties)
+    assert plan["action"] == "alter"
+    assert plan["added"] == ["Operator"]
+    assert plan["modified"] == [{"column": "Count", "from": "int(11)", "to": "VARCHAR(255)"}]
+    assert plan["removed"] == ["Legacy"]
+    assert plan["statements"] == [
+        "ALTER TABLE `samples` MODIFY COLUMN `Count` VARCHAR(255), ADD COLUMN `Operator` VARCHAR(255)"
+    ]
+
+
+def test_plan_migration_drops_removed_columns_on_request():
+    live = dict(LIVE_COLUMNS, Legacy="varchar(255)")
+    plan = plan_migration(FakeCursor(live, LIVE_INDEXES), "samples", PROPERTIES, drop_removed=True)
+    assert plan["statements"] == ["ALTER TABLE `samples` DROP COLUMN `Legacy`"]
+
+
+@pytest.mark.parametrize("duplicates, statement", [
+    ((), "ALTER TABLE `samples` ADD UNIQUE KEY `ux_Identifier` (`Identifier`), ALGORITHM=INPLACE, LOCK=NONE"),
+    (("Identifier",), "ALTER TABLE `samples` ADD KEY `ix_Identifier` (`Identifier`), ALGORITHM=INPLACE, LOCK=NONE"),
+])
+def test_plan_migration_backfills_missing_indexes(duplicates, statement):
+    cursor = FakeCursor(LIVE_COLUMNS, {"SampleID": False}, duplicates)
+    plan = plan_migration(cursor, "samples", PROPERTIES)
+    assert plan["action"] == "alter"
+    assert plan["statements"] == [statement]
+
+
+def test_plan_migration_indexes_new_columns_without_checking_duplicates():
+    properties = dict(PROPERTIES, Serial={"type": "string", "x-index": "unique"})
+    cursor = FakeCursor(LIVE_COLUMNS, LIVE_INDEXES, duplicates=("Serial",))
+    plan = plan_migration(cursor, "samples", properties)
+    assert plan["added"] == ["Serial"]
+    assert plan["statements"][1] == "ALTER TABLE `samples` ADD UNIQUE KEY `ux_Serial` (`Serial`), ALGORITHM=INPLACE, LOCK=NONE"
@@ -0,0 +1,131 @@
+import datetime
+import decimal
+import sqlite3
+
+import pytest
+
+from table_query import QueryError, TableQuery, decode_cursor, encode_cursor, pick_key_columns
+
+
+def column(name, key="", nullable=False, type="varchar(255)"):
+    return {"name": name, "type": type, "nullable": nullable, "key": key, "default": None, "extra": ""}
+
+
+def test_cursor_round_trip():
+    token = encode_cursor({"k": ["a", 3, None]})
+    assert "=" not in token
+    assert decode_cursor(token) == {"k": ["a", 3, None]}
+
+
+def test_cursor_encodes_dates_and_decimals_as_strings():
+    token = encode_cursor({"k": [datetime.date(2025, 1, 2), decimal.Decimal("1.50")]})
+    assert decode_cursor(token) == {"k": ["2025-01-02", "1.50"]}
+
+
+@pytest.mark.parametrize("token", ["not base64!", encode_cursor([1, 2]), encode_cursor("o")])
+def test_decode_cursor_rejects_garbage(token):
+    with pytest.raises(QueryError):
+        decode_cursor(token)
+
+
+@pytest.mark.parametrize("offset", [-1, "5", True, 1.5, None])
+def test_offset_cursor_must_be_a_non_negative_integer(offset):
+    query = TableQuery("`t`", {"a": "`a`"})
+    with pytest.raises(QueryError):
+        query.apply_args({"cursor": encode_cursor({"o": offset})}, max_limit=100)
+
+
+def test_pick_key_columns_prefers_the_primary_key():
+    described = [column("a", "PRI"), column("b", "PRI"), column("Identifier", "UNI")]
+    assert pick_key_columns(described) == ["a", "b"]
+
+
+def test_pick_key_columns_uses_a_non_null_unique_key():
+    assert pick_key_columns([column("x"), column("Identifier", "UNI")]) == ["Identifier"]
+
+
+@pytest.mark.parametrize("described", [
+    [column("Identifier", "UNI", nullable=True)],
+    [column("Identifier", "MUL")],
+    [column("x")],
+])
+def test_pick_key_columns_without_a_reliable_key(described):
+    assert pick_key_columns(described) == []
+
+
+ROWS = [
+    (1, "b", 2.5), (2, None, 1.0), (3, "a", 2.5), (4, "b", None), (5, "a", 0.5),
+    (6, None, 3.0), (7, "c", 2.5), (8, "b", 1.0), (9, "a", None), (10, "c", 0.5),
+]
+
+
+@pytest.fixture
+def db():
+    # SQLite orders NULLs like MariaDB (first on ASC, last on DESC) and accepts
+    # backquoted identifiers, so the generated SQL runs as is
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE `t` (`id` INTEGER PRIMARY KEY, `name` TEXT, `score` REAL)")
+    connection.executemany("INSERT INTO `t` VALUES (?, ?, ?)", ROWS)
+    yield connection
+    connection.close()
+
+
+def make_query(key_columns=("id",), float_columns=()):
+    columns = {name: f"`t`.`{name}`" for name in ("id", "name", "score")}
+    return TableQuery("`t`", columns, key_columns, float_columns=float_columns)
+
+
+def fetch_all_pages(db, args, **query_kwargs):
+    rows, cursors, token = [], [], None
+    while True:
+        query = make_query(**query_kwargs)
+        query.apply_args(dict(args, **({"cursor": token} if token else {})), max_limit=1000)
+        sql, params = query.select_sql()
+        fetched = db.execute(sql.replace("%s", "?"), params).fetchall()
+        data, token = query.page(query.select_columns(), fetched)
+        rows.extend(record["id"] for record in data)
+        if token is None:
+            return rows, cursors
+        cursors.append(decode_cursor(token))
+
+
+def expected_order(db, order_by):
+    return [row[0] for row in db.execute(f"SELECT id FROM t ORDER BY {order_by}")]
+
+
+@pytest.mark.parametrize("sort, order_by", [
+    ("name", "name ASC, id ASC"),
+    ("-name", "name DESC, id ASC"),
+    ("name,-id", "name ASC, id DESC"),
+    ("-name,score", "name DESC, score ASC, id ASC"),
+])
+def test_keyset_paging_returns_every_row_once(db, sort, order_by):
+    rows, cursors = fetch_all_pages(db, {"sort": sort, "limit": 3})
+    assert rows == expected_order(db, order_by)
+    assert cursors and all("k" in cursor for cursor in cursors)
+
+
+def test_sorting_on_a_float_column_pages_by_offset(db):
+    rows, cursors = fetch_all_pages(db, {"sort": "score", "limit": 4}, float_columns={"score"})
+    assert rows == expected_order(db, "score ASC, id ASC")
+    assert cursors == [{"o": 4}, {"o": 8}]
+
+
+def test_tables_without_a_key_page_by_offset(db):
+    rows, cursors = fetch_all_pages(db, {"limit": 4}, key_columns=())
+    assert sorted(rows) == list(range(1, 11))
+    assert cursors == [{"o": 4}, {"o": 8}]
+
+
+def test_keyset_cursor_must_match_the_sort_order(db):
+    query = make_query()
+    query.apply_args({"sort": "name", "cursor": encode_cursor({"k": [3]})}, max_limit=100)
+    with pytest.raises(QueryError):
+        query.select_sql()
+
+
+def test_keyset_cursor_is_rejected_when_paging_by_offset():
+    query = make_query(float_columns={"score"})
+    query.apply_args({"sort": "score", "cursor": encode_cursor({"k": [1.0, 3]})}, max_limit=100)
+    with pytest.raises(QueryError):
+        query.select_sql()
@@ -0,0 +1,150 @@
+import json
+import os
+
+from webdav_ingest import list_json_files_recursive, load_config
+
+BASE_URL = "https://cloud.example/remote.php/dav/files/demo/"
+ROOT = "/remote.php/dav/files/demo/EMPI-RF/"
+
+
+def write_env(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_load_config_defaults(tmp_path):
+    cfg = load_config(tmp_path)
+    assert cfg["db_host"] == "127.0.0.1"
+    assert cfg["db_port"] == 3306
+    assert cfg["webdav_root"] == "EMPI-RF"
+    assert cfg["schema_dir"] == str(tmp_path / "backend" / "schemas")
+    assert cfg["webdav_max_per_host"] == 0
+    assert cfg["parse_workers"] == (os.cpu_count() or 1)
+    assert cfg["webdav_sync"] is False
+    assert cfg["content_hash"] is True
+    assert cfg["webdav_propfind_timeout"] == cfg["webdav_get_timeout"] == 30.0
+
+
+def test_load_config_reads_env_files(tmp_path):
+    write_env(tmp_path / "backend" / "conf" / "db_config.json", json.dumps({"DB_HOST": "db", "DB_NAME": "from_json"}))
+    write_env(tmp_path / ".env", "\n".join([
+        "# comment",
+        "DB_NAME='from_env'",
+        'WEBDAV_USER="alice"',
+        "WEBDAV_CONCURRENCY=4",
+        "WEBDAV_SYNC=yes",
+        "INGEST_MODE= Upsert ",
+        "not a setting",
+    ]))
+    write_env(tmp_path / "bin" / ".env", "WEBDAV_CONCURRENCY=16\nWEBDAV_TIMEOUT=10\nWEBDAV_GET_TIMEOUT=120\n")
+    cfg = load_config(tmp_path)
+    assert cfg["db_host"] == "db"
+    assert cfg["db_name"] == "from_env"
+    assert cfg["webdav_user"] == "alice"
+    assert cfg["webdav_concurrency"] == 16
+    assert cfg["webdav_sync"] is True
+    assert cfg["ingest_mode"] == "upsert"
+    assert cfg["webdav_propfind_timeout"] == 10.0
+    assert cfg["webdav_get_timeout"] == 120.0
+
+
+def test_load_config_treats_empty_values_as_unset(tmp_path):
+    write_env(tmp_path / ".env", "\n".join([
+        "WEBDAV_MAX_PER_HOST=",
+        "INGEST_PARSE_WORKERS=",
+        "INGEST_TRIGGER_PORT=",
+        "WEBDAV_RETRIES=5",
+        "WEBDAV_PROPFIND_RETRIES=",
+    ]))
+    cfg = load_config(tmp_path)
+    assert cfg["webdav_max_per_host"] == 0
+    assert cfg["parse_workers"] == (os.cpu_count() or 1)
+    assert cfg["trigger_port"] == 0
+    assert cfg["webdav_propfind_retries"] == 5
+
+
+class FakeCrawler:
+    """PROPFIND listings by folder URL; every folder lists itself first."""
+
+    workers = 2
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.fetched = []
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        return self.tree[url]
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.written = {}
+
+    def execute(self, sql, params=None):
+        assert sql.startswith("INSERT INTO ingest_folder_state")
+        for i in range(0, len(params), 3):
+            self.written[params[i]] = (params[i + 1], params[i + 2])
+
+
+def folder(path, etag):
+    return {"href": path, "is_collection": True, "etag": etag, "last_modified": "Mon, 01 Sep 2025 10:00:00 GMT"}
+
+
+def document(path):
+    return {"href": path, "is_collection": False, "etag": "f", "last_modified": "Mon, 01 Sep 2025 10:00:00 GMT"}
+
+
+def build_tree(root_etag):
+    url = lambda path: "https://cloud.example" + path
+    return {
+        url(ROOT): [
+            folder(ROOT, root_etag),
+            document(ROOT + "a.json"),
+            document(ROOT + "notes.txt"),
+            folder(ROOT + "same/", "s1"),
+            folder(ROOT + "new%20data/", "n2"),
+        ],
+        url(ROOT + "same/"): [folder(ROOT + "same/", "s1"), document(ROOT + "same/b.json")],
+        url(ROOT + "new%20data/"): [folder(ROOT + "new%20data/", "n2"), document(ROOT + "new%20data/c.json")],
+    }
+
+
+def known_state(etags):
+    return {path: {"etag": etag, "last_modified": "Mon, 01 Sep 2025 10:00:00 GMT"} for path, etag in etags.items()}
+
+
+def crawl(tree, folder_state):
+    crawler, cursor, crawled = FakeCrawler(tree), RecordingCursor(), {}
+    files, entries, folders, skipped = list_json_files_recursive(
+        None, BASE_URL, "https://cloud.example" + ROOT, cursor, folder_state, crawler, crawled
+    )
+    return [item["href"] for item in files], crawler, cursor, crawled, skipped
+
+
+def test_crawl_skips_folders_with_an_unchanged_etag():
+    state = known_state({ROOT: "r1", ROOT + "same/": "s1", ROOT + "new%20data/": "n1"})
+    files, crawler, cursor, crawled, skipped = crawl(build_tree("r2"), state)
+    assert files == [ROOT + "a.json", ROOT + "new%20data/c.json"]
+    assert "https://cloud.example" + ROOT + "same/" not in crawler.fetched
+    assert skipped == 1
+    assert crawled == {ROOT: True, ROOT + "same/": False, ROOT + "new%20data/": True}
+    assert set(cursor.written) == {ROOT, ROOT + "new%20data/"}
+
+
+def test_first_crawl_lists_every_folder():
+    files, crawler, cursor, crawled, skipped = crawl(build_tree("r1"), {})
+    assert files == [ROOT + "a.json", ROOT + "same/b.json", ROOT + "new%20data/c.json"]
+    assert skipped == 0
+    assert set(cursor.written) == {ROOT, ROOT + "same/", ROOT + "new%20data/"}
+    assert all(crawled.values())
+
+
+def test_unchanged_start_folder_is_not_a_complete_listing():
+    state = known_state({ROOT: "r1", ROOT + "same/": "s1", ROOT + "new%20data/": "n2"})
+    files, crawler, cursor, crawled, skipped = crawl(build_tree("r1"), state)
+    assert files == [ROOT + "a.json"]
+    assert skipped == 2
+    assert cursor.written == {}
+    # Nothing below the start folder changed, so it must not be used to detect removals
+    assert crawled[ROOT] is False